@@ -1,9 +1,13 @@
 import streamlit as st
 import textwrap
 import time 
-from main import run_demo
+from main import run_demo_stream
+from utils.telemetry import start_metrics_server
 from utils.mailer import send_feedback_email  # Make sure utils/mailer.py exists
 
+# Prometheus scrape endpoint (TEXLM_METRICS_PORT), started once per server process
+start_metrics_server()
+
 # === 1. Page Configuration ===
 st.set_page_config(
     page_title="TexLM",
@@ -125,19 +129,47 @@ if prompt := st.chat_input("Describe your matrix operation..."):
     with st.chat_message("user"):
         st.write(prompt)
 
-    # 2. Assistant Message
+    # 2. Assistant Message (rendered progressively as pipeline events arrive)
     with st.chat_message("assistant"):
-        import time # ensure time is imported if used
-        with st.spinner("🧠 TexLM is thinking and calculating..."):
-            try:
-                response = run_demo(prompt)
-            except Exception as e:
-                response = {"status": "ERROR", "error": str(e)}
+        status_placeholder = st.empty()
+        with st.expander("Thinking Process 💭", expanded=True):
+            reasoning_placeholder = st.empty()
+        dsl_placeholder = st.empty()
+
+        status_placeholder.info("🧠 TexLM is thinking and calculating...")
+        reasoning_text = ""
+        response = None
+        try:
+            for event in run_demo_stream(prompt):
+                event_type = event["type"]
+                if event_type == "attempt" and event["attempt"] > 1:
+                    reasoning_text = ""
+                    status_placeholder.info(f"🔁 Retrying (attempt {event['attempt']}/{event['max_attempts']})...")
+                elif event_type == "reasoning_delta":
+                    reasoning_text += event["text"]
+                    reasoning_placeholder.markdown(reasoning_text)
+                elif event_type == "dsl":
+                    dsl_placeholder.code(event["dsl"], language="python")
+                    status_placeholder.info("🔍 Checking the generated program...")
+                elif event_type == "analysis" and not event["is_valid"]:
+                    errors = [d["message"] for d in event["diagnostics"] if d["severity"] == "error"]
+                    status_placeholder.warning("⚠️ " + " ".join(errors))
+                elif event_type == "verification":
+                    if event["is_valid"]:
+                        status_placeholder.info("✅ Verified, rendering LaTeX...")
+                    else:
+                        status_placeholder.warning(f"❌ {event['explanation']}")
+                elif event_type == "result":
+                    response = event["result"]
+        except Exception as e:
+            response = {"status": "ERROR", "error": str(e)}
+
+        status_placeholder.empty()
+        dsl_placeholder.empty()
 
         # 3. Handle & Display Response
         if response.get("status") == "SUCCESS":
-            with st.expander("Thinking Process 💭", expanded=True):
-                st.write(response.get("reasoning", ""))
+            reasoning_placeholder.markdown(response.get("reasoning", ""))
             
             st.code(response["final_latex"], language="latex")
             st.session_state.messages.append({"role": "assistant", "content": response})
@@ -0,0 +1,110 @@
+# benchmarks/exact_bench.py
+"""
+Exact (dsl/exact.py) vs float evaluation of integer programs.
+
+    python benchmarks/exact_bench.py [--sizes 2 5 10 20 50 64 100] [--range 9] [--decimals 0]
+                                     [--repeat 5] [-o results.json]
+
+For each size n, random n x n matrices with entries in [-range, range] (with --decimals
+digits after the point) are run through both paths as latex_core_task runs them for:
+
+    multiply   multiply(A, B)
+    inverse    inverse(A)
+    solve      multiply(inverse(A), B)   (rewritten to solve(A, B))
+    chain      add(inverse(A), multiply(transpose(A), B))
+
+Reported: best wall time of each path (evaluation + LaTeX core), their ratio, the largest
+entry error of the float result against the exact one, and whether the exact core printed
+fractions, integers or decimals. EXACT_MAX_SIZE is chosen from this table.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TEXLM_MEMO", "0")  # repeated runs must compute, not hit the result memo
+
+from constraints.generate_constraint import generate_constraint  # noqa: E402
+import dsl.evaluate  # noqa: E402
+from dsl.evaluate import evaluate, evaluate_exact  # noqa: E402
+from dsl.parser import parse_dsl  # noqa: E402
+
+PROGRAMS = {
+    "multiply": "multiply({A}, {B})",
+    "inverse": "inverse({A})",
+    "solve": "multiply(inverse({A}), {B})",
+    "chain": "add(inverse({A}), multiply(transpose({A}), {B}))",
+}
+
+
+def make_matrix(n: int, value_range: int, decimals: int, rng) -> np.ndarray:
+    while True:
+        values = rng.integers(-value_range * 10 ** decimals, value_range * 10 ** decimals + 1, size=(n, n))
+        if abs(np.linalg.det(values)) > 0.5:  # invertible (the exact path would raise otherwise)
+            return values / 10 ** decimals if decimals else values
+
+
+def literal(values: np.ndarray) -> str:
+    return "[" + ", ".join("[" + ", ".join(str(v) for v in row) + "]" for row in values.tolist()) + "]"
+
+
+def best_time(function, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def exact_path(tree):
+    # what latex_core_task does for programs with exact literals
+    exact = evaluate_exact(tree)
+    return exact, generate_constraint(exact)
+
+
+def run(sizes: list[int], value_range: int, decimals: int, repeat: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    dsl.evaluate.EXACT_MAX_SIZE = max(sizes)  # measure past the default cut-off
+    rows = []
+    for n in sizes:
+        a, b = make_matrix(n, value_range, decimals, rng), make_matrix(n, value_range, decimals, rng)
+        for name, template in PROGRAMS.items():
+            tree = parse_dsl(template.format(A=literal(a), B=literal(b)))
+            exact_time, (exact, core) = best_time(lambda: exact_path(tree), repeat)
+            float_time, _ = best_time(lambda: generate_constraint(evaluate(tree, dense=False)), repeat)
+            approximate = evaluate(tree)
+            kind = "fractions" if "\\frac" in core else "integers" if exact.denominator == 1 else "decimals"
+            error = float(np.max(np.abs(approximate - exact.to_float())))
+            rows.append({"size": n, "program": name, "exact_s": exact_time, "float_s": float_time,
+                         "float_error": error, "core": kind})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 10, 20, 50, 64, 100])
+    parser.add_argument("--range", type=int, default=9, dest="value_range")
+    parser.add_argument("--decimals", type=int, default=0, help="digits after the point of the entries")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.value_range, args.decimals, args.repeat)
+    print(f"{'size':>5} {'program':<9} {'exact':>11} {'float':>11} {'ratio':>8} {'float error':>12}  core")
+    for row in rows:
+        print(f"{row['size']:>5} {row['program']:<9} {row['exact_s'] * 1e3:>9.2f}ms {row['float_s'] * 1e3:>9.2f}ms "
+              f"{row['exact_s'] / row['float_s']:>7.1f}x {row['float_error']:>12.2e}  "
+              f"{row['core']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# benchmarks/numeric_bench.py
+"""
+Benchmark suite for the numeric core: DSL text -> numpy result -> LaTeX matrix core.
+
+    python benchmarks/numeric_bench.py [--sizes 1 10 100 500] [--depths 1 2 4 8] [--repeat 3]
+                                       [-o results.json] [--compare baseline.json]
+
+For every (size, depth) cell of the grid a program of `depth` nested operations over
+size x size literals is generated (transpose, add, multiply, inverse in turn; binary
+operations take a fresh literal) and each stage is measured on its own:
+
+    parse       dsl.parser.parse_dsl (what the pipeline runs)
+    ast_parse   ast.parse, the front end visit_list was written for
+    visit_list  evaluate.visit_list on every literal of the ast.parse tree
+    evaluate    evaluate() on the parse_dsl tree (numeric work only)
+    constraint  generate_constraint on the result
+
+Each stage reports the best and median wall time over --repeat runs and its peak traced
+memory (tracemalloc, measured in a separate run so tracing does not skew the timings).
+-o writes the results with the commit and library versions; --compare prints the ratio
+against an earlier file and exits with status 1 when a stage got slower than --threshold.
+The full default grid takes several minutes (the 500x500 programs are megabytes of text).
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TEXLM_MEMO", "0")  # repeated runs must compute, not hit the result memo
+
+from constraints.generate_constraint import generate_constraint  # noqa: E402
+from dsl.evaluate import evaluate, visit_list  # noqa: E402
+from dsl.parser import parse_dsl  # noqa: E402
+
+OPERATIONS = ("transpose", "add", "multiply", "inverse")
+STAGES = ("parse", "ast_parse", "visit_list", "evaluate", "constraint")
+
+
+# ============================================================================
+# Programs
+# ============================================================================
+
+def make_literal(n: int, rng) -> str:
+    # diagonally dominant, so every inverse in the chain exists and stays well conditioned
+    values = np.round(rng.uniform(-1, 1, size=(n, n)), 3) + np.eye(n) * (n + 1)
+    return "[" + ", ".join("[" + ", ".join(repr(float(v)) for v in row) + "]" for row in values) + "]"
+
+
+def make_program(n: int, depth: int, seed: int = 0) -> tuple[str, list[str]]:
+    """DSL with `depth` nested operations over n x n literals, and the operations used (inner first)."""
+    rng = np.random.default_rng(seed)
+    dsl = make_literal(n, rng)
+    operations = [OPERATIONS[i % len(OPERATIONS)] for i in range(depth)]
+    for op in operations:
+        if op in ("add", "multiply"):
+            dsl = f"{op}({dsl}, {make_literal(n, rng)})"
+        else:
+            dsl = f"{op}({dsl})"
+    return dsl, operations
+
+
+def ast_literals(tree: ast.AST) -> list[ast.List]:
+    """Outermost list literals of an ast.parse tree (the nodes visit_node hands to visit_list)."""
+    literals = []
+
+    def walk(node):
+        if isinstance(node, ast.List):
+            literals.append(node)
+        else:
+            for child in ast.iter_child_nodes(node):
+                walk(child)
+
+    walk(tree)
+    return literals
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def stage_calls(dsl: str) -> dict:
+    """Zero-argument callables per stage; each one's inputs are prepared by the previous stage."""
+    tree = ast.parse(dsl)
+    literals = ast_literals(tree)
+    module = parse_dsl(dsl)
+    result = evaluate(module)
+    return {
+        "parse": lambda: parse_dsl(dsl),
+        "ast_parse": lambda: ast.parse(dsl),
+        "visit_list": lambda: [visit_list(node) for node in literals],
+        "evaluate": lambda: evaluate(module),
+        "constraint": lambda: generate_constraint(result),
+    }
+
+
+def time_call(fn, repeat: int) -> dict:
+    number = 1
+    # batch fast calls until one measurement takes ~20ms, so small inputs are not timer noise
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= 0.02 or number >= 10_000:
+            break
+        number *= 4
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return {"best": min(samples), "median": statistics.median(samples)}
+
+
+def peak_memory(fn) -> int:
+    """Peak bytes allocated while `fn` runs (numpy buffers included)."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(n: int, depth: int, repeat: int, stages=STAGES) -> dict:
+    dsl, operations = make_program(n, depth)
+    calls = stage_calls(dsl)
+    case = {
+        "size": n,
+        "depth": depth,
+        "operations": operations,
+        "literals": len(ast_literals(ast.parse(dsl))),
+        "cells": n * n,
+        "dsl_chars": len(dsl),
+        "stages": {},
+    }
+    for stage in stages:
+        timing = time_call(calls[stage], repeat)
+        case["stages"][stage] = {
+            "seconds_best": round(timing["best"], 9),
+            "seconds_median": round(timing["median"], 9),
+            "peak_bytes": peak_memory(calls[stage]),
+        }
+    return case
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import lark
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "lark": lark.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+# ============================================================================
+# Comparison
+# ============================================================================
+
+def compare(current: list[dict], baseline: list[dict], threshold: float, min_delta: float) -> list[str]:
+    """
+    Print best-time ratios against `baseline`. Returns the stages slower by more than
+    `threshold` (relative) and `min_delta` seconds (absolute, so timer noise on tiny cases is ignored).
+    """
+    previous = {(c["size"], c["depth"]): c for c in baseline}
+    regressions = []
+    print(f"\n{'case':>12} {'stage':>11} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for case in current:
+        old = previous.get((case["size"], case["depth"]))
+        if old is None:
+            continue
+        for stage, result in case["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            before, after = old["stages"][stage]["seconds_best"], result["seconds_best"]
+            ratio = after / before if before else float("inf")
+            label = f"{case['size']}x{case['size']}/d{case['depth']}"
+            flag = "  REGRESSION" if ratio > 1 + threshold and after - before > min_delta else ""
+            print(f"{label:>12} {stage:>11} {before * 1e3:>10.3f}ms {after * 1e3:>10.3f}ms {ratio:>6.2f}x{flag}")
+            if flag:
+                regressions.append(f"{label} {stage} {ratio:.2f}x")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default 0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=50e-6,
+                        help="ignore slowdowns smaller than this many seconds (default 50us)")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':>12} {'chars':>10} " + " ".join(f"{stage:>11}" for stage in args.stages) + f" {'peak MiB':>9}")
+    cases = []
+    for n in args.sizes:
+        for depth in args.depths:
+            case = run_case(n, depth, args.repeat, args.stages)
+            cases.append(case)
+            peak = max(s["peak_bytes"] for s in case["stages"].values()) / 2**20
+            times = " ".join(f"{s['seconds_best'] * 1e3:>9.3f}ms" for s in case["stages"].values())
+            print(f"{f'{n}x{n}/d{depth}':>12} {case['dsl_chars']:>10} {times} {peak:>9.2f}", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "numeric_core", "environment": environment(), "cases": cases}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(cases, json.load(f)["cases"], args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/parse_bench.py
+"""
+Microbenchmark: DSL text -> numpy literal.
+
+    python benchmarks/parse_bench.py [--sizes 10 50 200] [--repeat 5]
+
+Compares the previous front end (ast.parse + evaluate.visit_list) with dsl.parser.parse_dsl
+(bulk literal loading + the compiled DSL_GRAMMAR parser) on square literals of increasing size.
+"""
+import argparse
+import ast
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TEXLM_MEMO", "0")  # repeated runs must compute, not hit the result memo
+
+from dsl.evaluate import evaluate  # noqa: E402
+from dsl.parser import parse_dsl  # noqa: E402
+
+
+def make_dsl(n: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(-100, 100, size=(n, n)), 3)
+    literal = "[" + ", ".join("[" + ", ".join(repr(float(v)) for v in row) + "]" for row in values) + "]"
+    return f"transpose({literal})"
+
+
+def ast_path(dsl: str):
+    return evaluate(ast.parse(dsl))
+
+
+def parser_path(dsl: str):
+    return evaluate(parse_dsl(dsl))
+
+
+def bench(fn, dsl: str, repeat: int) -> float:
+    number = 1
+    # grow `number` until one measurement takes ~50ms so small inputs are not noise
+    while timeit.timeit(lambda: fn(dsl), number=number) < 0.05 and number < 100_000:
+        number *= 4
+    return min(timeit.repeat(lambda: fn(dsl), number=number, repeat=repeat)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'n x n':>9} {'chars':>9} {'ast.parse':>12} {'parse_dsl':>12} {'ratio':>9} {'us/cell':>13}")
+    for n in args.sizes:
+        dsl = make_dsl(n)
+        assert np.array_equal(ast_path(dsl), parser_path(dsl))
+        t_ast = bench(ast_path, dsl, args.repeat)
+        t_parser = bench(parser_path, dsl, args.repeat)
+        print(f"{f'{n}x{n}':>9} {len(dsl):>9} {t_ast * 1e3:>10.3f}ms {t_parser * 1e3:>10.3f}ms "
+              f"{t_parser / t_ast:>8.2f}x {t_parser / (n * n) * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
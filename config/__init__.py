@@ -4,8 +4,8 @@ Configuration module for TexLM.
 Exports client and prompts for easy access.
 """
 
-from .config import get_client
+from .config import get_client, get_async_client, get_connection_stats
 from . import prompts
 
-__all__ = ['get_client', 'prompts']
+__all__ = ['get_client', 'get_async_client', 'get_connection_stats', 'prompts']
 
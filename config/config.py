@@ -1,8 +1,13 @@
 # config/config.py
 import os
+import asyncio
+import threading
+import importlib.util
+import weakref
 from pathlib import Path
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 # i got 5 bucks in it lol
 # Load from parent directory since config/ is now a subdirectory
@@ -10,7 +15,113 @@ config_dir = Path(__file__).parent
 project_root = config_dir.parent
 load_dotenv(project_root / "openai_key.env")
 
+# === HTTP Connection Pool ===
+# One pool per process, shared by every Streamlit session and the batch runner,
+# so the TLS handshake to OPENAI_BASE_URL is paid once per connection instead of once per request.
+HTTP_POOL_SIZE = int(os.getenv("TEXLM_HTTP_POOL_SIZE", "32"))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("TEXLM_HTTP_KEEPALIVE_CONNECTIONS", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("TEXLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("TEXLM_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("TEXLM_HTTP_READ_TIMEOUT", "120"))
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("TEXLM_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+
+
+class ConnectionStats:
+    """Counts requests and newly opened connections; everything else reused a pooled connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(self.requests - self.new_connections, 0),
+            }
+
+
+connection_stats = ConnectionStats()
+
+# httpcore reports this event once per TCP connection it opens
+_NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+
+
+def _trace(event_name, info):
+    if event_name == _NEW_CONNECTION_EVENT:
+        connection_stats.record_new_connection()
+
+
+async def _async_trace(event_name, info):
+    _trace(event_name, info)
+
+
+def _on_request(request: httpx.Request):
+    connection_stats.record_request()
+    request.extensions["trace"] = _trace
+
+
+async def _on_async_request(request: httpx.Request):
+    connection_stats.record_request()
+    request.extensions["trace"] = _async_trace
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _http_options() -> dict:
+    return dict(
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=_http_timeout(),
+        http2=HTTP2_ENABLED,
+        follow_redirects=True,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+# httpx async pools are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+
+
 def get_client() -> OpenAI:
-    
-    return OpenAI()
+    """Process-wide OpenAI client backed by a shared keep-alive connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(**_http_options(), event_hooks={"request": [_on_request]})
+                # the SDK applies its own per-request timeout, so pass ours explicitly
+                _client = OpenAI(http_client=http_client, timeout=_http_timeout())
+    return _client
+
+def get_async_client() -> AsyncOpenAI:
+    """AsyncOpenAI client shared by all tasks on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(**_http_options(), event_hooks={"request": [_on_async_request]})
+            client = AsyncOpenAI(http_client=http_client, timeout=_http_timeout())
+            _async_clients[loop] = client
+    return client
 
+def get_connection_stats() -> dict:
+    """{"requests", "new_connections", "reused_connections"} since process start."""
+    return connection_stats.snapshot()
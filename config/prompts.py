@@ -110,6 +110,21 @@ EXPLANATION: [Explain what the DSL does in 1 concise sentence, if there's any ki
 MATCH: [TRUE or FALSE]
 """
 
+# Used when static analysis (dsl/analyze.py) has already proven the math valid:
+# shapes and invertibility are checked locally, so only the intent is left to the model.
+DSL_INTENT_VERIFICATION_PROMPT = """
+You are a rigorous code reviewer for a Matrix Operation DSL.
+The matrix math has already been checked (dimensions and invertibility are valid).
+Only verify that the DSL matches the User's intent: the operations, their order/nesting
+(e.g. "inverse of transpose" vs "transpose of inverse") and the matrices used.
+
+DSL: add(A, B), multiply(A, B), transpose(A), inverse(A)
+
+Output Format:
+EXPLANATION: [What the DSL does in 1 concise sentence]
+MATCH: [TRUE or FALSE]
+"""
+
 VERIFY_USER_PROMPT_TEMPLATE = """User Instruction: "{user_instruction}"
 Generated DSL: "{dsl_code}"
 
@@ -169,4 +184,10 @@ Example Output Flow:
 [Tool]: inverse(multiply([[1,2]], [[3,4]]))
 """
 
-DSL_GENERATOR_TOOL_DESCRIPTION = "Generate the executable matrix DSL code following the Lark grammar."
\ No newline at end of file
+DSL_GENERATOR_TOOL_DESCRIPTION = "Generate the executable matrix DSL code following the Lark grammar."
+
+# Appended to the user message when dsl/symbols.py replaced matrix literals by names
+MATRIX_PLACEHOLDER_NOTE = (
+    "Named matrices: {shapes}. "
+    "Their entries are stored locally; write the names (e.g. M1) in the DSL wherever the matrix is used."
+)
\ No newline at end of file
@@ -1,19 +1,29 @@
 import numpy as np
 from decimal import Decimal
 from typing import Callable
+from dsl.exact import ExactMatrix
+from dsl.structured import StructuredMatrix, LOWER, UPPER
 
-def generate_constraint(m : np.ndarray) -> str:
-    assert 1 <= len(m.shape), f"Matrix has too few dimensions: {len(m.shape)}"
-    assert 2 >= len(m.shape), f"Matrix has too many dimensions: {len(m.shape)}"
-
+def generate_constraint(m : np.ndarray | ExactMatrix | StructuredMatrix) -> str:
     # TODO: make this depend on the width of the matrix in order to prevent page overflows
     num_sigfigs = 5
-    def format_number(n : float | int) -> str:
+    def format_number(n : float | int | str) -> str:
+        if isinstance(n, str):  # exact fraction or preformatted entry, already LaTeX
+            return n
         if len(str(n).replace('.', '')) <= num_sigfigs:
             return str(n)
         # source: https://stackoverflow.com/questions/6913532/display-a-decimal-in-scientific-notation
         return f'%.{num_sigfigs}e' % Decimal(str(n))
 
+    if isinstance(m, ExactMatrix):
+        # exact results print fractions as \frac{p}{q}
+        m = m.latex_entries()
+    elif isinstance(m, StructuredMatrix):
+        m = m.dense() if m.kind in (LOWER, UPPER) else sparse_entries(m, format_number)
+
+    assert 1 <= len(m.shape), f"Matrix has too few dimensions: {len(m.shape)}"
+    assert 2 >= len(m.shape), f"Matrix has too many dimensions: {len(m.shape)}"
+
     constraint = "\\begin{bmatrix}\n"
 
     match len(m.shape):
@@ -30,6 +40,13 @@ def generate_constraint(m : np.ndarray) -> str:
 
 
 
+def sparse_entries(m : StructuredMatrix, fn : Callable[[float | int], str]) -> np.ndarray:
+    """Formatted entries of a diagonal / permutation / sparse matrix: zero is formatted once."""
+    entries = np.full(m.shape, fn(m.dtype.type(0)), dtype=object)
+    rows, cols, values = m.nonzeros()
+    entries[rows, cols] = [fn(v) for v in values]
+    return entries
+
 def one_dim_constraint(m : np.ndarray, fn : Callable[[float | int], str]) -> str:
     constraint = f"{fn(m[0])} "
 
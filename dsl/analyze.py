@@ -0,0 +1,288 @@
+# dsl/analyze.py
+"""
+Static analysis of DSL programs.
+
+Infers shapes through add / multiply / transpose / inverse and checks inverted literals
+for singularity and conditioning, without calling a model. The result is a list of structured
+diagnostics that the pipeline can use to fail fast (instead of asking the LLM verifier
+whether the math works) and to limit the verifier to checking intent only.
+
+Only what is proven is an error: a literal with integer or short-decimal entries is singular
+when exact elimination (dsl/exact.py) says so. Other literals that are singular in floating
+point get a warning, and inverses of computed results (products, sums, ...) are left to
+evaluation, which computes them anyway.
+
+analyze_dsl checks the resource limits (dsl/limits.py) on the parsed program first: a program
+evaluation would reject raises ResourceLimitError before any matrix is analyzed, and one
+estimated above MAX_NUMERIC_FLOPS is analyzed for shapes only.
+"""
+import ast
+import numpy as np
+from .evaluate import preflight
+from .exact import EXACT_MAX_SIZE, decimal_fraction, is_singular
+from .parser import parse_dsl, to_dsl, DSLSyntaxError, UnknownSymbolError
+
+# Above this many cells per literal, only shapes are inferred (no singularity or conditioning check)
+MAX_NUMERIC_CELLS = 250_000
+# Above this estimated evaluation work (dsl/limits.py), only shapes are inferred at all:
+# the rank / condition checks cost several times the inverse they guard
+MAX_NUMERIC_FLOPS = 100_000_000
+# Warn when an inverse loses more than ~8 significant digits
+ILL_CONDITIONED_THRESHOLD = 1e8
+EXPRESSION_PREVIEW = 80
+
+OPERATION_ARITY = {"transpose": 1, "inverse": 1, "add": 2, "multiply": 2}
+
+
+class AnalysisError(Exception):
+    """Raised internally to stop analysis of a subtree after an error diagnostic."""
+
+
+def analyze(program: ast.Module, numeric: bool = True) -> dict:
+    """
+    With numeric=False only shapes are inferred (no singularity or conditioning checks).
+
+    Returns:
+        dict: {
+            "is_valid": bool,          # no error diagnostics
+            "trivial": bool,           # program is a bare matrix literal (no operations)
+            "shape": tuple | None,     # inferred result shape
+            "diagnostics": [ {"severity", "code", "message", "expression"} ]
+        }
+    """
+    diagnostics = []
+    shape = None
+    trivial = False
+
+    if not isinstance(program, ast.Module) or len(program.body) != 1 or not isinstance(program.body[0], ast.Expr):
+        diagnostics.append(_diagnostic("error", "INVALID_PROGRAM", "The DSL must be a single expression.", None))
+    else:
+        root = program.body[0].value
+        trivial = isinstance(root, (ast.List, ast.Constant))
+        try:
+            shape, _ = _visit(root, diagnostics, numeric)
+        except AnalysisError:
+            shape = None
+
+    return {
+        "is_valid": not any(d["severity"] == "error" for d in diagnostics),
+        "trivial": trivial,
+        "shape": shape,
+        "diagnostics": diagnostics,
+    }
+
+
+def analyze_dsl(dsl: str, symbols: dict | None = None) -> dict:
+    """
+    Parse and analyze a DSL string; syntax errors are reported as diagnostics.
+    `symbols` maps matrix names (dsl/symbols.py) to their arrays. Raises ResourceLimitError
+    (dsl/limits.py) for a program over a resource limit.
+    """
+    try:
+        program = parse_dsl(dsl, symbols)
+    except UnknownSymbolError as e:
+        return {
+            "is_valid": False,
+            "trivial": False,
+            "shape": None,
+            "diagnostics": [_diagnostic("error", "UNKNOWN_SYMBOL", str(e), None)],
+        }
+    except DSLSyntaxError as e:
+        return {
+            "is_valid": False,
+            "trivial": False,
+            "shape": None,
+            "diagnostics": [_diagnostic("error", "SYNTAX_ERROR", f"The DSL is not well formed: {e}", None)],
+        }
+    usage = preflight(program)
+    return analyze(program, numeric=usage is not None and usage["flops"] <= MAX_NUMERIC_FLOPS)
+
+
+def format_diagnostics(analysis: dict, severity: str = "error") -> str:
+    """One line per diagnostic, suitable for retry feedback and UI messages."""
+    return "\n".join(d["message"] for d in analysis["diagnostics"] if d["severity"] == severity)
+
+
+# === Visitors ===
+# Each visitor returns (shape, value). `value` is the matrix of a literal (or of its
+# transpose) when it is small enough to check, otherwise None (shape-only analysis).
+
+def _visit(root, diagnostics, numeric=True):
+    # explicit stack (post-order): programs may nest deeper than the recursion limit.
+    # A call is checked before its arguments and evaluated once all of them are on `results`.
+    results = []
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not isinstance(node, ast.Call):
+            results.append(_visit_leaf(node, diagnostics, numeric))
+        elif not ready:
+            _check_call(node, diagnostics)
+            stack.append((node, True))
+            stack.extend((arg, False) for arg in reversed(node.args))
+        else:
+            operands = results[len(results) - len(node.args):]
+            del results[len(results) - len(node.args):]
+            results.append(_visit_call(node, operands, diagnostics))
+    return results[0]
+
+
+def _visit_leaf(node, diagnostics, numeric):
+    match node:
+        case ast.List():
+            return _visit_literal(node, diagnostics, numeric)
+        case ast.Constant(value=np.ndarray() as value):
+            # literal already loaded by dsl.parser
+            return value.shape, (value if numeric and value.size <= MAX_NUMERIC_CELLS else None)
+        case _:
+            diagnostics.append(_diagnostic("error", "UNKNOWN_NODE", "Unrecognized expression in DSL.", node))
+            raise AnalysisError()
+
+
+def _visit_literal(node: ast.List, diagnostics, numeric):
+    rows = node.elts
+    if not rows or not all(isinstance(row, ast.List) for row in rows):
+        diagnostics.append(_diagnostic("error", "INVALID_MATRIX", "Matrix literals must be a list of rows.", node))
+        raise AnalysisError()
+
+    widths = [len(row.elts) for row in rows]
+    if any(w == 0 for w in widths):
+        diagnostics.append(_diagnostic("error", "EMPTY_ROW", "Matrix literal contains an empty row.", node))
+        raise AnalysisError()
+    if len(set(widths)) != 1:
+        diagnostics.append(_diagnostic(
+            "error", "RAGGED_MATRIX",
+            f"Matrix literal has rows of different lengths ({', '.join(map(str, widths))}).", node))
+        raise AnalysisError()
+
+    shape = (len(rows), widths[0])
+    if shape[0] * shape[1] > MAX_NUMERIC_CELLS:
+        return shape, None
+
+    values = []
+    for row in rows:
+        for element in row.elts:
+            number = _literal_number(element)
+            if number is None:
+                diagnostics.append(_diagnostic("error", "INVALID_NUMBER", "Matrix entries must be numbers.", node))
+                raise AnalysisError()
+            values.append(number)
+    return shape, (np.array(values).reshape(shape) if numeric else None)
+
+
+def _literal_number(element):
+    if isinstance(element, ast.Constant) and isinstance(element.value, (int, float)) and not isinstance(element.value, bool):
+        return element.value
+    if (isinstance(element, ast.UnaryOp) and isinstance(element.op, (ast.USub, ast.UAdd))
+            and isinstance(element.operand, ast.Constant) and isinstance(element.operand.value, (int, float))):
+        return -element.operand.value if isinstance(element.op, ast.USub) else element.operand.value
+    return None
+
+
+def _check_call(node: ast.Call, diagnostics):
+    name = node.func.id if isinstance(node.func, ast.Name) else None
+    if name not in OPERATION_ARITY:
+        diagnostics.append(_diagnostic("error", "UNKNOWN_OPERATION", f"Unknown matrix operation: {name}.", node))
+        raise AnalysisError()
+    if len(node.args) != OPERATION_ARITY[name] or node.keywords:
+        diagnostics.append(_diagnostic(
+            "error", "ARITY",
+            f"{name} takes {OPERATION_ARITY[name]} argument(s), got {len(node.args)}.", node))
+        raise AnalysisError()
+
+
+def _visit_call(node: ast.Call, operands: list, diagnostics):
+    match node.func.id:
+        case "transpose":
+            (shape, value), = operands
+            return (shape[1], shape[0]), (value.T if value is not None else None)
+        case "inverse":
+            return _check_inverse(node, operands[0], diagnostics), None
+        case "add":
+            (a_shape, _), (b_shape, _) = operands
+            if a_shape != b_shape:
+                diagnostics.append(_diagnostic(
+                    "error", "DIMENSION_MISMATCH",
+                    f"add: cannot add a {_fmt(a_shape)} matrix and a {_fmt(b_shape)} matrix "
+                    f"(shapes must be equal).", node))
+                raise AnalysisError()
+            return a_shape, None
+        case "multiply":
+            (a_shape, _), (b_shape, _) = operands
+            if a_shape[1] != b_shape[0]:
+                diagnostics.append(_diagnostic(
+                    "error", "DIMENSION_MISMATCH",
+                    f"multiply: cannot multiply a {_fmt(a_shape)} matrix by a {_fmt(b_shape)} matrix "
+                    f"(inner dimensions {a_shape[1]} and {b_shape[0]} differ).", node))
+                raise AnalysisError()
+            return (a_shape[0], b_shape[1]), None
+
+
+def _check_inverse(node: ast.Call, operand, diagnostics):
+    shape, value = operand
+    if shape[0] != shape[1]:
+        diagnostics.append(_diagnostic(
+            "error", "NOT_SQUARE",
+            f"inverse: a {_fmt(shape)} matrix is not square and cannot be inverted.", node))
+        raise AnalysisError()
+    if value is None:
+        # a computed or large operand; evaluation will catch singular matrices
+        return shape
+
+    numerators = _exact_numerators(value)
+    if numerators is not None:
+        if is_singular(numerators):
+            diagnostics.append(_diagnostic(
+                "error", "SINGULAR",
+                f"inverse: the {_fmt(shape)} matrix {_preview(node.args[0])} is singular "
+                f"(its determinant is 0) and cannot be inverted.", node))
+            raise AnalysisError()
+    else:
+        rank = np.linalg.matrix_rank(value)
+        if rank < shape[0]:
+            # not proven: the entries were rounded when parsed
+            diagnostics.append(_diagnostic(
+                "warning", "NEARLY_SINGULAR",
+                f"inverse: the {_fmt(shape)} matrix {_preview(node.args[0])} is singular to working "
+                f"precision (numerical rank {rank} < {shape[0]}); evaluation may fail.", node))
+            return shape
+
+    condition = np.linalg.cond(value.astype(np.float64))
+    if condition > ILL_CONDITIONED_THRESHOLD:
+        diagnostics.append(_diagnostic(
+            "warning", "ILL_CONDITIONED",
+            f"inverse: the {_fmt(shape)} matrix is ill-conditioned (condition number {condition:.2e}); "
+            f"the result may be inaccurate.", node))
+    return shape
+
+
+def _exact_numerators(value: np.ndarray) -> np.ndarray | None:
+    """Integer matrix proportional to `value` when its entries are exact (see dsl/exact.py), else None."""
+    if max(value.shape) > EXACT_MAX_SIZE:
+        return None
+    if value.dtype == object:  # integers too large for int64
+        return value if all(isinstance(entry, int) for entry in value.flat) else None
+    exact = decimal_fraction(value)
+    return exact[0] if exact is not None else None
+
+
+# === Helpers ===
+
+def _diagnostic(severity: str, code: str, message: str, node) -> dict:
+    return {
+        "severity": severity,
+        "code": code,
+        "message": message,
+        "expression": _preview(node) if node is not None else None,
+    }
+
+
+def _preview(node) -> str:
+    text = to_dsl(node)
+    if len(text) > EXPRESSION_PREVIEW:
+        text = text[:EXPRESSION_PREVIEW - 3] + "..."
+    return text
+
+
+def _fmt(shape) -> str:
+    return f"{shape[0]}x{shape[1]}"
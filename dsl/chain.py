@@ -0,0 +1,111 @@
+# dsl/chain.py
+"""
+Association order for chains of multiply().
+
+The optimizer (dsl/optimize.py) collapses nested multiplies whose intermediate products are
+used nowhere else into one "chain" instruction that keeps the operands and the order the
+program wrote them in. Plans are cached by structure, not shapes, so the order is chosen
+when the chain runs, from the operands' actual shapes (classic matrix-chain dynamic
+programming):
+
+    A 10x1000, B 1000x10, C 10x1000
+    multiply(A, multiply(B, C))   as written:  40,000,000 flops
+    multiply(multiply(A, B), C)   chosen:         400,000 flops
+
+The written order is kept whenever it is already optimal (e.g. all square), so results are
+bit-identical to literal execution unless reordering actually saves work. Multiplications are
+counted as 2*m*k*n floating-point operations.
+"""
+import os
+
+# Longer chains keep their written order (the search is cubic in the chain length)
+MAX_CHAIN_SEARCH = int(os.getenv("TEXLM_MAX_CHAIN_SEARCH", "64"))
+
+
+def multiply_flops(a_shape: tuple, b_shape: tuple) -> int:
+    return 2 * a_shape[0] * a_shape[1] * b_shape[1]
+
+
+def chain_order(dims: list[int]) -> tuple[int, object]:
+    """
+    Cheapest parenthesization of matrices dims[i] x dims[i+1] (i = 0..k-1).
+    Returns (flops, order): order is an operand position or a pair of orders.
+    """
+    k = len(dims) - 1
+    cost = [[0] * k for _ in range(k)]
+    split = [[0] * k for _ in range(k)]
+    for length in range(1, k):
+        for i in range(k - length):
+            j = i + length
+            best = None
+            for s in range(i, j):
+                candidate = cost[i][s] + cost[s + 1][j] + 2 * dims[i] * dims[s + 1] * dims[j + 1]
+                if best is None or candidate < best:
+                    best, split[i][j] = candidate, s
+            cost[i][j] = best
+
+    def build(i, j):
+        return i if i == j else (build(i, split[i][j]), build(split[i][j] + 1, j))
+
+    return cost[0][k - 1], build(0, k - 1)
+
+
+def fold(order, leaves: list, combine):
+    """Evaluate a parenthesization bottom-up with an explicit stack (written chains can be deep)."""
+    values = []
+    stack = [order]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            right = values.pop()
+            values.append(combine(values.pop(), right))
+        elif isinstance(node, int):
+            values.append(leaves[node])
+        else:
+            stack.extend((None, node[1], node[0]))
+    return values[0]
+
+
+def order_flops(order, shapes: list[tuple]) -> int:
+    total = [0]
+
+    def combine(a, b):
+        total[0] += multiply_flops(a, b)
+        return (a[0], b[1])
+
+    fold(order, shapes, combine)
+    return total[0]
+
+
+def choose_order(shapes: list[tuple], written) -> tuple[object, int, int] | None:
+    """
+    (order, flops as written, flops of the order) for matrices of these shapes: the cheapest
+    order, or `written` when it is already optimal. None when the shapes do not chain.
+    """
+    if not all(len(shape) == 2 for shape in shapes) or any(
+            left[1] != right[0] for left, right in zip(shapes, shapes[1:])):
+        return None
+    written_flops = order_flops(written, shapes)
+    if len(shapes) <= MAX_CHAIN_SEARCH:
+        best, best_order = chain_order([shapes[0][0]] + [shape[1] for shape in shapes])
+        if best < written_flops:
+            return best_order, written_flops, best
+    return written, written_flops, written_flops
+
+
+def multiply_chain(operands: list, written, multiply, flops: dict | None = None):
+    """
+    The product of `operands` in the cheapest order. `written` is the program's own
+    parenthesization; `flops` (if given) accumulates the 2mkn work of the order as "written"
+    and as "estimated" for the order chosen (the work that runs is counted by `multiply`).
+    """
+    shapes = [operand.shape for operand in operands]
+    chosen = choose_order(shapes, written)
+    order = written
+    if chosen is not None:
+        order, written_flops, estimated = chosen
+        if flops is not None:
+            flops["written"] = flops.get("written", 0) + written_flops
+            flops["estimated"] = flops.get("estimated", 0) + estimated
+    # otherwise the written order raises the same error as literal execution would
+    return fold(order, operands, multiply)
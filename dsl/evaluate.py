@@ -1,25 +1,130 @@
 import ast
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
+from utils.telemetry import annotate
+from .chain import multiply_chain, multiply_flops
+from .exact import EXACT_KERNELS, EXACT_MAX_SIZE, ExactMatrix, decimal_fraction
+from .limits import enforce, estimate, program_size
+from .memo import MEMO, MEMOIZED_OPERATIONS, get_memo, instruction_key, literal_key, writable
+from .structured import STRUCTURE, STRUCTURED_KERNELS, StructuredMatrix, detect_structure, multiply_work
+from .optimize import OPTIMIZE, optimize
 
-# TODO: negative numbers support 
+# TODO: negative numbers support
 
+# Compiled plans kept per process (keyed by program structure, not by the numbers)
+PLAN_CACHE_SIZE = int(os.getenv("TEXLM_PLAN_CACHE_SIZE", "256"))
 
-def evaluate(ast_object : ast.Module) -> np.ndarray:
-    assert isinstance(ast_object, ast.Module), "Trying to evaulate something that is not an ast module"
-    assert len(ast_object.body) == 1, "There is more than one body in the ast module"
-    np_matrix = visit_node(ast_object.body[0].value)
-    return np_matrix
+# name -> (arity, implementation, message when the arity is wrong)
+OPERATIONS = {
+    "transpose": (1, np.transpose, "A transpose operation was not given one argument"),
+    "inverse": (1, np.linalg.inv, "An inverse operation was not given one argument"),
+    "add": (2, np.add, "An add operation was not given two arguments"),
+    "multiply": (2, np.matmul, "An multiply operation was not given two arguments"),
+}
+# Operations only the optimizer emits (not part of the DSL)
+KERNELS = {name: implementation for name, (_, implementation, _) in OPERATIONS.items()}
+KERNELS["solve"] = np.linalg.solve
+# Work a multiply kernel actually does, when it is not the dense 2mkn (see run_plan)
+MULTIPLY_WORK = {STRUCTURED_KERNELS["multiply"]: multiply_work}
+
+
+def evaluate(ast_object : ast.Module | tuple, dense : bool = True, flops : dict | None = None) -> np.ndarray | StructuredMatrix:
+    """
+    Evaluate a parsed DSL program.
+    The expression is flattened, compiled into a deduplicated plan (cached by structure)
+    and run without recursion, so identical subexpressions are computed once and nesting
+    depth is not limited by the interpreter's recursion limit. Structured literals
+    (diagonal, triangular, ... see dsl/structured.py) keep their structure through the
+    operations; with dense=False a structured result is returned as is.
+    `ast_object` may also be the program's flatten_program() form. `flops` (if given)
+    receives the multiply work, as run_plan counts it. The result is the caller's to modify:
+    one shared with the memo (dsl/memo.py) is returned as a copy.
+    """
+    structure, literals = flatten_program(ast_object)
+    plan = _plan_for(structure, literals)
+    flops = {} if flops is None else flops
+    if STRUCTURE:
+        loaded = []
+
+        def load(value):
+            loaded.append(detect_structure(value))
+            return loaded[-1]
+
+        result = run_plan(plan, literals, STRUCTURED_KERNELS, flops, "structured" if MEMO else None, load)
+        annotate(structures=[getattr(value, "kind", "dense") for value in loaded])
+    else:
+        result = run_plan(plan, literals, flops=flops, memo_namespace="float" if MEMO else None)
+    _annotate_flops(flops)
+    if dense and isinstance(result, StructuredMatrix):
+        return writable(result.dense())
+    return writable(result)
     # TODO: convert np objects back to regular lists, int, and floats
 
-def visit_node(node) -> np.ndarray:
-    match node:
-        case ast.Call():  # a matrix operation
-            return visit_call(node)
-        case ast.List():  # a matrix
-            return visit_list(node)
-        case _:
-            assert False, f"Unrecognized ast node: {node}"
 
+def evaluate_exact(ast_object : ast.Module | tuple, flops : dict | None = None) -> ExactMatrix | None:
+    """
+    Evaluate a program over integer and short-decimal matrices in exact rational arithmetic
+    (dsl/exact.py). None when a literal has longer decimals or is larger than EXACT_MAX_SIZE;
+    the caller then uses evaluate(). Raises the same errors evaluate() would; `flops` and the
+    returned copy of a memoized result as in evaluate().
+    """
+    structure, literals = flatten_program(ast_object)
+    if not all(literal.ndim == 2 and max(literal.shape) <= EXACT_MAX_SIZE and decimal_fraction(literal) is not None
+               for literal in literals):
+        return None
+    plan = _plan_for(structure, literals)
+    flops = {} if flops is None else flops
+    result = run_plan(plan, literals, EXACT_KERNELS, flops, "exact" if MEMO else None, ExactMatrix.from_literal)
+    _annotate_flops(flops)
+    if any(literal.dtype.kind == "f" for literal in literals):
+        result = ExactMatrix(result.numerators, result.denominator, decimal=True)
+    return writable(result)
+
+
+def preflight(ast_object : ast.Module | tuple) -> dict | None:
+    """
+    Resource estimate (dsl/limits.py) of a parsed program, before anything is computed on it.
+    Raises ResourceLimitError over a limit, so static analysis (dsl/analyze.py) does no
+    numeric work on a program evaluation would reject. None for a program evaluate() would
+    fail to flatten; evaluation reports that error.
+    """
+    try:
+        structure, literals = flatten_program(ast_object)
+    except Exception:
+        return None
+    _, _, usage = _estimate(structure, literals)
+    enforce(usage)
+    return usage
+
+
+def _estimate(structure: tuple, literals: list) -> tuple["Plan", bool, dict]:
+    """(plan, whether it was cached, resource usage); depth and literal count are enforced first."""
+    size = program_size(structure)
+    enforce(size, ("depth", "literals"))  # before compiling
+    plan, cached = get_plan(structure)
+    return plan, cached, {**size, **estimate(plan, literals)}
+
+
+def _plan_for(structure: tuple, literals: list) -> "Plan":
+    """The cached plan, once the program is known to be within the resource limits (dsl/limits.py)."""
+    plan, cached, usage = _estimate(structure, literals)
+    annotate(plan_cached=cached, plan_nodes=len(structure), plan_literals=len(literals),
+             plan_instructions=len(plan.instructions), rewrites=plan.rewrites,
+             estimated_peak_bytes=usage["peak_bytes"], estimated_flops=usage["flops"])
+    enforce(usage)
+    return plan
+
+
+def _annotate_flops(flops: dict):
+    # multiply work: in the order the program wrote it, as estimated for the order chosen, as run
+    if flops:
+        annotate(multiply_flops_written=flops.get("written", 0), multiply_flops_estimated=flops.get("estimated", 0),
+                 multiply_flops=flops.get("executed", 0))
+
+
+# === Literals ===
 
 def visit_list_helper(element):
     match element:
@@ -39,44 +144,256 @@ def visit_list(node : ast.List) -> np.ndarray:
     list = visit_list_helper(node)
     return np.array(list)
 
-def visit_call(node : ast.Call) -> np.ndarray:
-    match node.func.id:
-        case "transpose":
-            return transpose(node)
-        case "inverse":
-            return inverse(node)
-        case "add":
-            return add(node)
-        case "multiply":
-            return multiply(node)
-        case _:
-            assert False, f"Unrecognized matrix operation: {node.func.id}"
-
-
-# Operations
-
-def transpose(node : ast.Call) -> np.ndarray:
-    assert len(node.args) == 1, "A transpose operation was not given one argument"
-    matrix = visit_node(node.args[0])
-    matrix_transpose = np.transpose(matrix)
-    return matrix_transpose
-
-def inverse(node : ast.Call) -> np.ndarray:
-    assert len(node.args) == 1, "An inverse operation was not given one argument"
-    matrix = visit_node(node.args[0])
-    matrix_inverse = np.linalg.inv(matrix)
-    return matrix_inverse
-
-def add(node : ast.Call) -> np.ndarray:
-    assert len(node.args) == 2, "An add operation was not given two arguments"
-    a = visit_node(node.args[0])
-    b = visit_node(node.args[1])
-    sum = a + b
-    return sum
-
-def multiply(node : ast.Call) -> np.ndarray:
-    assert len(node.args) == 2, "An multiply operation was not given two arguments"
-    a = visit_node(node.args[0])
-    b = visit_node(node.args[1])
-    product = a @ b
-    return product
\ No newline at end of file
+
+# === Compilation ===
+
+class Plan:
+    """
+    A compiled program. Registers 0..literals-1 hold the literal slots; instruction i
+    writes register literals + i. Each instruction is (operation, argument registers,
+    registers whose last use it is). `rewrites` counts the optimizer rules that fired;
+    `orders` maps each "chain" register to its parenthesization as written (dsl/chain.py).
+    """
+
+    def __init__(self, literals: int, instructions: list, result: int, rewrites: dict | None = None,
+                 orders: dict | None = None):
+        self.literals = literals
+        self.instructions = instructions
+        self.result = result
+        self.rewrites = rewrites or {}
+        self.orders = orders or {}
+
+
+def flatten_program(program) -> tuple[tuple, list]:
+    """
+    (structure, literals) of a parsed program; a pair that is already flattened is returned
+    as is. Unlike the tree, the pair pickles at any nesting depth (utils/workers.py sends it).
+    """
+    if isinstance(program, tuple):
+        return program
+    assert isinstance(program, ast.Module), "Trying to evaulate something that is not an ast module"
+    assert len(program.body) == 1, "There is more than one body in the ast module"
+    return flatten(program.body[0].value)
+
+
+def flatten(root) -> tuple[tuple, list]:
+    """
+    Post-order form of an expression, built with an explicit stack:
+        multiply(A, transpose(A)) -> structure (0, 0, "transpose", "multiply"), literals [A]
+    Literal slots are ints and operations are names. Equal literals share one slot, and
+    each distinct list literal is converted to numpy once.
+    """
+    structure = []
+    literals = []
+    slots = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        match node:
+            case ast.Call() if expanded:
+                structure.append(node.func.id)
+            case ast.Call():
+                name = getattr(node.func, "id", None)
+                assert name in OPERATIONS, f"Unrecognized matrix operation: {name}"
+                assert len(node.args) == OPERATIONS[name][0], OPERATIONS[name][2]
+                stack.append((node, True))
+                stack.extend((arg, False) for arg in reversed(node.args))
+            case ast.List() | ast.Constant(value=np.ndarray()):
+                structure.append(_literal_slot(node, slots, literals))
+            case _:
+                assert False, f"Unrecognized ast node: {node}"
+    return tuple(structure), literals
+
+
+def _literal_slot(node, slots: dict, literals: list) -> int:
+    if isinstance(node, ast.List):
+        key = ast.dump(node)
+        slot = slots.get(key)
+        if slot is None:
+            slot = slots[key] = len(literals)
+            literals.append(visit_list(node))
+        return slot
+
+    # arrays: the same object (a named matrix used twice) or equal contents share a slot;
+    # contents are only compared against earlier literals of the same dtype and shape
+    value = node.value
+    slot = slots.get(id(value))
+    if slot is None:
+        candidates = slots.setdefault((value.dtype.str, value.shape), [])
+        slot = next((c for c in candidates if _same_values(literals[c], value)), None)
+        if slot is None:
+            slot = len(literals)
+            literals.append(value)
+            candidates.append(slot)
+        slots[id(value)] = slot
+    return slot
+
+
+def _same_values(a: np.ndarray, b: np.ndarray) -> bool:
+    # the first cell rejects most distinct literals without a full comparison
+    return a.size == 0 or (a.flat[0] == b.flat[0] and np.array_equal(a, b))
+
+
+def compile_plan(structure: tuple) -> Plan:
+    """
+    Hash-cons a flattened program into a DAG (each distinct (operation, arguments) runs
+    once), then apply the algebraic rewrites of dsl/optimize.py.
+    """
+    literals = 1 + max((token for token in structure if isinstance(token, int)), default=-1)
+    numbering = {}  # (operation, argument registers) -> register
+    instructions = []
+    stack = []
+    for token in structure:
+        if isinstance(token, int):
+            stack.append(token)
+            continue
+        arity = OPERATIONS[token][0]
+        key = (token, tuple(stack[-arity:]))
+        del stack[-arity:]
+        register = numbering.get(key)
+        if register is None:
+            register = numbering[key] = literals + len(instructions)
+            instructions.append(key)
+        stack.append(register)
+    result = stack[0]
+    rewrites, orders = {}, {}
+    if OPTIMIZE:
+        instructions, result, rewrites, orders = optimize(literals, instructions, result)
+
+    # release intermediates after their last use, so deep chains don't keep every matrix alive
+    last_use = {}
+    for index, (_, args) in enumerate(instructions):
+        for register in args:
+            last_use[register] = index
+    releases = [[] for _ in instructions]
+    for register, index in last_use.items():
+        if register != result:
+            releases[index].append(register)
+    instructions = [(op, args, tuple(release)) for (op, args), release in zip(instructions, releases)]
+    return Plan(literals, instructions, result, rewrites, orders)
+
+
+_plans = OrderedDict()
+_plan_stats = {"hits": 0, "misses": 0}
+_plans_lock = threading.Lock()
+
+
+def get_plan(structure: tuple) -> tuple[Plan, bool]:
+    """(plan, cached): compiled plans are shared by every program with the same structure."""
+    with _plans_lock:
+        plan = _plans.get(structure)
+        if plan is not None:
+            _plans.move_to_end(structure)
+            _plan_stats["hits"] += 1
+            return plan, True
+        _plan_stats["misses"] += 1
+    plan = compile_plan(structure)
+    with _plans_lock:
+        _plans[structure] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan, False
+
+
+def plan_cache_info() -> dict:
+    with _plans_lock:
+        return {"entries": len(_plans), "max_entries": PLAN_CACHE_SIZE, **_plan_stats}
+
+
+# === Execution ===
+
+def run_plan(plan: Plan, literals: list, kernels: dict = KERNELS, flops: dict | None = None,
+             memo_namespace: str | None = None, load=None):
+    """
+    Execute a plan; `flops` (if given) accumulates the multiply work: "written" and
+    "estimated" as 2mkn for the order as written and as chosen (dsl/chain.py), "executed"
+    as counted by the multiply kernel that ran (MULTIPLY_WORK; recalled results count nothing).
+    `load` converts each literal array into the kernels' representation (ExactMatrix, ...).
+    With a `memo_namespace`, expensive results are shared through the process-wide memo
+    (dsl/memo.py): instructions whose result is recalled, or only feeds recalled results,
+    do not run, and literals they alone need are not loaded.
+    """
+    registers = list(literals) + [None] * len(plan.instructions)
+    keys = pending = None
+    needed = range(plan.literals)
+    if memo_namespace is not None and any(op in MEMOIZED_OPERATIONS for op, _, _ in plan.instructions):
+        keys = _memo_keys(plan, literals, memo_namespace)
+        pending, needed = _recall(plan, keys, registers)
+    if load is not None:
+        for register in needed:
+            if register < plan.literals:
+                registers[register] = load(registers[register])
+    memo = get_memo()
+    multiply = kernels["multiply"] if flops is None else _counted(kernels["multiply"], flops)
+    for index, (operation, args, release) in enumerate(plan.instructions, start=plan.literals):
+        if pending is not None and not pending[index - plan.literals]:
+            continue
+        operands = [registers[register] for register in args]
+        if operation == "chain":
+            registers[index] = multiply_chain(operands, plan.orders[index], multiply, flops)
+        elif operation == "multiply":
+            if flops is not None:
+                _count_multiply(flops, *operands)
+            registers[index] = multiply(*operands)
+        else:
+            registers[index] = kernels[operation](*operands)
+        if keys is not None and operation in MEMOIZED_OPERATIONS:
+            memo.put(keys[index], registers[index])
+        for register in release:
+            registers[register] = None
+    return registers[plan.result]
+
+
+def _memo_keys(plan: Plan, literals: list, namespace: str) -> list[bytes]:
+    keys = [literal_key(value) for value in literals]
+    for operation, args, _ in plan.instructions:
+        keys.append(instruction_key(namespace, operation, (keys[register] for register in args)))
+    return keys
+
+
+def _recall(plan: Plan, keys: list, registers: list) -> tuple[list[bool], set]:
+    """
+    Fill registers from the memo, from the result down. Returns which instructions still
+    have to run and the registers they read.
+    """
+    memo = get_memo()
+    pending = [False] * len(plan.instructions)
+    needed = {plan.result}
+    recalled = 0
+    for index in range(len(plan.instructions) - 1, -1, -1):
+        register = plan.literals + index
+        if register not in needed:
+            continue
+        operation, args, _ = plan.instructions[index]
+        value = memo.get(keys[register]) if operation in MEMOIZED_OPERATIONS else None
+        if value is not None:
+            registers[register] = value
+            recalled += 1
+            continue
+        pending[index] = True
+        needed.update(args)
+    annotate(memo_hits=recalled)
+    return pending, needed
+
+
+def _count_multiply(flops: dict, a, b):
+    if len(a.shape) == len(b.shape) == 2 and a.shape[1] == b.shape[0]:
+        work = multiply_flops(a.shape, b.shape)
+        for key in ("written", "estimated"):
+            flops[key] = flops.get(key, 0) + work
+
+
+def _counted(multiply, flops: dict):
+    """`multiply` adding the work it did to flops["executed"]."""
+    work = MULTIPLY_WORK.get(multiply, _dense_work)
+
+    def counted(a, b):
+        result = multiply(a, b)
+        flops["executed"] = flops.get("executed", 0) + work(a, b)
+        return result
+
+    return counted
+
+
+def _dense_work(a, b) -> int:
+    return multiply_flops(a.shape, b.shape) if len(a.shape) == len(b.shape) == 2 else 0
@@ -0,0 +1,230 @@
+# dsl/exact.py
+"""
+Exact rational arithmetic for programs over integer and short-decimal matrices.
+
+An ExactMatrix is an integer numerator matrix over one common denominator (value =
+numerators / denominator), so add, multiply and transpose stay integer array operations,
+and inverse / solve use fraction-free (Bareiss) elimination: every intermediate entry is an
+integer minor of the input and each step divides exactly, so no per-entry Fraction objects
+or gcds are needed until the result is printed. Numerators are int64 while the bounds
+allow it and Python integers (object arrays) once they could overflow.
+
+    inverse([[1, 2], [3, 4]])  ->  ExactMatrix([[-4, 2], [3, -1]], 2)   i.e. [[-2, 1], [3/2, -1/2]]
+
+A decimal literal is exact when it has at most MAX_FRACTION_DIGITS digits after the point
+([[0.25]] is 25/100); longer ones are approximations and the program stays in floats.
+Results print as integers and \frac{p}{q} whatever their length (and, for programs with
+decimal literals, as terminating decimals of at most MAX_FRACTION_DIGITS digits).
+"""
+import math
+import os
+from decimal import Decimal
+import numpy as np
+
+# Integer and short-decimal programs whose matrices have at most EXACT_MAX_SIZE rows and
+# columns are evaluated exactly (benchmarks/exact_bench.py); TEXLM_EXACT=0 always uses floats
+EXACT_ARITHMETIC = os.getenv("TEXLM_EXACT", "1") != "0"
+EXACT_MAX_SIZE = int(os.getenv("TEXLM_EXACT_MAX_SIZE", "64"))
+# Decimal literals with at most this many digits after the point are exact, and results of
+# programs with decimal literals are printed as decimals when they terminate within as many digits
+MAX_FRACTION_DIGITS = int(os.getenv("TEXLM_MAX_FRACTION_DIGITS", "6"))
+
+# int64 arithmetic is used while every intermediate stays below this bound
+_INT64_SAFE = 2 ** 62
+
+
+class ExactMatrix:
+    """
+    numerators / denominator, with denominator > 0 and the fraction in lowest terms.
+    `decimal` marks results of programs with decimal literals, printed as decimals where exact.
+    """
+
+    def __init__(self, numerators: np.ndarray, denominator: int = 1, decimal: bool = False):
+        self.numerators = numerators
+        self.denominator = denominator
+        self.decimal = decimal
+
+    @classmethod
+    def from_integers(cls, values: np.ndarray) -> "ExactMatrix":
+        return cls(values.astype(np.int64), 1)
+
+    @classmethod
+    def from_literal(cls, values: np.ndarray) -> "ExactMatrix":
+        """An integer or short-decimal literal (see decimal_fraction)."""
+        if values.dtype.kind == "i":
+            return cls.from_integers(values)
+        numerators, denominator = decimal_fraction(values)
+        return _normalized(numerators, denominator)
+
+    @property
+    def shape(self) -> tuple:
+        return self.numerators.shape
+
+    def arrays(self) -> list[np.ndarray]:
+        return [self.numerators]
+
+    def to_float(self) -> np.ndarray:
+        # Python int / int is correctly rounded even for numerators beyond 2**53
+        return np.array(self.numerators.astype(object) / self.denominator, dtype=np.float64)
+
+    def latex_entries(self, max_digits: int = MAX_FRACTION_DIGITS) -> np.ndarray:
+        """
+        Object array of entries: ints for integral values, "\\frac{p}{q}" strings otherwise
+        (terminating decimals of at most `max_digits` digits for `decimal` results).
+        """
+        numerators = self.numerators.astype(object)
+        if self.denominator == 1:
+            return numerators
+        common = np.gcd(numerators, self.denominator)
+        reduced, denominators = numerators // common, self.denominator // common
+        entries = np.empty(reduced.shape, dtype=object)
+        for index, (p, q) in enumerate(zip(reduced.flat, denominators.flat)):
+            if q == 1:
+                entries.flat[index] = p
+                continue
+            decimal = _decimal(p, q, max_digits) if self.decimal else None
+            entries.flat[index] = decimal or ("-" if p < 0 else "") + f"\\frac{{{abs(p)}}}{{{q}}}"
+        return entries
+
+
+def decimal_fraction(values: np.ndarray) -> tuple[np.ndarray, int] | None:
+    """
+    (numerators, 10**k) with values == numerators / 10**k, for integer arrays (k = 0) and float
+    arrays whose entries all have at most MAX_FRACTION_DIGITS decimals (the smallest such k).
+    None for anything else: longer decimals were rounded when parsed and are not exact.
+    """
+    if values.dtype.kind == "i":
+        return values.astype(np.int64), 1
+    if values.dtype.kind != "f" or not values.size or not np.all(np.isfinite(values)):
+        return None
+    for k in range(MAX_FRACTION_DIGITS + 1):
+        scale = 10 ** k
+        scaled = np.round(values * scale)
+        if np.abs(scaled).max() >= 2 ** 53:
+            return None
+        # N / 10**k is correctly rounded, so this holds exactly when the literal was written as N / 10**k
+        if np.array_equal(scaled / scale, values):
+            return scaled.astype(np.int64), scale
+    return None
+
+
+def _decimal(p: int, q: int, max_digits: int) -> str | None:
+    """p / q written out when it terminates within `max_digits` significant digits."""
+    rest = q
+    for factor in (2, 5):
+        while rest % factor == 0:
+            rest //= factor
+    if rest != 1:
+        return None
+    # Decimal rounds to 28 digits, so a quotient that is exact within max_digits stays exact
+    text = format(Decimal(p) / Decimal(q), "f")
+    return text if len(text.lstrip("-0.").replace(".", "")) <= max_digits else None
+
+
+def _normalized(numerators: np.ndarray, denominator: int) -> ExactMatrix:
+    denominator = int(denominator)
+    if denominator < 0:
+        numerators, denominator = -numerators, -denominator
+    divisor = math.gcd(int(np.gcd.reduce(numerators, axis=None)) if numerators.size else 0, denominator)
+    if divisor > 1:
+        numerators, denominator = numerators // divisor, denominator // divisor
+    if numerators.dtype == object and _max_abs(numerators) < _INT64_SAFE:
+        numerators = numerators.astype(np.int64)
+    return ExactMatrix(numerators, denominator)
+
+
+def _max_abs(values: np.ndarray) -> int:
+    return int(np.abs(values).max()) if values.size else 0
+
+
+def _dtype(bound: int):
+    return np.int64 if bound < _INT64_SAFE else object
+
+
+# === Operations ===
+
+def transpose(a: ExactMatrix) -> ExactMatrix:
+    return ExactMatrix(a.numerators.T, a.denominator)
+
+
+def add(a: ExactMatrix, b: ExactMatrix) -> ExactMatrix:
+    if a.denominator == b.denominator:
+        dtype = _dtype(_max_abs(a.numerators) + _max_abs(b.numerators))
+        return _normalized(a.numerators.astype(dtype) + b.numerators.astype(dtype), a.denominator)
+    dtype = _dtype(_max_abs(a.numerators) * b.denominator + _max_abs(b.numerators) * a.denominator)
+    numerators = a.numerators.astype(dtype) * b.denominator + b.numerators.astype(dtype) * a.denominator
+    return _normalized(numerators, a.denominator * b.denominator)
+
+
+def multiply(a: ExactMatrix, b: ExactMatrix) -> ExactMatrix:
+    inner = a.numerators.shape[-1] if a.numerators.ndim else 1
+    dtype = _dtype(_max_abs(a.numerators) * _max_abs(b.numerators) * inner)
+    return _normalized(a.numerators.astype(dtype) @ b.numerators.astype(dtype), a.denominator * b.denominator)
+
+
+def inverse(a: ExactMatrix) -> ExactMatrix:
+    _check_square(a)
+    return solve(a, ExactMatrix(np.eye(a.shape[0], dtype=np.int64), 1))
+
+
+def solve(a: ExactMatrix, b: ExactMatrix) -> ExactMatrix:
+    """a^-1 b without forming the inverse."""
+    _check_square(a)
+    n = a.shape[0]
+    if b.numerators.ndim != 2 or b.shape[0] != n:
+        raise ValueError(f"solve: Input operand 1 has a mismatch in its core dimension 0, with gufunc signature "
+                         f"(m,m),(m,n)->(m,n) (size {b.shape[0] if b.numerators.ndim else 1} is different from {n})")
+    # (A/dA)^-1 (B/dB) = dA/dB * A^-1 B
+    solution, determinant = _bareiss(np.concatenate([a.numerators, b.numerators], axis=1), n)
+    return _normalized(solution * a.denominator, b.denominator * determinant)
+
+
+def is_singular(values: np.ndarray) -> bool:
+    """Exact singularity test of a square integer matrix (int64 or Python ints), by Bareiss elimination."""
+    try:
+        _bareiss(values, values.shape[0])  # no right-hand side
+    except np.linalg.LinAlgError:
+        return True
+    return False
+
+
+def _check_square(a: ExactMatrix):
+    if a.numerators.ndim != 2 or a.shape[0] != a.shape[1]:
+        raise np.linalg.LinAlgError("Last 2 dimensions of the array must be square")
+
+
+def _bareiss(augmented: np.ndarray, n: int) -> tuple[np.ndarray, int]:
+    """
+    Fraction-free Gauss-Jordan elimination on [A | B] with A n x n.
+    Returns (X, d) with A^-1 B = X / d (d is +-det(A)).
+    """
+    m = augmented.copy()
+    previous = 1
+    rows = np.arange(n)
+    for k in range(n):
+        if m[k, k] == 0:
+            candidates = np.flatnonzero(m[k + 1:, k])
+            if candidates.size == 0:
+                raise np.linalg.LinAlgError("Singular matrix")
+            swap = k + 1 + candidates[0]
+            m[[k, swap]] = m[[swap, k]]
+        # entries are minors and grow with k: stay in int64 until this step could overflow
+        if m.dtype != object and (abs(int(m[k, k])) * _max_abs(m[:, k:])
+                                  + _max_abs(m[:, k]) * _max_abs(m[k, k:])) >= _INT64_SAFE:
+            m = m.astype(object)
+        pivot = m[k, k]
+        others = rows != k
+        # columns left of k are already previous * I and are not read again
+        m[others, k:] = (pivot * m[others, k:] - np.outer(m[others, k], m[k, k:])) // previous
+        previous = pivot
+    # the left block is now previous * I
+    return m[:, n:], int(previous)
+
+
+EXACT_KERNELS = {
+    "transpose": transpose,
+    "inverse": inverse,
+    "add": add,
+    "multiply": multiply,
+    "solve": solve,
+}
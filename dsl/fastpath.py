@@ -0,0 +1,273 @@
+# dsl/fastpath.py
+"""
+Rule-based fast path for explicit, well-formed requests such as
+
+    "give me a latex table of the inverse of the transpose of the multiplication of
+     matrix ([1, -2], [3, 4]) and matrix ([4, 5], [6, 7])"
+
+Matrix literals are extracted from the text, the operation phrases are parsed inside-out
+into the DSL defined in dsl/grammar.py, and the result carries a confidence score.
+The fast path declines (dsl = None) whenever the request contains words it does not
+understand or more than one reading is possible, so the LLM generator stays in charge
+of everything that is not clear-cut.
+"""
+import re
+from .generator import extract_formatting
+
+# Routing threshold used by main.py
+FASTPATH_MIN_CONFIDENCE = 0.9
+# Stop enumerating readings of ambiguous sentences after this many
+MAX_PARSES = 8
+
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+(?:\.\d+)?|\.\d+)")
+# One row's entries after whitespace is removed ("1,-2.5,+3"), checked with a single match per row
+ROW_PATTERN = re.compile(rf"{NUMBER_PATTERN.pattern}(?:,{NUMBER_PATTERN.pattern})*")
+# "( [..], [..] )", "( [[..], [..]] )" or a bare "[[..], [..]]"
+MATRIX_PATTERN = re.compile(
+    r"\(\s*(\[[\d\s.,+\-\[\]]*\])\s*\)"
+    r"|(\[\s*\[[\d\s.,+\-\[\]]*\]\s*\])"
+)
+
+UNARY_OPERATIONS = {
+    "inverse": "inverse",
+    "transpose": "transpose",
+}
+BINARY_OPERATIONS = {
+    "multiplication": "multiply",
+    "product": "multiply",
+    "addition": "add",
+    "sum": "add",
+}
+OPERAND_SEPARATORS = {"and", "with"}
+# Trailing phrases such as "and then take the transpose" / "and then transposed"
+POSTFIX_OPERATIONS = {
+    "transpose": "transpose",
+    "transposed": "transpose",
+    "inverse": "inverse",
+    "inverted": "inverse",
+    "invert": "inverse",
+}
+
+# Words allowed around the math (request phrasing and formatting), but nowhere inside it
+REQUEST_WORDS = {
+    "give", "me", "generate", "can", "could", "you", "please", "output", "show", "produce",
+    "compute", "calculate", "find", "get", "return", "write", "make", "print", "display",
+    "what", "is", "i", "want", "need", "would", "like", "take",
+    "a", "an", "the", "of", "as", "in", "for", "to", "with",
+    "latex", "tex", "overleaf", "table", "tabular", "representation", "version", "code",
+    "matrix", "bmatrix", "pmatrix", "vmatrix", "format", "form", "formatted",
+}
+# ... plus closing phrases such as ". Output the result as a latex table" / ", and show it as latex"
+CLOSING_WORDS = REQUEST_WORDS | {"and", "then", "it", "result", "this", "that"}
+FILLER_WORDS = {"the", "of", "take", "then", "and", "it", "result", "that"}
+
+
+def extract_matrices(text: str) -> list[dict]:
+    """
+    Find matrix literals in free text.
+
+    Returns:
+        list of {"span": (start, end), "rows": [[number strings]], "dsl": "[[1, 2], [3, 4]]"}
+        A literal whose rows are ragged or contain non-numbers gets rows = None.
+    """
+    matrices = []
+    for match in MATRIX_PATTERN.finditer(text):
+        body = match.group(1) or match.group(2)
+        rows = _parse_rows(body)
+        matrices.append({
+            "span": match.span(),
+            "rows": rows,
+            "dsl": format_matrix(rows) if rows else None,
+        })
+    return matrices
+
+
+def format_matrix(rows: list[list[str]]) -> str:
+    """Matrix literal in the exact spacing DSL_GRAMMAR expects."""
+    return "[" + ", ".join("[" + ", ".join(row) + "]" for row in rows) + "]"
+
+
+def parse_fast_path(user_msg: str) -> dict:
+    """
+    Returns:
+        dict: {
+            "dsl": str | None,       # None when the fast path declines
+            "formatting": str,
+            "confidence": float,     # 0.0 - 1.0
+            "reason": str            # why it declined / how it parsed
+        }
+    """
+    formatting = extract_formatting(user_msg)
+    matrices = extract_matrices(user_msg)
+    if not matrices:
+        return _decline("no matrix literal found", formatting)
+    if any(m["rows"] is None for m in matrices):
+        return _decline("malformed matrix literal", formatting)
+
+    # Replace literals by placeholder tokens and tokenize the rest
+    pieces = []
+    last = 0
+    for i, m in enumerate(matrices):
+        start, end = m["span"]
+        pieces.append(user_msg[last:start])
+        pieces.append(f" __m{i}__ ")
+        last = end
+    pieces.append(user_msg[last:])
+    text = "".join(pieces).lower()
+
+    if NUMBER_PATTERN.search(re.sub(r"__m\d+__", " ", text)):
+        # numbers outside a literal (e.g. "3 by 3") are beyond the fast path
+        return _decline("stray numbers outside matrix literals", formatting)
+
+    tokens = re.findall(r"__m\d+__|[a-z]+", text)
+    start = next((i for i, t in enumerate(tokens)
+                  if t in UNARY_OPERATIONS or t in BINARY_OPERATIONS or t.startswith("__m")), None)
+    # Include a leading "matrix" keyword in the math span
+    if start is not None and start > 0 and tokens[start - 1] == "matrix":
+        start -= 1
+
+    prefix = tokens[:start]
+    unknown = [t for t in prefix if t not in REQUEST_WORDS]
+    if unknown:
+        return _decline(f"unrecognized words: {', '.join(unknown)}", formatting)
+
+    parses = {}
+    for tree, end in _parse_expression(tokens, start):
+        tree, end = _parse_postfix(tokens, end, tree)
+        suffix = tokens[end:]
+        if all(t in CLOSING_WORDS for t in suffix):
+            dsl = _to_dsl(tree, matrices)
+            parses.setdefault(dsl, tree)
+        if len(parses) >= MAX_PARSES:
+            break
+
+    if not parses:
+        return _decline("could not parse the operation phrases", formatting)
+
+    used = set()
+    for tree in parses.values():
+        used |= _literals_used(tree)
+    if used != set(range(len(matrices))):
+        return _decline("not every matrix literal is used", formatting)
+
+    # Several distinct readings: the sentence is ambiguous, confidence drops with each one
+    confidence = 1.0 / len(parses)
+    dsl = next(iter(parses))
+    return {
+        "dsl": dsl,
+        "formatting": formatting,
+        "confidence": confidence,
+        "reason": "unambiguous" if len(parses) == 1 else f"{len(parses)} possible readings",
+    }
+
+
+# === Parsing ===
+# Trees are tuples: ("literal", index) | (op_name, child, ...)
+
+def _parse_expression(tokens, i):
+    """Yield every (tree, next_index) reading of an expression starting at tokens[i]."""
+    while i < len(tokens) and tokens[i] == "the":
+        i += 1
+    if i >= len(tokens):
+        return
+
+    token = tokens[i]
+    if token in UNARY_OPERATIONS and _at(tokens, i + 1, "of"):
+        for child, j in _parse_expression(tokens, i + 2):
+            yield (UNARY_OPERATIONS[token], child), j
+
+    elif token in BINARY_OPERATIONS and _at(tokens, i + 1, "of"):
+        op = BINARY_OPERATIONS[token]
+        for first, j in _parse_expression(tokens, i + 2):
+            yield from _parse_operands(tokens, j, op, first)
+
+    else:
+        for base, j in _parse_matrix(tokens, i):
+            yield base, j
+            # "matrix ([100]) multiplied by itself" / "... multiplied by matrix (...)"
+            if _at(tokens, j, "multiplied") and _at(tokens, j + 1, "by"):
+                if _at(tokens, j + 2, "itself"):
+                    yield ("multiply", base, base), j + 3
+                else:
+                    for other, k in _parse_expression(tokens, j + 2):
+                        yield ("multiply", base, other), k
+
+
+def _parse_operands(tokens, i, op, left):
+    """Operands of a binary phrase: "<op> of X and Y (and Z ...)", folded left to right."""
+    if _at_any(tokens, i, OPERAND_SEPARATORS):
+        for right, j in _parse_expression(tokens, i + 1):
+            combined = (op, left, right)
+            yield combined, j
+            yield from _parse_operands(tokens, j, op, combined)
+
+
+def _parse_matrix(tokens, i):
+    if _at(tokens, i, "matrix"):
+        i += 1
+    if i < len(tokens) and tokens[i].startswith("__m"):
+        yield ("literal", int(tokens[i][3:-2])), i + 1
+
+
+def _parse_postfix(tokens, i, tree):
+    """Trailing operations that apply to everything before them, e.g. "and then take the transpose"."""
+    while True:
+        j = i
+        while j < len(tokens) and tokens[j] in FILLER_WORDS:
+            j += 1
+        if j == i or j >= len(tokens) or tokens[j] not in POSTFIX_OPERATIONS:
+            return tree, i
+        if "then" not in tokens[i:j]:
+            return tree, i
+        tree = (POSTFIX_OPERATIONS[tokens[j]], tree)
+        i = j + 1
+        if _at(tokens, i, "it"):
+            i += 1
+
+
+def _to_dsl(tree, matrices) -> str:
+    if tree[0] == "literal":
+        return matrices[tree[1]]["dsl"]
+    args = ", ".join(_to_dsl(child, matrices) for child in tree[1:])
+    return f"{tree[0]}({args})"
+
+
+def _literals_used(tree) -> set:
+    if tree[0] == "literal":
+        return {tree[1]}
+    used = set()
+    for child in tree[1:]:
+        used |= _literals_used(child)
+    return used
+
+
+def _parse_rows(body: str):
+    compact = "".join(body.split())
+    if compact.startswith("[["):
+        if not compact.endswith("]]"):
+            return None
+        compact = compact[1:-1]
+    raw_rows = re.findall(r"\[([^\[\]]*)\]", compact)
+    # everything outside the rows must be separators
+    if re.sub(r"\[[^\[\]]*\]", "", compact).strip(",") != "":
+        return None
+    rows = []
+    for raw in raw_rows:
+        if not ROW_PATTERN.fullmatch(raw):
+            return None
+        rows.append(raw.replace("+", "").split(","))
+    if not rows or len({len(r) for r in rows}) != 1:
+        return None
+    return rows
+
+
+def _at(tokens, i, word) -> bool:
+    return i < len(tokens) and tokens[i] == word
+
+
+def _at_any(tokens, i, words) -> bool:
+    return i < len(tokens) and tokens[i] in words
+
+
+def _decline(reason: str, formatting: str) -> dict:
+    return {"dsl": None, "formatting": formatting, "confidence": 0.0, "reason": reason}
@@ -1,7 +1,9 @@
 # dsl/generator.py
-from typing import Optional
-from openai import OpenAI
-from .grammar import DSL_GRAMMAR
+from typing import Iterator, Optional, Sequence
+from openai import OpenAI, AsyncOpenAI
+from .grammar import dsl_grammar
+from utils.cache import get_cache, make_key
+from utils.telemetry import record_llm_call, usage_of
 from config.prompts import (
     DSL_GENERATOR_SYSTEM_PROMPT,
     DSL_GENERATOR_FEW_SHOT,
@@ -9,30 +11,150 @@ from config.prompts import (
     DSL_GENERATOR_TOOL_DESCRIPTION,
 )
 
-def generate_dsl_and_format(client: OpenAI, user_msg: str, *, model: str = "gpt-5") -> dict:
+# Reasoning effort used when the caller does not pick one
+DEFAULT_EFFORT = "minimal"
+# Fields of a generator result kept in the response cache
+CACHED_FIELDS = ("reasoning", "formatting", "dsl", "response_id", "call_id", "usage")
+
+
+def generate_dsl_and_format(client: OpenAI, user_msg: str, *, model: str = "gpt-5",
+                            effort: str = DEFAULT_EFFORT, previous: Optional[dict] = None,
+                            symbols: Sequence[str] = ()) -> dict:
     """
     Super-Generator:
     Uses GPT-5 Responses API to get both reasoning (text) and DSL (constrained tool) in one pass.
-    
+
+    Args:
+        previous: result of an earlier call. When given, `user_msg` is only the feedback for
+            that attempt and the request continues the stored conversation
+            (previous_response_id) instead of resending the system prompt and the matrices.
+        symbols: matrix names (dsl/symbols.py) the DSL may use in place of literals.
+
     Returns:
         dict: {
             "reasoning": str,
             "formatting": str,
-            "dsl": str
+            "dsl": str,
+            "response_id": str | None,  # for continuing the conversation
+            "call_id": str | None,      # id of the DSL tool call
+            "usage": dict,              # token counts (see usage_of)
+            "cached": bool,             # answered from the response cache
+            "cache_key": str            # see settle_generated
         }
+
+    Results are not cached here: the pipeline calls settle_generated once it knows whether
+    the DSL passed verification and executed.
     """
-    user_prompt = f"User Request: {user_msg}"
+    request = build_generator_request(user_msg, model=model, effort=effort, previous=previous, symbols=symbols)
+
+    # Identical requests are answered from the response cache
+    cache = get_cache()
+    cache_key = generator_cache_key(request)
+    cached = cache.get("generator", cache_key)
+    if cached is not None:
+        record_llm_call("generate", model, cached=True)
+        return {**cached, "cached": True, "cache_key": cache_key}
 
     # Call GPT-5 Responses API
-    resp = client.responses.create(
-        model=model,
-        input=[
+    resp = client.responses.create(**request)
+
+    return {**parse_generator_response(resp, model), "cache_key": cache_key}
+
+
+def generate_dsl_and_format_stream(client: OpenAI, user_msg: str, *, model: str = "gpt-5",
+                                   effort: str = DEFAULT_EFFORT, previous: Optional[dict] = None,
+                                   symbols: Sequence[str] = ()) -> Iterator[dict]:
+    """
+    Streaming Super-Generator. Yields events as soon as the model produces them:
+        {"type": "reasoning_delta", "text": str}   token(s) from the text channel
+        {"type": "dsl", "dsl": str}                the tool channel (DSL) has closed
+        {"type": "generated", "result": dict}      last event, same dict as generate_dsl_and_format
+    """
+    request = build_generator_request(user_msg, model=model, effort=effort, previous=previous, symbols=symbols)
+
+    cache = get_cache()
+    cache_key = generator_cache_key(request)
+    cached = cache.get("generator", cache_key)
+    if cached is not None:
+        record_llm_call("generate", model, cached=True)
+        if cached["reasoning"]:
+            yield {"type": "reasoning_delta", "text": cached["reasoning"]}
+        if cached["dsl"]:
+            yield {"type": "dsl", "dsl": cached["dsl"]}
+        yield {"type": "generated", "result": {**cached, "cached": True, "cache_key": cache_key}}
+        return
+
+    result = None
+    for event in client.responses.create(**request, stream=True):
+        event_type = getattr(event, "type", "")
+        if event_type == "response.output_text.delta":
+            yield {"type": "reasoning_delta", "text": event.delta}
+        elif event_type == "response.custom_tool_call_input.done":
+            yield {"type": "dsl", "dsl": event.input.strip()}
+        elif event_type == "response.completed":
+            result = parse_generator_response(event.response, model)
+        elif event_type in ("response.failed", "error"):
+            error = getattr(getattr(event, "response", None), "error", None) or event
+            raise RuntimeError(getattr(error, "message", None) or "Generator stream failed")
+
+    if result is None:
+        raise RuntimeError("Generator stream ended without a completed response")
+    yield {"type": "generated", "result": {**result, "cache_key": cache_key}}
+
+
+async def generate_dsl_and_format_async(client: AsyncOpenAI, user_msg: str, *, model: str = "gpt-5",
+                                        effort: str = DEFAULT_EFFORT, previous: Optional[dict] = None,
+                                        symbols: Sequence[str] = ()) -> dict:
+    """Async version of generate_dsl_and_format (same arguments and return schema)."""
+    request = build_generator_request(user_msg, model=model, effort=effort, previous=previous, symbols=symbols)
+
+    cache = get_cache()
+    cache_key = generator_cache_key(request)
+    cached = cache.get("generator", cache_key)
+    if cached is not None:
+        record_llm_call("generate", model, cached=True)
+        return {**cached, "cached": True, "cache_key": cache_key}
+
+    resp = await client.responses.create(**request)
+
+    return {**parse_generator_response(resp, model), "cache_key": cache_key}
+
+
+def settle_generated(result: dict, succeeded: bool):
+    """
+    Cache a generator result once its DSL has been verified and executed (`succeeded`), or
+    drop a cached one that failed, so that a bad DSL is not replayed for every identical
+    prompt and a retry can recover. Results without a cache key (fast path) are ignored.
+    """
+    key = result.get("cache_key")
+    if not key:
+        return
+    if succeeded and not result.get("cached"):
+        get_cache().set("generator", key, {field: result.get(field) for field in CACHED_FIELDS})
+    elif not succeeded and result.get("cached"):
+        get_cache().delete("generator", key)
+
+
+def build_generator_request(user_msg: str, *, model: str = "gpt-5", effort: str = DEFAULT_EFFORT,
+                            previous: Optional[dict] = None, symbols: Sequence[str] = ()) -> dict:
+    """Keyword arguments for client.responses.create."""
+    if previous is None:
+        input_items = [
             {"role": "system", "content": SUPER_GEN_SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ],
+            {"role": "user", "content": f"User Request: {user_msg}"}
+        ]
+    elif previous.get("call_id"):
+        # The stored conversation ends with our DSL tool call: answer it with the feedback
+        input_items = [{"type": "custom_tool_call_output", "call_id": previous["call_id"], "output": user_msg}]
+    else:
+        input_items = [{"role": "user", "content": user_msg}]
+
+    request = dict(
+        model=model,
+        input=input_items,
         # Configuration: allow both text and custom tool output
         text={"format": {"type": "text"}, "verbosity": "low"},
-        reasoning={"effort": "minimal"}, 
+        reasoning={"effort": effort},
         tools=[{
             "type": "custom",
             "name": "dsl_grammar",
@@ -40,51 +162,84 @@ def generate_dsl_and_format(client: OpenAI, user_msg: str, *, model: str = "gpt-
             "format": {
                 "type": "grammar",
                 "syntax": "lark",
-                "definition": DSL_GRAMMAR
+                "definition": dsl_grammar(symbols)
             }
         }],
         parallel_tool_calls=False
     )
+    if previous is not None:
+        # System prompt, grammar context and matrices are already stored server-side
+        request["previous_response_id"] = previous["response_id"]
+    return request
+
+
+def generator_cache_key(request: dict) -> str:
+    payload = {
+        "input": [item for item in request["input"] if item.get("role") != "system"],
+        "effort": request["reasoning"]["effort"],
+    }
+    if request.get("previous_response_id"):
+        payload["previous_response_id"] = request["previous_response_id"]
+    return make_key(request["model"], SUPER_GEN_SYSTEM_PROMPT, payload, request["tools"])
+
+
+def parse_generator_response(resp, model: str = "gpt-5") -> dict:
+    """parse_generator_output plus the response id and token usage."""
+    result = parse_generator_output(resp.output)
+    result["response_id"] = getattr(resp, "id", None)
+    result["usage"] = usage_of(resp)
+    result["cached"] = False
+    record_llm_call("generate", model, result["usage"])
+    return result
 
+
+def parse_generator_output(output: list) -> dict:
     # === Parse Dual Outputs ===
     reasoning_text = ""
-    formatting_intent = "latex matrix" # Default fallback
     dsl_code = ""
+    call_id = None
 
     # Iterate through the output stream
-    for item in resp.output:
+    for item in output:
         # 1. Capture Text Channel (Reasoning & Formatting)
         if hasattr(item, "content") and item.content:
             chunks = []
             for c in item.content:
                 if hasattr(c, "text"):
                     chunks.append(c.text)
-            
+
             full_text = "".join(chunks).strip()
             if full_text:
                 reasoning_text += full_text + " "
-        
+
         # 2. Capture Tool Channel (DSL) - Constrained by Lark
         if hasattr(item, "input") and isinstance(item.input, str):
             candidate = item.input.strip()
             if candidate:
                 dsl_code = candidate
+                call_id = getattr(item, "call_id", None)
 
     # NOTE: if dsl is empty string,  it indicates the prompt itself has error
     # the output therefore would be reasoning from gpt-5
 
+    return {
+        "reasoning": reasoning_text.strip(),
+        "formatting": extract_formatting(reasoning_text),
+        "dsl": dsl_code,
+        "call_id": call_id
+    }
+
 
+def extract_formatting(reasoning_text: str) -> str:
     # Simple heuristic to extract formatting intent from reasoning text
+    formatting_intent = "latex matrix" # Default fallback
     reasoning_lower = reasoning_text.lower()
     if "table" in reasoning_lower:
         formatting_intent = "latex table"
+    elif any(env in reasoning_lower for env in ("pmatrix", "vmatrix", "smallmatrix")):
+        # keep explicit environments so the local renderer can honour them
+        env = next(env for env in ("pmatrix", "vmatrix", "smallmatrix") if env in reasoning_lower)
+        formatting_intent = f"latex {env}"
     elif "bmatrix" in reasoning_lower or "matrix" in reasoning_lower:
         formatting_intent = "latex matrix"
-
-    return {
-        "reasoning": reasoning_text.strip(),
-        "formatting": formatting_intent,
-        "dsl": dsl_code 
-    }
-
-
+    return formatting_intent
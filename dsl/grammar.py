@@ -25,3 +25,17 @@ rows: row (COMMA SP row)*
 row: LBRACK elements RBRACK
 elements: NUMBER (COMMA SP NUMBER)*
 """
+
+
+def dsl_grammar(symbols=()) -> str:
+    """
+    DSL_GRAMMAR, optionally extended so that the named matrices in `symbols`
+    (placeholders such as M1, M2 from dsl/symbols.py) can stand in for literals.
+    """
+    if not symbols:
+        return DSL_GRAMMAR
+    names = " | ".join(f'"{name}"' for name in symbols)
+    return (
+        DSL_GRAMMAR.replace("start: call | matrix", "start: call | matrix | SYMBOL")
+        + f"\n// Named matrices supplied with the request\nSYMBOL: {names}\n"
+    )
@@ -0,0 +1,187 @@
+# dsl/limits.py
+"""
+Pre-flight resource estimate and hard limits for evaluation.
+
+A pasted 100000x1 column times its transpose is 80 GB of result, and allocating it
+OOM-kills the pod and every session on the replica. Before the plan runs, the evaluator
+works out from the literal shapes and the compiled plan alone, without allocating anything:
+
+    depth        nesting depth of the program as written
+    literals     matrix literals in the program as written
+    shape/dtype  of the result
+    peak_bytes   most bytes alive at once: literals, intermediate results until their
+                 last use, and LAPACK's working copy in inverse / solve
+    flops        2mkn per product (chains in the order they will run), 2n^3 per inverse,
+                 2n^3/3 + 2n^2k per solve, one per added entry
+
+Programs over a limit raise ResourceLimitError, which names the limit and its setting:
+
+    TEXLM_MAX_DEPTH      10000
+    TEXLM_MAX_LITERALS   10000
+    TEXLM_MAX_BYTES      1/4 of the container memory limit (128 MiB under 512Mi), at most 1 GiB
+    TEXLM_MAX_FLOPS      5e10 (tens of seconds of NumPy)
+
+The estimate follows the dense float path (within ~30% of traced peaks); memo hits and
+structured matrices (dsl/structured.py) only lower the real usage. It stops at the first
+shape error, which evaluation then raises as usual. The checks also run on the parsed program
+before static analysis (evaluate.preflight), which does numeric work of its own.
+TEXLM_LIMITS=0 disables the checks.
+"""
+import os
+import numpy as np
+from .chain import choose_order, fold, multiply_flops
+from .memo import container_memory_limit
+
+_DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def _default_max_bytes() -> int:
+    limit = container_memory_limit()
+    return min(limit // 4, _DEFAULT_MAX_BYTES) if limit else _DEFAULT_MAX_BYTES
+
+
+LIMITS_ENABLED = os.getenv("TEXLM_LIMITS", "1") != "0"
+# estimate key -> (maximum, setting)
+LIMITS = {
+    "depth": (int(os.getenv("TEXLM_MAX_DEPTH", "10000")), "TEXLM_MAX_DEPTH"),
+    "literals": (int(os.getenv("TEXLM_MAX_LITERALS", "10000")), "TEXLM_MAX_LITERALS"),
+    "peak_bytes": (int(os.getenv("TEXLM_MAX_BYTES", "0")) or _default_max_bytes(), "TEXLM_MAX_BYTES"),
+    "flops": (int(float(os.getenv("TEXLM_MAX_FLOPS", "5e10"))), "TEXLM_MAX_FLOPS"),
+}
+
+_DESCRIPTIONS = {
+    "depth": "nesting depth",
+    "literals": "number of matrix literals",
+    "peak_bytes": "peak memory",
+    "flops": "amount of arithmetic",
+}
+
+
+class ResourceLimitError(ValueError):
+    """A program exceeds a resource limit. `limit` is the estimate key, `usage` the whole estimate."""
+
+    def __init__(self, limit: str, usage: dict):
+        maximum, setting = LIMITS[limit]
+        super().__init__(
+            f"The program is too large to evaluate: its {_DESCRIPTIONS[limit]} is "
+            f"{_format(limit, usage[limit])}, over the limit of {_format(limit, maximum)} ({setting}).")
+        self.limit = limit
+        self.usage = {**usage, "dtype": usage.get("dtype") and str(usage["dtype"])}
+
+    def __reduce__(self):  # raised in worker processes (utils/workers.py)
+        return ResourceLimitError, (self.limit, self.usage)
+
+
+def _format(limit: str, value: int) -> str:
+    if limit == "peak_bytes":
+        for unit, size in (("GiB", 1 << 30), ("MiB", 1 << 20), ("KiB", 1 << 10)):
+            if value >= size:
+                return f"{value / size:.1f} {unit}"
+        return f"{value} bytes"
+    if limit == "flops":
+        return f"{value:.2e} floating-point operations"
+    return str(value)
+
+
+def enforce(usage: dict, keys=tuple(LIMITS)):
+    """Raise ResourceLimitError for the first of `keys` over its limit (no-op when disabled)."""
+    if not LIMITS_ENABLED:
+        return
+    for key in keys:
+        if usage.get(key, 0) > LIMITS[key][0]:
+            raise ResourceLimitError(key, usage)
+
+
+# === Estimates ===
+
+def program_size(structure: tuple) -> dict:
+    """Depth and literal count of a flattened program (see evaluate.flatten)."""
+    depths = []
+    literals = 0
+    for token in structure:
+        if isinstance(token, int):
+            literals += 1
+            depths.append(1)
+            continue
+        arity = 1 if token in ("transpose", "inverse") else 2
+        depth = 1 + max(depths[-arity:])
+        del depths[-arity:]
+        depths.append(depth)
+    return {"depth": depths[0] if depths else 0, "literals": literals}
+
+
+def estimate(plan, literals: list) -> dict:
+    """Result shape/dtype, peak bytes and flops of running `plan` (evaluate.Plan) on `literals` (2-D)."""
+    shapes = [literal.shape for literal in literals]
+    dtypes = [literal.dtype for literal in literals]
+    sizes = [0] * len(literals)  # bytes each register frees on release (literals belong to the caller)
+    live = peak = sum(literal.nbytes for literal in literals)
+    flops = 0
+    for index, (operation, args, release) in enumerate(plan.instructions, start=plan.literals):
+        step = _step(operation, [shapes[r] for r in args], [dtypes[r] for r in args], plan.orders.get(index))
+        if step is None:  # evaluation raises here
+            return {"shape": None, "dtype": None, "peak_bytes": peak, "flops": flops}
+        shape, dtype, work, scratch = step
+        size = 0 if operation == "transpose" else _nbytes(shape, dtype)  # transposes are views
+        peak = max(peak, live + scratch + size)
+        live += size
+        flops += work
+        shapes.append(shape)
+        dtypes.append(dtype)
+        sizes.append(size)
+        for register in release:
+            live -= sizes[register]
+    result = plan.result
+    return {"shape": shapes[result], "dtype": dtypes[result], "peak_bytes": peak, "flops": flops}
+
+
+def _nbytes(shape: tuple, dtype: np.dtype) -> int:
+    return shape[0] * shape[1] * dtype.itemsize
+
+
+def _step(operation: str, shapes: list, dtypes: list, order):
+    """(shape, dtype, flops, scratch bytes) of one instruction, None for a shape error."""
+    if not all(len(shape) == 2 for shape in shapes):
+        return None
+    dtype = dtypes[0] if len(dtypes) == 1 or all(d == dtypes[0] for d in dtypes) else np.result_type(*dtypes)
+    match operation:
+        case "transpose":
+            return shapes[0][::-1], dtype, 0, 0
+        case "add":
+            if shapes[0] != shapes[1]:
+                return None
+            return shapes[0], dtype, shapes[0][0] * shapes[0][1], 0
+        case "multiply":
+            if shapes[0][1] != shapes[1][0]:
+                return None
+            return (shapes[0][0], shapes[1][1]), dtype, multiply_flops(*shapes), 0
+        case "inverse" | "solve":
+            (n, m), floating = shapes[0], (dtype if dtype.kind in "fc" else np.result_type(dtype, np.float64))
+            if n != m or (operation == "solve" and shapes[1][0] != n):
+                return None
+            shape = shapes[-1]
+            work = 2 * n ** 3 if operation == "inverse" else 2 * n ** 3 // 3 + 2 * n * n * shape[1]
+            return shape, floating, work, _nbytes((n, n), floating)
+        case "chain":
+            chosen = choose_order(shapes, order)
+            if chosen is None:
+                return None
+            order, _, work = chosen
+            return (shapes[0][0], shapes[-1][1]), dtype, work, _chain_scratch(order, shapes, dtype)
+    return None
+
+
+def _chain_scratch(order, shapes: list, dtype) -> int:
+    """Most bytes of intermediate products alive at once while a chain is folded (dsl/chain.py)."""
+    live = peak = 0
+
+    def combine(a, b):
+        nonlocal live, peak
+        shape = (a[0][0], b[0][1])
+        size = _nbytes(shape, dtype)
+        peak = max(peak, live + size)
+        live += size - a[1] - b[1]  # the operands' intermediates are released
+        return shape, size
+
+    final = fold(order, [(shape, 0) for shape in shapes], combine)
+    return peak - final[1]
@@ -0,0 +1,72 @@
+# dsl/literals.py
+"""
+Bulk loader for DSL matrix literals.
+
+Matrix literals are nearly all of a DSL program's text. Tokenizing them cell by cell costs
+a token, a Python number and a list slot per entry (a 1000x1000 paste is millions of
+objects). load_matrix() instead validates a literal on its raw text (one character-class
+scan plus separator counts, which also give the row and column counts) and converts every
+number with a single np.fromstring call into one contiguous buffer, reshaped without a copy:
+
+    load_matrix("[[1, 2], [3, 4]]")  ->  array([[1, 2], [3, 4]])
+    load_matrix("[[1, 2], [3]]")     ->  None (ragged)
+
+Anything it does not accept (ragged or empty rows, spacing the grammar rejects, integers
+that overflow int64, ...) returns None and is left to the grammar parser, so the accepted
+language and the error messages stay those of DSL_GRAMMAR.
+"""
+import re
+import warnings
+import numpy as np
+
+# Literals spanning "[[" to the first "]]"; entries are validated by load_matrix
+LITERAL_PATTERN = re.compile(r"\[\[[^\[\]]*\](?:, \[[^\[\]]*\])*\]")
+_LITERAL_CHARACTERS = re.compile(r"[0-9.,\[\] +\-]*")
+# Text np.fromstring reads but NUMBER does not match: empty entries and a trailing "." ("1.").
+# Other malformed entries ("1.2.3", "1-2", "-") make fromstring stop early, which is caught.
+_EMPTY_OR_TRAILING_DOT = (", ,", ", ]", "[, ", ".,", ".]")
+_INT64_DIGITS = 18
+
+
+def load_matrix(literal: str) -> np.ndarray | None:
+    """
+    `literal` in DSL_GRAMMAR's exact spacing ("[[1, 2], [3, 4]]") as a 2-D array: int64 when
+    no entry has a decimal point, float64 otherwise. None when the text is not a well-formed
+    rectangular literal.
+    """
+    if not (literal.startswith("[[") and literal.endswith("]]")) or not _LITERAL_CHARACTERS.fullmatch(literal):
+        return None
+    body = literal[2:-2]
+    rows = body.count("], [") + 1
+    separators = body.count(", ")
+    # only "], [" may contain brackets, every comma is followed by exactly one space, no other spaces
+    if (body.count("[") != rows - 1 or body.count("]") != rows - 1 or body.count(",") != separators
+            or body.count(" ") != separators or body.startswith(", ") or body.endswith((", ", "."))
+            or any(pattern in body for pattern in _EMPTY_OR_TRAILING_DOT)):
+        return None
+    cells = separators - (rows - 1) + rows
+    if cells % rows:
+        return None
+    cols = cells // rows
+    if any(row.count(", ") != cols - 1 or not row for row in body.split("], [")):
+        return None  # ragged or empty rows
+
+    is_float = "." in body
+    if not is_float and re.search(rf"[0-9]{{{_INT64_DIGITS + 1}}}", body):
+        return None
+    try:
+        with warnings.catch_warnings():
+            # numpy < 2 warns (and returns what it read) where numpy 2 raises
+            warnings.simplefilter("error", DeprecationWarning)
+            # no count=: it would stop at the expected size without checking the rest of the text
+            values = np.fromstring(body.replace("], [", ", "), dtype=np.float64 if is_float else np.int64, sep=",")
+    except (ValueError, DeprecationWarning):
+        return None
+    if values.size != cells:
+        return None
+    return values.reshape(rows, cols)
+
+
+def find_literals(text: str):
+    """(start, end) spans of the bracketed matrix literals in `text`."""
+    return (match.span() for match in LITERAL_PATTERN.finditer(text))
@@ -0,0 +1,203 @@
+# dsl/memo.py
+"""
+Process-wide memo of evaluated subexpressions, shared by all requests and sessions.
+
+Users iterate on the same matrices (the product, then its transpose, then its inverse), so
+expensive intermediate results are kept between requests. Keys are Merkle hashes: a literal's
+key digests its dtype, shape and bytes, and an instruction's key digests its operation and
+its arguments' keys. Equal subexpressions therefore share a key whatever program, matrix
+names or plan numbering they came from:
+
+    key(A)                        = H(dtype, shape, bytes of A)
+    key(inverse(multiply(A, B)))  = H("inverse", H("multiply", key(A), key(B)))
+
+Only operations worth keeping are stored (transposes are views and add is one pass).
+Stored arrays are made read-only, so a hit is used inside a plan as is, without a defensive
+copy; evaluate() hands its caller a writable copy (writable()) of a result the memo owns.
+Eviction is LRU by bytes within TEXLM_MEMO_MAX_BYTES, which defaults to 1/8 of the
+container's memory limit (64 MiB under the 512Mi k8s limit). TEXLM_MEMO=0 disables the memo.
+Evaluation worker processes (utils/workers.py) read and write the parent's memo, so the
+results outlive a recycled worker and are shared between workers.
+"""
+import copy
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+MEMOIZED_OPERATIONS = frozenset({"inverse", "multiply", "solve", "chain"})
+_DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def container_memory_limit() -> int | None:
+    """The cgroup (v2 or v1) memory limit of this container in bytes; None when unlimited."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            return int(value)
+    return None
+
+
+def _default_max_bytes() -> int:
+    limit = container_memory_limit()
+    return min(limit // 8, _DEFAULT_MAX_BYTES) if limit else _DEFAULT_MAX_BYTES
+
+
+MEMO = os.getenv("TEXLM_MEMO", "1") != "0"
+MEMO_MAX_BYTES = int(os.getenv("TEXLM_MEMO_MAX_BYTES", "0")) or _default_max_bytes()
+
+
+# === Keys ===
+
+def literal_key(value: np.ndarray) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{value.dtype.str}{value.shape}".encode())
+    digest.update(np.ascontiguousarray(value).data if value.dtype != object else repr(value.tolist()).encode())
+    return digest.digest()
+
+
+def instruction_key(namespace: str, operation: str, arg_keys) -> bytes:
+    """`namespace` separates arithmetics whose results differ for the same program ("float", "exact")."""
+    digest = hashlib.blake2b(f"{namespace}:{operation}".encode(), digest_size=16)
+    for key in arg_keys:
+        digest.update(key)
+    return digest.digest()
+
+
+# === Store ===
+
+def _arrays(value) -> list[np.ndarray]:
+    # ExactMatrix and StructuredMatrix values list the arrays they are made of
+    return [value] if isinstance(value, np.ndarray) else value.arrays()
+
+
+def _frozen(value):
+    """`value` made read-only (the memo owns it from now on)."""
+    for array in _arrays(value):
+        array.setflags(write=False)
+    return value
+
+
+def writable(value):
+    """`value`, or a writable copy of it when it is (part of) a memo entry."""
+    if all(array.flags.writeable for array in _arrays(value)):
+        return value
+    return copy.deepcopy(value)
+
+
+def _nbytes(value) -> int:
+    total = 0
+    for array in _arrays(value):
+        if array.dtype == object:  # Python integers of the exact path
+            total += array.nbytes + sum(map(sys.getsizeof, array.flat))
+        else:
+            total += array.nbytes if array.base is None else array.base.nbytes
+    return total
+
+
+class ResultMemo:
+    """LRU of evaluated results bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, bytes)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key: bytes, value) -> bool:
+        """Store a result (made read-only); False when it alone exceeds a quarter of the budget."""
+        size = _nbytes(value)
+        if size > self.max_bytes // 4:
+            return False
+        value = _frozen(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats["evictions"] += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, **self._stats}
+
+
+class RemoteMemo:
+    """
+    A ResultMemo held by another process, reached over a multiprocessing connection whose
+    other end passes each request to answer_memo_request (utils/workers.py does, mid-task).
+    Results over `max_put_bytes` are not sent, so a task does not wait on pickling a large
+    matrix through the pipe.
+    """
+
+    def __init__(self, conn, max_bytes: int = MEMO_MAX_BYTES, max_put_bytes: int | None = None):
+        self.conn = conn
+        self.max_bytes = max_bytes
+        self.max_put_bytes = max_bytes // 4 if max_put_bytes is None else max_put_bytes
+
+    def get(self, key: bytes):
+        self.conn.send(("memo_get", key))
+        value = self.conn.recv()
+        return None if value is None else _frozen(value)
+
+    def put(self, key: bytes, value) -> bool:
+        # over a quarter of the budget is not kept on the other side either
+        if _nbytes(value) > min(self.max_put_bytes, self.max_bytes // 4):
+            return False
+        self.conn.send(("memo_put", key, value))  # no reply
+        return True
+
+
+def answer_memo_request(memo: ResultMemo, request: tuple, conn):
+    """Serve one RemoteMemo request from `memo`."""
+    match request:
+        case ("memo_get", key):
+            conn.send(memo.get(key))
+        case ("memo_put", key, value):
+            memo.put(key, value)
+        case _:
+            raise ValueError("Unknown memo request.")
+
+
+_memo = ResultMemo()
+
+
+def get_memo() -> ResultMemo:
+    return _memo
+
+
+def set_memo(memo):
+    """Replace the process-wide memo (worker processes use their parent's, see utils/workers.py)."""
+    global _memo
+    _memo = memo
+
+
+def memo_info() -> dict:
+    return _memo.info()
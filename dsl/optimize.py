@@ -0,0 +1,187 @@
+# dsl/optimize.py
+"""
+Algebraic rewrites on compiled plans (see dsl/evaluate.py), applied once per program
+structure before the plan is cached:
+
+    double_transpose       transpose(transpose(X))            -> X
+    inverse_of_transpose   inverse(transpose(X))              -> transpose(inverse(X))
+    inverse_of_product     inverse(multiply(A, B))            -> multiply(inverse(B), inverse(A))
+                           (only when inverse(A) and inverse(B) are computed anyway)
+    solve_left             multiply(inverse(A), B)            -> solve(A, B)
+    solve_right            multiply(B, inverse(A))            -> transpose(solve(transpose(A), transpose(B)))
+                           (only when that inverse is not used elsewhere)
+    multiply_chain         multiply(multiply(A, B), C)        -> chain(A, B, C)
+                           (intermediate products used nowhere else; see dsl/chain.py)
+
+Transposes are views, so the transpose forms cost nothing; solve factors A once instead of
+forming the inverse and multiplying, which is cheaper and loses fewer digits. Each pass
+rebuilds the plan with hash-consing and drops instructions that are no longer used. A
+chain's association order is picked from the operand shapes when it runs.
+"""
+import os
+
+# Set TEXLM_OPTIMIZE=0 to execute programs literally
+OPTIMIZE = os.getenv("TEXLM_OPTIMIZE", "1") != "0"
+
+
+class _Builder:
+    """Hash-consed instruction list under construction."""
+
+    def __init__(self, literals: int):
+        self.literals = literals
+        self.instructions = []
+        self.numbering = {}
+        self.orders = {}  # chain register -> parenthesization as written
+
+    def definition(self, register: int):
+        return None if register < self.literals else self.instructions[register - self.literals]
+
+    def emit(self, op: str, *args: int) -> int:
+        key = (op, args)
+        register = self.numbering.get(key)
+        if register is None:
+            register = self.numbering[key] = self.literals + len(self.instructions)
+            self.instructions.append(key)
+        return register
+
+    def transpose(self, register: int) -> int:
+        definition = self.definition(register)
+        if definition is not None and definition[0] == "transpose":
+            return definition[1][0]
+        return self.emit("transpose", register)
+
+
+def optimize(literals: int, instructions: list, result: int) -> tuple[list, int, dict, dict]:
+    """
+    Rewrite a hash-consed plan ([(operation, argument registers)], result register).
+    Returns the new instructions, the new result register, {rewrite name: times fired} and
+    {chain register: the chain's parenthesization as written}.
+    """
+    fired = {}
+    for rule in (_transposes, _inverse_of_product, _solves):
+        instructions, result, _ = _rewrite(literals, instructions, result, rule, fired)
+    # last: the earlier rules match multiply instructions
+    instructions, result, orders = _rewrite(literals, instructions, result, _chains, fired)
+    return instructions, result, fired, orders
+
+
+def _rewrite(literals: int, instructions: list, result: int, rule, fired: dict) -> tuple[list, int, dict]:
+    uses = [0] * (literals + len(instructions))
+    uses[result] += 1
+    for _, args in instructions:
+        for register in args:
+            uses[register] += 1
+    program = {"instructions": instructions, "literals": literals, "uses": uses,
+               "inverted": {args[0] for op, args in instructions if op == "inverse"},
+               "multiplied": {a for op, args in instructions if op == "multiply" for a in args}}
+
+    builder = _Builder(literals)
+    mapping = list(range(literals))
+    for op, args in instructions:
+        mapping.append(rule(builder, op, args, mapping, program, fired))
+    return _prune(literals, builder.instructions, mapping[result], builder.orders)
+
+
+def _definition(program: dict, register: int):
+    index = register - program["literals"]
+    return program["instructions"][index] if index >= 0 else None
+
+
+def _fire(fired: dict, name: str):
+    fired[name] = fired.get(name, 0) + 1
+
+
+# === Rules ===
+# rule(builder, op, args, mapping, program, fired) -> register of the rewritten node.
+# `args` are registers of the input program; mapping[arg] is where they ended up.
+
+def _transposes(builder, op, args, mapping, program, fired):
+    mapped = [mapping[a] for a in args]
+    definition = builder.definition(mapped[0])
+    if op == "transpose" and definition is not None and definition[0] == "transpose":
+        _fire(fired, "double_transpose")
+        return definition[1][0]
+    if op == "inverse" and definition is not None and definition[0] == "transpose":
+        _fire(fired, "inverse_of_transpose")
+        return builder.emit("transpose", builder.emit("inverse", definition[1][0]))
+    return builder.emit(op, *mapped)
+
+
+def _inverse_of_product(builder, op, args, mapping, program, fired):
+    if op == "inverse":
+        definition = _definition(program, args[0])
+        if definition is not None and definition[0] == "multiply" and set(definition[1]) <= program["inverted"]:
+            a, b = definition[1]
+            _fire(fired, "inverse_of_product")
+            return builder.emit("multiply", builder.emit("inverse", mapping[b]), builder.emit("inverse", mapping[a]))
+    return builder.emit(op, *(mapping[a] for a in args))
+
+
+def _solves(builder, op, args, mapping, program, fired):
+    if op == "multiply":
+        left, right = (_definition(program, a) for a in args)
+        if left is not None and left[0] == "inverse" and program["uses"][args[0]] == 1:
+            _fire(fired, "solve_left")
+            return builder.emit("solve", mapping[left[1][0]], mapping[args[1]])
+        if right is not None and right[0] == "inverse" and program["uses"][args[1]] == 1:
+            _fire(fired, "solve_right")
+            solved = builder.emit("solve", builder.transpose(mapping[right[1][0]]), builder.transpose(mapping[args[0]]))
+            return builder.transpose(solved)
+    return builder.emit(op, *(mapping[a] for a in args))
+
+
+def _chains(builder, op, args, mapping, program, fired):
+    # len(mapping) is this instruction's register; products absorbed by an enclosing
+    # chain are still emitted here and pruned as dead code
+    if op == "multiply" and not _absorbed(program, len(mapping)):
+        operands, order = _chain_operands(program, args)
+        if len(operands) > 2:
+            _fire(fired, "multiply_chain")
+            register = builder.emit("chain", *(mapping[r] for r in operands))
+            builder.orders[register] = order
+            return register
+    return builder.emit(op, *(mapping[a] for a in args))
+
+
+def _absorbed(program: dict, register: int) -> bool:
+    """A product whose only use is as a factor of another multiply."""
+    definition = _definition(program, register)
+    return (definition is not None and definition[0] == "multiply"
+            and program["uses"][register] == 1 and register in program["multiplied"])
+
+
+def _chain_operands(program: dict, args: tuple) -> tuple[list, object]:
+    """Factors (left to right) of multiply(*args) and their parenthesization, without recursion."""
+    operands, orders = [], []
+    stack = [None, args[1], args[0]]  # None: pair the last two orders
+    while stack:
+        register = stack.pop()
+        if register is None:
+            right = orders.pop()
+            orders.append((orders.pop(), right))
+        elif _absorbed(program, register):
+            left, right = _definition(program, register)[1]
+            stack.extend((None, right, left))
+        else:
+            orders.append(len(operands))
+            operands.append(register)
+    return operands, orders[0]
+
+
+def _prune(literals: int, instructions: list, result: int, orders: dict) -> tuple[list, int, dict]:
+    """Drop instructions the result does not depend on and renumber the rest (and `orders`)."""
+    live = [False] * (literals + len(instructions))
+    live[result] = True
+    for index in range(len(instructions) - 1, -1, -1):
+        if live[literals + index]:
+            for register in instructions[index][1]:
+                live[register] = True
+    renumber = list(range(literals))
+    kept = []
+    for index, (op, args) in enumerate(instructions):
+        if live[literals + index]:
+            renumber.append(literals + len(kept))
+            kept.append((op, tuple(renumber[a] for a in args)))
+        else:
+            renumber.append(None)
+    return kept, renumber[result], {renumber[r]: order for r, order in orders.items() if renumber[r] is not None}
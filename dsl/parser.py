@@ -0,0 +1,197 @@
+# dsl/parser.py
+"""
+Local parser for DSL_GRAMMAR.
+
+The grammar the generator is constrained by is compiled once at import into a Lark LALR
+parser. Its transformer runs inline while parsing and builds the evaluator's input
+directly, so malformed model output is rejected with a precise position and no general
+Python AST is built for large literals:
+
+    parse_dsl("transpose([[1, 2], [3, 4]])")
+    -> ast.Module([ast.Expr(ast.Call(Name("transpose"), [ast.Constant(np.array([[1, 2], [3, 4]]))]))])
+
+Matrix literals become ast.Constant nodes holding the numpy array. Well-formed literals are
+loaded in bulk before parsing (dsl/literals.py) and only the program's skeleton goes through
+the grammar; ragged literals keep the ast.List form that ast.parse would give, so the static
+analyzer can still report them. Named matrices (M1, M2, ... see dsl/symbols.py) are bound to
+their arrays the same way.
+"""
+import ast
+import numpy as np
+from lark import Lark, Transformer, Token
+from lark.exceptions import UnexpectedInput
+from .grammar import DSL_GRAMMAR
+from .literals import find_literals, load_matrix
+
+
+class DSLSyntaxError(ValueError):
+    """The DSL does not match DSL_GRAMMAR. `line`, `column` and `expected` locate the problem."""
+
+    def __init__(self, message: str, line: int | None = None, column: int | None = None, expected=()):
+        super().__init__(message)
+        self.line = line
+        self.column = column
+        self.expected = sorted(expected)
+
+
+class UnknownSymbolError(DSLSyntaxError):
+    """The DSL names a matrix that was not supplied with the request."""
+
+
+class _ToAst(Transformer):
+    """Builds ast nodes bottom-up; called by the LALR parser as each rule is reduced."""
+
+    def start(self, children):
+        child = children[0]
+        if isinstance(child, Token):  # SYMBOL or SLOT
+            return ast.Name(id=str(child), ctx=ast.Load())
+        return child
+
+    def call(self, children):
+        # children: name, "(", operand(s) with separators, ")"
+        args = [c for c in children if isinstance(c, ast.expr)]
+        return ast.Call(func=ast.Name(id=str(children[0]), ctx=ast.Load()), args=args, keywords=[])
+
+    def fname(self, children):
+        return str(children[0])
+
+    def matrix(self, children):
+        rows = children[1]
+        if len({len(row) for row in rows}) != 1:
+            return ast.List(
+                elts=[ast.List(elts=[ast.Constant(value=v) for v in row], ctx=ast.Load()) for row in rows],
+                ctx=ast.Load(),
+            )
+        return ast.Constant(value=np.array(rows))
+
+    def rows(self, children):
+        return [c for c in children if isinstance(c, list)]
+
+    def row(self, children):
+        return children[1]
+
+    def elements(self, children):
+        return [float(t) if "." in t else int(t) for t in children if t.type == "NUMBER"]
+
+
+def _build_parser(slots: bool = False) -> Lark:
+    # Lark drops anonymous keyword tokens from rule children, so the operation names are
+    # exposed as named terminals; the accepted language is exactly DSL_GRAMMAR (plus the
+    # $0$, $1$, ... placeholders of bulk-loaded literals when `slots` is set).
+    start = "start: call | matrix | SYMBOL | SLOT" if slots else "start: call | matrix | SYMBOL"
+    grammar = (
+        DSL_GRAMMAR
+        .replace("start: call | matrix", start)
+        .replace('"multiply" LPAR', 'MULTIPLY LPAR')
+        .replace('"add"      LPAR', 'ADD LPAR')
+        .replace('fname: "transpose" | "inverse"', 'fname: TRANSPOSE | INVERSE')
+        + 'MULTIPLY: "multiply"\nADD: "add"\nTRANSPOSE: "transpose"\nINVERSE: "inverse"\n'
+        + 'SYMBOL: /M[1-9][0-9]*/\n'
+        + ('SLOT: /\\$[0-9]+\\$/\n' if slots else '')
+    )
+    return Lark(grammar, parser="lalr", transformer=_ToAst())
+
+
+# Compiled once per process
+_parser = _build_parser()
+_skeleton_parser = _build_parser(slots=True)
+
+
+def parse_dsl(dsl: str, symbols: dict | None = None) -> ast.Module:
+    """
+    Parse a DSL string into the ast.Module that evaluate() and analyze() take.
+    `symbols` maps matrix names to numpy arrays; each name is replaced by its array.
+    Raises DSLSyntaxError with the line/column of the first offending character,
+    or UnknownSymbolError for a name that is not in `symbols`.
+    """
+    text = dsl.strip()
+    skeleton, slots = _load_literals(text)
+    try:
+        expression = _parse(_skeleton_parser, skeleton) if slots else _parse(_parser, text)
+    except DSLSyntaxError:
+        if not slots:
+            raise
+        expression = _parse(_parser, text)  # report the error against the text as written
+    expression = _bind(expression, {**(symbols or {}), **slots})
+    return ast.Module(body=[ast.Expr(value=expression)], type_ignores=[])
+
+
+def _parse(parser: Lark, text: str):
+    try:
+        return parser.parse(text)
+    except UnexpectedInput as e:
+        raise DSLSyntaxError(_describe(e, text), e.line, e.column, getattr(e, "expected", ()) or ()) from None
+
+
+def _load_literals(text: str) -> tuple[str, dict]:
+    """Replace every well-formed matrix literal with a $k$ placeholder; returns (skeleton, {"$k$": array})."""
+    if "$" in text:
+        return text, {}  # a placeholder the caller wrote must stay a syntax error
+    slots = {}
+    pieces = []
+    last = 0
+    for start, end in find_literals(text):
+        value = load_matrix(text[start:end])
+        if value is None:
+            continue  # ragged or malformed: the grammar parser handles (and reports) it
+        name = f"${len(slots)}$"
+        slots[name] = value
+        pieces.append(text[last:start])
+        pieces.append(name)
+        last = end
+    if not slots:
+        return text, {}
+    pieces.append(text[last:])
+    return "".join(pieces), slots
+
+
+def _bind(root, symbols: dict):
+    # explicit stack: programs may nest deeper than the recursion limit
+    root = _bind_name(root, symbols)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Call):
+            node.args = [_bind_name(arg, symbols) for arg in node.args]
+            stack.extend(node.args)
+    return root
+
+
+def _bind_name(node, symbols: dict):
+    if not isinstance(node, ast.Name):
+        return node
+    if node.id not in symbols:
+        available = ", ".join(name for name in symbols if not name.startswith("$")) or "none"
+        raise UnknownSymbolError(f"Unknown matrix name {node.id} (available: {available}).")
+    return ast.Constant(value=symbols[node.id])
+
+
+def to_dsl(node) -> str:
+    """Inverse of parse_dsl for a single expression (used for diagnostics and previews)."""
+    # explicit stack of nodes and the text between them, like _bind
+    pieces = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        match item:
+            case str():
+                pieces.append(item)
+            case ast.Constant(value=np.ndarray() as value):
+                pieces.append("[" + ", ".join("[" + ", ".join(str(v) for v in row) + "]" for row in value.tolist()) + "]")
+            case ast.Call():
+                pieces.append(f"{item.func.id}(")
+                stack.append(")")
+                for index, arg in enumerate(reversed(item.args)):
+                    stack.append(arg)
+                    if index < len(item.args) - 1:
+                        stack.append(", ")
+            case _:
+                pieces.append(ast.unparse(item))
+    return "".join(pieces)
+
+
+def _describe(error: UnexpectedInput, text: str) -> str:
+    context = error.get_context(text, span=20).rstrip("\n").replace("\n", "\n    ")
+    expected = sorted(getattr(error, "expected", ()) or ())
+    hint = f" (expected one of: {', '.join(expected)})" if expected else ""
+    return f"DSL syntax error at line {error.line}, column {error.column}{hint}:\n    {context}"
@@ -0,0 +1,318 @@
+# dsl/structured.py
+"""
+Structured matrices in the float evaluator.
+
+Literals are classified once when a program is loaded (detect_structure), and values keep a
+compact form for as long as the operations preserve it:
+
+    diagonal      the diagonal vector                   [[1.5, 0, 0], [0, 2, 0], [0, 0, 3]]
+    permutation   p with M[i, p[i]] = 1                 [[0, 1], [1, 0]]  ->  p = [1, 0]
+    lower/upper   the dense array, known to be triangular
+    sparse        (rows, cols, values) of the nonzero entries, row-major
+
+STRUCTURED_KERNELS take dense arrays or StructuredMatrix operands. The inverse of a diagonal
+matrix is 1/d, of a permutation its transpose, and of a triangular matrix a blocked
+substitution. Multiplying by a diagonal scales rows or columns, by a permutation reorders
+them, and sparse products only touch the nonzeros. A value is densified only when its
+structure is lost (e.g. diagonal + dense). Anything the specialized kernels do not cover,
+including mismatched shapes, runs the dense NumPy kernel on dense operands, so the errors
+are the same as before. Small matrices (below TEXLM_STRUCTURE_MIN_SIZE rows and columns)
+stay dense; TEXLM_STRUCTURE=0 disables structure altogether.
+"""
+import os
+import numpy as np
+
+STRUCTURE = os.getenv("TEXLM_STRUCTURE", "1") != "0"
+STRUCTURE_MIN_SIZE = int(os.getenv("TEXLM_STRUCTURE_MIN_SIZE", "16"))
+# Literals with at least SPARSE_MIN_CELLS cells and at most this fraction of nonzeros are sparse
+SPARSE_MAX_DENSITY = float(os.getenv("TEXLM_SPARSE_MAX_DENSITY", "0.05"))
+SPARSE_MIN_CELLS = 64 * 64
+
+DIAGONAL, PERMUTATION, LOWER, UPPER, SPARSE = "diagonal", "permutation", "lower", "upper", "sparse"
+
+# Triangular blocks up to this size are inverted / solved directly
+_TRIANGULAR_BLOCK = 64
+# Entries materialized at once by a sparse x dense product
+_SPARSE_CHUNK = 1 << 22
+# Denser sparse operands are multiplied by BLAS (the gather costs ~500x a BLAS flop per nonzero)
+_SPARSE_MATMUL_MAX_DENSITY = 0.002
+
+
+class StructuredMatrix:
+    """A matrix stored by its structure (`kind`, see the module docstring); dense() materializes it."""
+
+    def __init__(self, kind: str, shape: tuple, dtype, data):
+        self.kind = kind
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.data = data
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    def dense(self) -> np.ndarray:
+        match self.kind:
+            case "lower" | "upper":
+                return self.data
+            case "diagonal":
+                return np.diag(self.data).astype(self.dtype, copy=False)
+        rows, cols, values = self.nonzeros()
+        result = np.zeros(self.shape, dtype=self.dtype)
+        result[rows, cols] = values
+        return result
+
+    def nonzeros(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(rows, cols, values) of the stored entries, row-major (not for triangular kinds)."""
+        match self.kind:
+            case "diagonal":
+                index = np.arange(self.shape[0])
+                return index, index, self.data
+            case "permutation":
+                return np.arange(self.shape[0]), self.data, np.ones(self.shape[0], dtype=self.dtype)
+            case "sparse":
+                return self.data
+        raise ValueError(f"{self.kind} matrices are stored densely")
+
+    def arrays(self) -> list[np.ndarray]:
+        return list(self.data) if self.kind == SPARSE else [self.data]
+
+
+def detect_structure(value: np.ndarray):
+    """`value` as a StructuredMatrix when it has a structure worth keeping, otherwise unchanged."""
+    if value.ndim != 2 or value.dtype.kind not in "iuf" or max(value.shape) < STRUCTURE_MIN_SIZE:
+        return value
+    n, m = value.shape
+    nonzero = np.count_nonzero(value)
+    if n == m:
+        diagonal = np.diagonal(value)
+        if nonzero == np.count_nonzero(diagonal):
+            return StructuredMatrix(DIAGONAL, value.shape, value.dtype, diagonal.copy())
+        if nonzero == n:
+            rows, cols = np.nonzero(value)
+            if (np.array_equal(rows, np.arange(n)) and np.all(value[rows, cols] == 1)
+                    and np.bincount(cols, minlength=n).max() == 1):
+                return StructuredMatrix(PERMUTATION, value.shape, value.dtype, cols)
+    if value.size >= SPARSE_MIN_CELLS and nonzero <= SPARSE_MAX_DENSITY * value.size:
+        rows, cols = np.nonzero(value)
+        return StructuredMatrix(SPARSE, value.shape, value.dtype, (rows, cols, value[rows, cols]))
+    if n == m:
+        if not np.any(np.triu(value, 1)):
+            return StructuredMatrix(LOWER, value.shape, value.dtype, value)
+        if not np.any(np.tril(value, -1)):
+            return StructuredMatrix(UPPER, value.shape, value.dtype, value)
+    return value
+
+
+def _dense(value):
+    return value.dense() if isinstance(value, StructuredMatrix) else value
+
+
+def _kind(value):
+    return value.kind if isinstance(value, StructuredMatrix) else None
+
+
+def _singular_if_zero_diagonal(diagonal: np.ndarray):
+    if not np.all(diagonal):
+        raise np.linalg.LinAlgError("Singular matrix")
+
+
+# === Kernels ===
+
+def transpose(a):
+    match _kind(a):
+        case None:
+            return np.transpose(a)
+        case "diagonal":
+            return a
+        case "permutation":
+            return StructuredMatrix(PERMUTATION, a.shape, a.dtype, np.argsort(a.data))
+        case "lower" | "upper":
+            return StructuredMatrix(UPPER if a.kind == LOWER else LOWER, a.shape, a.dtype, a.data.T)
+    rows, cols, values = a.data
+    order = np.lexsort((rows, cols))
+    return StructuredMatrix(SPARSE, a.shape[::-1], a.dtype, (cols[order], rows[order], values[order]))
+
+
+def inverse(a):
+    floating = np.result_type(_dtype(a), np.float64)
+    match _kind(a):
+        case "diagonal":
+            _singular_if_zero_diagonal(a.data)
+            return StructuredMatrix(DIAGONAL, a.shape, floating, 1.0 / a.data)
+        case "permutation":
+            return StructuredMatrix(PERMUTATION, a.shape, floating, np.argsort(a.data))
+        case "lower" | "upper":
+            _singular_if_zero_diagonal(np.diagonal(a.data))
+            return StructuredMatrix(a.kind, a.shape, floating, _triangular_inverse(a.data, a.kind == LOWER))
+    return np.linalg.inv(_dense(a))
+
+
+def add(a, b):
+    kinds = (_kind(a), _kind(b))
+    if kinds == (None, None) or np.shape(a) != np.shape(b):
+        return np.add(_dense(a), _dense(b))
+    dtype = np.result_type(_dtype(a), _dtype(b))
+    if kinds == (DIAGONAL, DIAGONAL):
+        return StructuredMatrix(DIAGONAL, a.shape, dtype, a.data + b.data)
+    triangular = {kind for kind in kinds if kind in (LOWER, UPPER)}
+    if len(triangular) == 1 and set(kinds) <= triangular | {DIAGONAL}:
+        return StructuredMatrix(triangular.pop(), a.shape, dtype, np.add(_dense(a), _dense(b)))
+    # a diagonal / permutation / sparse term only touches its nonzeros of the other (dense) one
+    scattered, other = (a, b) if kinds[0] in (DIAGONAL, PERMUTATION, SPARSE) else (b, a)
+    if _kind(scattered) in (DIAGONAL, PERMUTATION, SPARSE):
+        result = np.array(_dense(other), dtype=dtype)
+        rows, cols, values = scattered.nonzeros()
+        result[rows, cols] += values
+        return result
+    return np.add(_dense(a), _dense(b))
+
+
+def multiply(a, b):
+    kinds = (_kind(a), _kind(b))
+    if kinds == (None, None):
+        return np.matmul(a, b)
+    if np.ndim(a) != 2 or np.ndim(b) != 2 or a.shape[1] != b.shape[0]:
+        return np.matmul(_dense(a), _dense(b))
+    dtype = np.result_type(_dtype(a), _dtype(b))
+    match kinds:
+        case ("diagonal", "diagonal"):
+            return StructuredMatrix(DIAGONAL, a.shape, dtype, a.data * b.data)
+        case ("permutation", "permutation"):
+            return StructuredMatrix(PERMUTATION, a.shape, dtype, b.data[a.data])
+        case ("diagonal", "lower" | "upper"):
+            return StructuredMatrix(b.kind, b.shape, dtype, a.data[:, None] * b.data)
+        case ("lower" | "upper", "diagonal"):
+            return StructuredMatrix(a.kind, a.shape, dtype, a.data * b.data[None, :])
+        case ("lower", "lower") | ("upper", "upper"):
+            return StructuredMatrix(a.kind, (a.shape[0], b.shape[1]), dtype, np.matmul(a.data, b.data))
+        case ("diagonal", _):
+            return (a.data[:, None] * _dense(b)).astype(dtype, copy=False)
+        case (_, "diagonal"):
+            return (_dense(a) * b.data[None, :]).astype(dtype, copy=False)
+        case ("permutation", _):
+            return _dense(b)[a.data].astype(dtype, copy=False)
+        case (_, "permutation"):
+            return _dense(a)[:, np.argsort(b.data)].astype(dtype, copy=False)
+        case ("sparse", _) if _sparse_enough(a):
+            return _sparse_matmul(a, _dense(b))
+        case (_, "sparse") if _sparse_enough(b):
+            return _sparse_matmul(transpose(b), _dense(a).T).T
+    return np.matmul(_dense(a), _dense(b))
+
+
+def multiply_work(a, b) -> int:
+    """
+    Floating-point operations multiply(a, b) performs, case by case as it dispatches: 2mkn for
+    a dense product, one per stored entry scaled by a diagonal, none for a permutation (a
+    gather) and 2 per nonzero and output column for a sparse product. 0 for a shape error.
+    """
+    kinds = (_kind(a), _kind(b))
+    if np.ndim(a) != 2 or np.ndim(b) != 2 or a.shape[1] != b.shape[0]:
+        return 0
+    m, k, n = a.shape[0], a.shape[1], b.shape[1]
+    match kinds:
+        case (None, None):
+            pass
+        case ("diagonal", "diagonal"):
+            return m
+        case ("permutation", "permutation"):
+            return 0
+        case ("diagonal", "lower" | "upper"):
+            return b.data.size
+        case ("lower" | "upper", "diagonal"):
+            return a.data.size
+        case ("lower", "lower") | ("upper", "upper"):
+            pass
+        case ("diagonal", _):
+            return k * n
+        case (_, "diagonal"):
+            return m * k
+        case ("permutation", _) | (_, "permutation"):
+            return 0
+        case ("sparse", _) if _sparse_enough(a):
+            return 2 * len(a.data[2]) * n
+        case (_, "sparse") if _sparse_enough(b):
+            return 2 * len(b.data[2]) * m
+    return 2 * m * k * n
+
+
+def solve(a, b):
+    """a^-1 b (emitted by the optimizer for multiply(inverse(a), b))."""
+    b = _dense(b)
+    kind = _kind(a)
+    if kind in (None, SPARSE) or np.ndim(b) != 2 or b.shape[0] != a.shape[0]:
+        return np.linalg.solve(_dense(a), b)
+    floating = np.result_type(a.dtype, b.dtype, np.float64)
+    match kind:
+        case "diagonal":
+            _singular_if_zero_diagonal(a.data)
+            return (b / a.data[:, None]).astype(floating, copy=False)
+        case "permutation":
+            return b[np.argsort(a.data)].astype(floating, copy=False)
+    _singular_if_zero_diagonal(np.diagonal(a.data))
+    return _triangular_solve(a.data, b, kind == LOWER).astype(floating, copy=False)
+
+
+def _dtype(value):
+    return value.dtype if isinstance(value, (StructuredMatrix, np.ndarray)) else np.asarray(value).dtype
+
+
+# === Triangular and sparse helpers ===
+
+def _triangular_inverse(t: np.ndarray, lower: bool) -> np.ndarray:
+    """Inverse of a nonsingular triangular matrix by 2x2 block recursion (work in matrix products)."""
+    n = t.shape[0]
+    if n <= _TRIANGULAR_BLOCK:
+        inverse = np.linalg.inv(t)
+        return np.tril(inverse) if lower else np.triu(inverse)
+    h = n // 2
+    first, second = _triangular_inverse(t[:h, :h], lower), _triangular_inverse(t[h:, h:], lower)
+    result = np.zeros((n, n), dtype=first.dtype)
+    result[:h, :h], result[h:, h:] = first, second
+    if lower:  # [[A, 0], [C, D]]^-1 = [[A^-1, 0], [-D^-1 C A^-1, D^-1]]
+        result[h:, :h] = -(second @ t[h:, :h] @ first)
+    else:
+        result[:h, h:] = -(first @ t[:h, h:] @ second)
+    return result
+
+
+def _triangular_solve(t: np.ndarray, b: np.ndarray, lower: bool) -> np.ndarray:
+    """t^-1 b for nonsingular triangular t by blocked substitution."""
+    n = t.shape[0]
+    if n <= _TRIANGULAR_BLOCK:
+        return np.linalg.solve(t, b)
+    h = n // 2
+    if lower:
+        first = _triangular_solve(t[:h, :h], b[:h], True)
+        second = _triangular_solve(t[h:, h:], b[h:] - t[h:, :h] @ first, True)
+    else:
+        second = _triangular_solve(t[h:, h:], b[h:], False)
+        first = _triangular_solve(t[:h, :h], b[:h] - t[:h, h:] @ second, False)
+    return np.concatenate([first, second])
+
+
+def _sparse_enough(s: StructuredMatrix) -> bool:
+    return len(s.data[2]) <= _SPARSE_MATMUL_MAX_DENSITY * s.shape[0] * s.shape[1]
+
+
+def _sparse_matmul(s: StructuredMatrix, x: np.ndarray) -> np.ndarray:
+    """s @ x for sparse s and dense 2-D x, in chunks of nonzeros (rows are sorted)."""
+    rows, cols, values = s.data
+    result = np.zeros((s.shape[0], x.shape[1]), dtype=np.result_type(s.dtype, x.dtype))
+    chunk = max(1, _SPARSE_CHUNK // max(x.shape[1], 1))
+    for start in range(0, len(values), chunk):
+        r, c, v = rows[start:start + chunk], cols[start:start + chunk], values[start:start + chunk]
+        starts = np.flatnonzero(np.r_[True, r[1:] != r[:-1]])
+        # a row split across chunks is accumulated, hence +=
+        result[r[starts]] += np.add.reduceat(v[:, None] * x[c], starts)
+    return result
+
+
+STRUCTURED_KERNELS = {
+    "transpose": transpose,
+    "inverse": inverse,
+    "add": add,
+    "multiply": multiply,
+    "solve": solve,
+}
@@ -0,0 +1,85 @@
+# dsl/symbols.py
+"""
+Matrix-literal placeholders.
+
+Large matrix literals are moved out of the user message into a local symbol table before
+any model sees it:
+
+    "inverse of [[...30x30...]] times [[...30x1...]]"
+    -> "inverse of M1 times M2\n\nNamed matrices: M1 is 30x30, M2 is 30x1. ..."
+
+The generator writes the DSL with the names (the grammar is extended with them), the
+verifier checks the named DSL, and the names are bound to their numpy arrays locally
+(dsl.parser.parse_dsl(dsl, symbol_values(symbols))). Prompt size and the numbers the model
+has to copy no longer grow with the matrices.
+"""
+import os
+import re
+from config.prompts import MATRIX_PLACEHOLDER_NOTE
+from .fastpath import extract_matrices
+from .literals import load_matrix
+
+# Literals with fewer cells stay inline (they cost fewer tokens than the note itself)
+MIN_PLACEHOLDER_CELLS = int(os.getenv("TEXLM_PLACEHOLDER_MIN_CELLS", "10"))
+
+SYMBOL_PATTERN = re.compile(r"\bM[1-9][0-9]*\b")
+
+
+def substitute_matrices(user_msg: str, min_cells: int = MIN_PLACEHOLDER_CELLS) -> tuple[str, dict]:
+    """
+    Replace large matrix literals in `user_msg` with names M1, M2, ...
+
+    Returns:
+        (masked message, symbols) where symbols = {name: {"dsl": str, "value": np.ndarray}}.
+        With no literal to replace the message is returned unchanged and symbols is {}.
+    """
+    if SYMBOL_PATTERN.search(user_msg):
+        # the user already writes names like M1; substituting would make them ambiguous
+        return user_msg, {}
+
+    symbols = {}
+    pieces = []
+    last = 0
+    for literal in extract_matrices(user_msg):
+        rows = literal["rows"]
+        if rows is None or len(rows) * len(rows[0]) < min_cells:
+            continue
+        value = load_matrix(literal["dsl"])
+        if value is None:
+            continue  # e.g. integers beyond int64: leave the literal inline
+        name = f"M{len(symbols) + 1}"
+        symbols[name] = {"dsl": literal["dsl"], "value": value}
+        start, end = literal["span"]
+        before = user_msg[last:start]
+        pieces.append(before)
+        pieces.append(name if before.rstrip().lower().endswith("matrix") else f"matrix {name}")
+        last = end
+
+    if not symbols:
+        return user_msg, {}
+    pieces.append(user_msg[last:])
+    return "".join(pieces) + "\n\n" + describe_symbols(symbols), symbols
+
+
+def describe_symbols(symbols: dict) -> str:
+    shapes = ", ".join(f"{name} is {s['value'].shape[0]}x{s['value'].shape[1]}" for name, s in symbols.items())
+    return MATRIX_PLACEHOLDER_NOTE.format(shapes=shapes)
+
+
+def symbol_values(symbols: dict) -> dict:
+    """{name: np.ndarray} for dsl.parser.parse_dsl."""
+    return {name: s["value"] for name, s in symbols.items()}
+
+
+def expand_symbols(dsl: str, symbols: dict) -> str:
+    """DSL with every name replaced by its literal (for display and the final result)."""
+    if not symbols:
+        return dsl
+    return SYMBOL_PATTERN.sub(lambda m: symbols[m.group(0)]["dsl"] if m.group(0) in symbols else m.group(0), dsl)
+
+
+def symbolize(dsl: str, symbols: dict) -> str:
+    """Replace literals that are in the symbol table by their names (e.g. fast-path DSL)."""
+    for name, s in symbols.items():
+        dsl = dsl.replace(s["dsl"], name)
+    return dsl
@@ -1,18 +1,65 @@
-from openai import OpenAI
-from config.prompts import DSL_VERIFICATION_PROMPT, VERIFY_USER_PROMPT_TEMPLATE
+from openai import OpenAI, AsyncOpenAI
+from config.prompts import DSL_VERIFICATION_PROMPT, DSL_INTENT_VERIFICATION_PROMPT, VERIFY_USER_PROMPT_TEMPLATE
+from utils.cache import get_cache, make_key
+from utils.telemetry import record_llm_call, usage_of
 
-def verify(client: OpenAI, model:str, user_instruction:str,dsl_code:str) -> dict:
+def verify(client: OpenAI, model:str, user_instruction:str,dsl_code:str, *, intent_only: bool = False) -> dict:
+    """
+    Ask the model whether the DSL matches the user's instruction.
+    With intent_only=True the math checks are left out of the prompt
+    (use it once dsl/analyze.py has validated shapes and invertibility).
+    """
+    request = build_verify_request(model, user_instruction, dsl_code, intent_only=intent_only)
+
+    cache = get_cache()
+    cache_key = make_key(model, request["messages"][0]["content"], request["messages"][1]["content"])
+    cached = cache.get("verifier", cache_key)
+    if cached is not None:
+        record_llm_call("verify", model, cached=True)
+        return cached
+
+    resp = client.chat.completions.create(**request)
+    record_llm_call("verify", model, usage_of(resp))
+
+    result = parse_verdict(resp.choices[0].message.content)
+    # A FAIL is not cached: the retry it triggers, or the next identical request, asks again
+    if result["is_valid"]:
+        cache.set("verifier", cache_key, result)
+    return result
+
+async def verify_async(client: AsyncOpenAI, model:str, user_instruction:str,dsl_code:str, *, intent_only: bool = False) -> dict:
+    """Async version of verify (same return schema)."""
+    request = build_verify_request(model, user_instruction, dsl_code, intent_only=intent_only)
+
+    cache = get_cache()
+    cache_key = make_key(model, request["messages"][0]["content"], request["messages"][1]["content"])
+    cached = cache.get("verifier", cache_key)
+    if cached is not None:
+        record_llm_call("verify", model, cached=True)
+        return cached
+
+    resp = await client.chat.completions.create(**request)
+    record_llm_call("verify", model, usage_of(resp))
+
+    result = parse_verdict(resp.choices[0].message.content)
+    if result["is_valid"]:
+        cache.set("verifier", cache_key, result)
+    return result
+
+def build_verify_request(model:str, user_instruction:str, dsl_code:str, *, intent_only: bool = False) -> dict:
+    """Keyword arguments for client.chat.completions.create."""
+    system_prompt = DSL_INTENT_VERIFICATION_PROMPT if intent_only else DSL_VERIFICATION_PROMPT
     user_prompt = VERIFY_USER_PROMPT_TEMPLATE.format(
         user_instruction=user_instruction,
         dsl_code=dsl_code
     )
 
-    resp = client.chat.completions.create(
+    return dict(
         model = model,
         messages = [
             {
                 "role": "system",
-                "content": DSL_VERIFICATION_PROMPT
+                "content": system_prompt
             },
             {
                 "role":"user",
@@ -20,17 +67,15 @@ def verify(client: OpenAI, model:str, user_instruction:str,dsl_code:str) -> dict
             }
         ]
     )
-    content = resp.choices[0].message.content
-    
+
+def parse_verdict(content: str) -> dict:
     is_match = "MATCH: TRUE" in content
     explanation = "N/A"
     if "EXPLANATION:" in content:
         explanation = content.split("EXPLANATION:")[1].split("MATCH:")[0].strip()
-    
+
     return {
         "is_valid": is_match,
         "explanation": explanation,
         "raw": content
     }
-
-
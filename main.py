@@ -1,64 +1,173 @@
-import ast
+import os
+import asyncio
+import contextvars
 import textwrap
-from config.config import get_client
-from dsl.evaluate import evaluate
-from renderers.latex import render_matrix_to_latex
-from dsl.generator import generate_dsl_and_format 
-from dsl.verify import verify
-from constraints.generate_constraint import generate_constraint
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from config.config import get_client, get_async_client, get_connection_stats
+from dsl.limits import ResourceLimitError
+from dsl.memo import memo_info
+from dsl.parser import parse_dsl
+from renderers.latex import render_matrix_with_llm, render_matrix_with_llm_async
+from renderers.templates import formatting_options, render_locally
+from dsl.generator import generate_dsl_and_format_stream, generate_dsl_and_format_async, settle_generated
+from dsl.verify import verify, verify_async
+from dsl.analyze import analyze_dsl, format_diagnostics
+from dsl.fastpath import parse_fast_path, FASTPATH_MIN_CONFIDENCE
+from dsl.symbols import substitute_matrices, symbol_values, expand_symbols, symbolize
+from utils.cache import get_cache
+from utils.telemetry import span, start_trace, add_span, record_outcome
+from utils.workers import WORKERS, WorkerTimeout, get_pool, latex_core_task, pool_info
 
 # === Configuration ===
 MAX_RETRIES = 1  # Total attempts = 1 (initial) + 2 (retries)
+SPECULATIVE_EXECUTION = True  # Execute + render locally while the verifier runs; keep the result only on PASS
+FAST_PATH = True  # Parse explicit requests locally; the generator only runs when the fast path declines
+# Retries continue the previous Responses conversation (previous_response_id) and send only the feedback
+STATEFUL_RETRIES = os.getenv("TEXLM_STATEFUL_RETRIES", "1") != "0"
+# Reasoning effort of the first generator call and of retries (a retry only has to fix a reported error)
+GENERATOR_EFFORT = os.getenv("TEXLM_GENERATOR_EFFORT", "minimal")
+RETRY_EFFORT = os.getenv("TEXLM_RETRY_EFFORT", GENERATOR_EFFORT)
 
-def execute_pipeline(client, dsl, formatting="latex matrix"):
+# Per-attempt wall-clock limits (seconds) for run_demo_async
+STAGE_TIMEOUTS = {"generate": 90.0, "verify": 45.0, "render": 45.0}
+
+# Shared by all sessions; execution is mostly network wait on the renderer
+_speculation_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="texlm-speculative")
+
+@contextmanager
+def timed(timings: dict, stage: str):
+    """
+    Accumulate the wall-clock time of a stage (summed over retries) into `timings`,
+    and record it as a tracing span / stage histogram observation.
+    """
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start)
+
+def compute_latex_core(dsl, symbols=None, flops=None):
+    """
+    The local part of execution: DSL -> AST -> Numpy -> Constraint.
+    `symbols` binds matrix names in the DSL to arrays (see dsl/symbols.py); `flops` (if
+    given) receives the multiply work (dsl/evaluate.run_plan). Raises on syntax or math errors.
+    """
+    # 1. Parse DSL to AST (compiled DSL_GRAMMAR; literals are loaded straight into numpy)
+    with span("parse", dsl_chars=len(dsl)):
+        program_ast = parse_dsl(dsl, symbols)
+
+    # 2. Calculate Result (Numpy; exact rationals for integer and short-decimal matrices, see dsl/exact.py)
+    # 3. Generate Regex/Constraint (Absolute Correct LaTeX Core)
+    # Both run on a warm worker process (utils/workers.py) when TEXLM_WORKERS is set
+    if WORKERS:
+        with span("worker") as attributes:
+            result = get_pool().run(program_ast)
+            attributes.update(pid=result.pid, worker_rss=result.rss)
+            if flops is not None:
+                flops.update(result.flops)
+            return result.latex_core
+    return latex_core_task(program_ast, flops)[1]
+
+def execute_pipeline(client, dsl, formatting="latex matrix", symbols=None, verdict: Future | None = None):
     """
     Executes the DSL -> AST -> Numpy -> Constraint -> Latex pipeline.
-    Returns a dictionary indicating success or failure (execution error).
+    Returns a dictionary indicating success or failure (execution error). A SUCCESS carries
+    `multiply_flops`: the multiply work as written, as estimated for the order chosen and as
+    executed by the kernels that ran ({} without products).
+    A speculative run passes the verifier's `verdict` (True on PASS): formats the local
+    templates cover are rendered right away, but the LLM renderer is only called after a
+    PASS, and a FAIL ends the run with status CANCELLED.
     """
+    timings = {}
+    flops = {}
     try:
-        # 1. Parse DSL to AST
-        program_ast = ast.parse(dsl)
-        
-        # 2. Calculate Result (Numpy)
-        # This step might raise ValueError (dimension mismatch) or LinAlgError (singular matrix)
-        result_matrix = evaluate(program_ast)
-        
-        # 3. Generate Regex/Constraint (Absolute Correct LaTeX Core)
-        latex_core = generate_constraint(result_matrix)
+        with timed(timings, "compute"):
+            latex_core = compute_latex_core(dsl, symbols, flops)
         
         # 4. Final Render (Wrap core in formatting)
-        final_latex = render_matrix_to_latex(client, formatting, latex_core)
+        with timed(timings, "render"):
+            final_latex = render_locally(formatting, latex_core)
+        if final_latex is None:
+            if verdict is not None and not verdict.result():
+                return {"status": "CANCELLED", "timings": timings}
+            with timed(timings, "render"):
+                final_latex = render_matrix_with_llm(client, formatting, latex_core)
 
         return {
             "status": "SUCCESS",
             "dsl": dsl,
             "final_latex": final_latex,
-            "latex_core": latex_core
+            "latex_core": latex_core,
+            "multiply_flops": flops,
+            "timings": timings
         }
 
+    except (ResourceLimitError, WorkerTimeout) as e:
+        return resource_limit_result(e, timings)
     except Exception as e:
         # Capture execution errors (Math errors, Syntax errors, etc.)
         return {
             "status": "ERROR",
-            "error": str(e)
+            "error": str(e),
+            "timings": timings
         }
 
-def run_demo(user_msg: str):
+def run_demo(user_msg: str, *, speculative: bool = SPECULATIVE_EXECUTION):
+    """Run the whole pipeline and return the final result (see run_demo_stream for progress events)."""
+    result = None
+    for event in run_demo_stream(user_msg, speculative=speculative):
+        if event["type"] == "result":
+            result = event["result"]
+    return result
+
+def run_demo_stream(user_msg: str, *, speculative: bool = SPECULATIVE_EXECUTION) -> Iterator[dict]:
+    """
+    Streaming pipeline. Yields progress events as each stage produces output:
+        {"type": "attempt", "attempt": int, "max_attempts": int}
+        {"type": "reasoning_delta", "text": str}           generator text channel tokens
+        {"type": "dsl", "dsl": str}                         generator tool channel closed
+        {"type": "analysis", "is_valid": bool, "diagnostics": list}
+        {"type": "verification", "is_valid": bool, "explanation": str, "skipped": bool}
+        {"type": "execution", "status": str, "error": str | None}
+        {"type": "result", "result": dict}                  always last, same schema as run_demo
+    """
+    with start_trace("run_demo") as trace:
+        for event in _run_demo_stream(user_msg, speculative=speculative):
+            if event["type"] == "result":
+                event["result"]["trace"] = trace.to_dict()
+            yield event
+
+def _run_demo_stream(user_msg: str, *, speculative: bool) -> Iterator[dict]:
     client = get_client()
 
     # Initialization
-    current_user_prompt = user_msg
+    timings = {}
+    attempts = []
+    started = time.perf_counter()
+    generated = None  # last generator result, continued on retry
     dsl = ""
     formatting = "latex matrix"
     reasoning = ""
     last_error_explanation = ""
 
+    # Large matrix literals are replaced by names; the models only see the names and shapes
+    model_msg, symbols = substitute_matrices(user_msg)
+    values = symbol_values(symbols)
+
     print(f"\n[System] Starting Task. Max Retries: {MAX_RETRIES}")
+    if symbols:
+        print(f"[System] Matrices passed by name: {', '.join(symbols)}")
 
     # === Retry Loop ===
     for attempt in range(MAX_RETRIES + 1):
         attempt_label = f"Attempt {attempt + 1}/{MAX_RETRIES + 1}"
         print(f"\n--- {attempt_label} ---")
+        yield {"type": "attempt", "attempt": attempt + 1, "max_attempts": MAX_RETRIES + 1}
+        attempt_started = time.perf_counter()
 
         # 1. Generate (Super-Parsing)
         try:
@@ -67,21 +176,38 @@ def run_demo(user_msg: str):
             else:
                 print("[Generator] Parsing user request...")
 
-            # Call the Super-Generator
-            parsed = generate_dsl_and_format(client, current_user_prompt)
-            
+            # Explicit requests are parsed locally on the first attempt
+            parsed = None
+            if attempt == 0 and FAST_PATH:
+                with timed(timings, "fastpath"):
+                    parsed = fast_path_parse(user_msg, symbols)
+                if parsed is not None:
+                    print("[Generator] Parsed locally (fast path).")
+                    yield {"type": "reasoning_delta", "text": parsed["reasoning"]}
+                    yield {"type": "dsl", "dsl": parsed["dsl"]}
+
+            # Otherwise call the Super-Generator, forwarding its tokens as they arrive
+            if parsed is None:
+                generate_started = time.perf_counter()
+                with timed(timings, "generate"):
+                    events = generation_stream(client, model_msg, attempt, generated, dsl, last_error_explanation,
+                                               symbols=tuple(symbols))
+                    for event in events:
+                        if event["type"] == "generated":
+                            parsed = generated = event["result"]
+                        else:
+                            yield event
+                parsed["generate_seconds"] = time.perf_counter() - generate_started
+            attempts.append(attempt_record(attempt, parsed, attempt_started))
+
             dsl = parsed["dsl"]
-            formatting = parsed["formatting"]
+            formatting = render_task(parsed["formatting"], user_msg)
             reasoning = parsed["reasoning"]
 
             if not dsl:
                 # model refuse to generate dsl
-                return {
-                    "status": "NEEDS_REPHRASING",
-                    "reasoning": reasoning,
-                    "failed_dsl": "N/A (Model refused to generate)",
-                    "error_reason": "The model could not parse a valid matrix from your input. See the thought process."
-                }
+                yield {"type": "result", "result": with_timings(refusal_result(reasoning), timings, started, attempts)}
+                return
 
             print(f"  Detected Format: {formatting}")
             print("   AI Thought:")
@@ -89,66 +215,473 @@ def run_demo(user_msg: str):
             print(f"  Generated DSL: {dsl}")
 
         except Exception as e:
-            return {"status": "ERROR", "error": f"Generation failed: {str(e)}"}
-
-        # 2. Verify Logic (LLM Verification)
-        print("[Verifier] Checking logic...")
-        # CRITICAL: Always verify against the ORIGINAL user message to ensure intent match
-        verification = verify(client, "gpt-4o", user_msg, dsl)
+            error = {"status": "ERROR", "error": f"Generation failed: {str(e)}"}
+            yield {"type": "result", "result": with_timings(error, timings, started, attempts)}
+            return
 
+        # 2a. Static Analysis (shapes, singularity) - no LLM needed for the math
+        try:
+            with timed(timings, "analyze"):
+                analysis = analyze_dsl(dsl, values)
+        except ResourceLimitError as e:
+            # Over a limit before any numeric work; another attempt on the same matrices cannot fit either
+            print(f"   FAIL (Resource Limit): {e}")
+            settle_generated(parsed, False)
+            limited = {**resource_limit_result(e, timings), "dsl": expand_symbols(dsl, symbols)}
+            yield {"type": "result", "result": with_timings(limited, timings, started, attempts)}
+            return
+        yield {"type": "analysis", "is_valid": analysis["is_valid"], "diagnostics": analysis["diagnostics"]}
         execution_result = None
+        speculative_execution = None
+        verdict = None
         is_success = False
 
-        if verification["is_valid"]:
+        if not analysis["is_valid"]:
+            # Provably invalid: no need to spend a verifier call
+            verification = None
+        elif analysis["trivial"]:
+            # A bare matrix literal has no operations whose intent could be wrong
+            print("[Verifier] Skipped (no operations to verify).")
+            verification = {"is_valid": True, "explanation": "Bare matrix literal, no operations to verify."}
+            yield {"type": "verification", "skipped": True, **verification}
+        else:
+            for warning in format_diagnostics(analysis, "warning").splitlines():
+                print(f"   WARNING (Static Analysis): {warning}")
+            # 2b. Verify Intent (LLM Verification)
+            if speculative:
+                # Execution does not depend on the verdict, so start it now and
+                # only commit its result if the verifier passes
+                print("[Execution] Executing speculatively while verifying...")
+                verdict = Future()
+                # copy_context: spans recorded on the worker thread join this request's trace
+                speculative_execution = _speculation_pool.submit(
+                    contextvars.copy_context().run, execute_pipeline, client, dsl, formatting, values, verdict
+                )
+            print("[Verifier] Checking logic...")
+            # CRITICAL: Always verify against the ORIGINAL user message to ensure intent match
+            verification = None
+            try:
+                with timed(timings, "verify"):
+                    verification = verify(client, "gpt-4o", model_msg, dsl, intent_only=True)
+            finally:
+                if verdict is not None:
+                    # releases (or cancels) a speculative LLM render waiting for the verdict
+                    verdict.set_result(verification is not None and verification["is_valid"])
+            yield {"type": "verification", "is_valid": verification["is_valid"],
+                   "explanation": verification["explanation"], "skipped": False}
+
+        if verification is None:
+            # Math failed statically, feed the precise error back
+            print(f"   FAIL (Static Analysis): {format_diagnostics(analysis)}")
+            last_error_explanation = f"Static Analysis Error: {format_diagnostics(analysis)}"
+        elif verification["is_valid"]:
             print(f"   PASS: {verification['explanation']}")
             
             # 3. Verify Execution (Pre-flight Check)
             # Even if logic looks right, math might fail (e.g. dimension mismatch)
-            print("[Execution] Attempting to execute...")
-            execution_result = execute_pipeline(client, dsl, formatting)
+            with timed(timings, "execute"):
+                if speculative_execution is not None:
+                    execution_result = speculative_execution.result()
+                else:
+                    print("[Execution] Attempting to execute...")
+                    execution_result = execute_pipeline(client, dsl, formatting, values)
+            merge_timings(timings, execution_result)
+            yield {"type": "execution", "status": execution_result["status"], "error": execution_result.get("error")}
             
             if execution_result["status"] == "SUCCESS":
                 # Both Logic and Math are correct
                 is_success = True
+            elif "limit" in execution_result:
+                # Rejected before evaluation; another attempt on the same matrices cannot fit either
+                print(f"   FAIL (Resource Limit): {execution_result['error']}")
+                settle_generated(parsed, False)
+                execution_result["dsl"] = expand_symbols(dsl, symbols)
+                yield {"type": "result", "result": with_timings(execution_result, timings, started, attempts)}
+                return
             else:
                 # Logic passed, but Math failed
                 print(f"   FAIL (Execution): {execution_result['error']}")
                 last_error_explanation = f"Execution Error: {execution_result['error']}"
         else:
-            # Logic failed
+            # Logic failed, the speculative result (if any) is discarded
+            if speculative_execution is not None:
+                speculative_execution.cancel()
             print(f"   FAIL (Verifier): {verification['explanation']}")
             last_error_explanation = verification['explanation']
 
         # === Decision Logic ===
+        # the generator's answer is cached only once it has verified and executed
+        settle_generated(parsed, is_success)
         if is_success:
             # Success! Return the result
             execution_result["reasoning"] = reasoning
-            return execution_result
+            execution_result["dsl"] = expand_symbols(dsl, symbols)
+            yield {"type": "result", "result": with_timings(execution_result, timings, started, attempts)}
+            return
         
         else:
             # Failure: Prepare for retry if possible
             if attempt < MAX_RETRIES:
                 print("[System] Preparing feedback for next attempt...")
-                current_user_prompt = (
-                    f"{user_msg}\n\n"
-                    f"[System Feedback]: Your previous DSL '{dsl}' was INCORRECT.\n"
-                    f"Error Detail: {last_error_explanation}\n"
-                    f"Please fix this error in your next attempt."
-                )
             else:
                 print("\n[System] Max retries reached. Auto-correction failed.")
 
     # === Final Failure (Loop Ended) ===
+    failure = failure_result(reasoning, expand_symbols(dsl, symbols), last_error_explanation, formatting)
+    yield {"type": "result", "result": with_timings(failure, timings, started, attempts)}
+
+# === Async Pipeline ===
+
+async def execute_pipeline_async(client, dsl, formatting="latex matrix", symbols=None, *, render_timeout=None,
+                                 verdict: asyncio.Future | None = None):
+    """
+    Async version of execute_pipeline.
+    A render timeout is raised (asyncio.TimeoutError) instead of being reported as an
+    execution error, so it does not get fed back to the generator as a math problem.
+    """
+    timings = {}
+    flops = {}
+    try:
+        with timed(timings, "compute"):
+            # with worker processes this thread only waits, so keep it off the event loop
+            latex_core = (await asyncio.to_thread(compute_latex_core, dsl, symbols, flops) if WORKERS
+                          else compute_latex_core(dsl, symbols, flops))
+        with timed(timings, "render"):
+            final_latex = render_locally(formatting, latex_core)
+        if final_latex is None:
+            if verdict is not None and not await verdict:
+                return {"status": "CANCELLED", "timings": timings}
+            with timed(timings, "render"):
+                final_latex = await asyncio.wait_for(
+                    render_matrix_with_llm_async(client, formatting, latex_core), render_timeout
+                )
+        return {
+            "status": "SUCCESS",
+            "dsl": dsl,
+            "final_latex": final_latex,
+            "latex_core": latex_core,
+            "multiply_flops": flops,
+            "timings": timings
+        }
+    except (ResourceLimitError, WorkerTimeout) as e:
+        return resource_limit_result(e, timings)
+    except asyncio.TimeoutError:
+        raise
+    except Exception as e:
+        return {
+            "status": "ERROR",
+            "error": str(e),
+            "timings": timings
+        }
+
+async def run_demo_async(user_msg: str, *, speculative: bool = SPECULATIVE_EXECUTION, timeouts: dict | None = None):
+    """
+    Async version of run_demo (same return schema) built on AsyncOpenAI, so one event loop
+    can multiplex many in-flight requests.
+
+    Args:
+        timeouts: per-stage overrides of STAGE_TIMEOUTS ("generate", "verify", "render"), in seconds.
+
+    Cancelling the task cancels the in-flight model call, and any speculative execution
+    is cancelled whenever its attempt ends.
+    """
+    with start_trace("run_demo_async") as trace:
+        result = await _run_demo_async(user_msg, speculative=speculative, timeouts=timeouts)
+        result["trace"] = trace.to_dict()
+        return result
+
+async def _run_demo_async(user_msg: str, *, speculative: bool, timeouts: dict | None):
+    client = get_async_client()
+    timeouts = {**STAGE_TIMEOUTS, **(timeouts or {})}
+    timings = {}
+    attempts = []
+    started = time.perf_counter()
+
+    generated = None
+    dsl = ""
+    formatting = "latex matrix"
+    reasoning = ""
+    last_error_explanation = ""
+    model_msg, symbols = substitute_matrices(user_msg)
+    values = symbol_values(symbols)
+
+    for attempt in range(MAX_RETRIES + 1):
+        # 1. Generate (explicit requests are parsed locally on the first attempt)
+        attempt_started = time.perf_counter()
+        parsed = None
+        try:
+            if attempt == 0 and FAST_PATH:
+                with timed(timings, "fastpath"):
+                    parsed = fast_path_parse(user_msg, symbols)
+            if parsed is None:
+                generate_started = time.perf_counter()
+                with timed(timings, "generate"):
+                    parsed = generated = await asyncio.wait_for(
+                        generation_async(client, model_msg, attempt, generated, dsl, last_error_explanation,
+                                         symbols=tuple(symbols)),
+                        timeouts["generate"]
+                    )
+                parsed["generate_seconds"] = time.perf_counter() - generate_started
+        except asyncio.TimeoutError:
+            error = {"status": "ERROR", "error": f"Generation timed out after {timeouts['generate']}s"}
+            return with_timings(error, timings, started, attempts)
+        except Exception as e:
+            return with_timings({"status": "ERROR", "error": f"Generation failed: {str(e)}"}, timings, started, attempts)
+        attempts.append(attempt_record(attempt, parsed, attempt_started))
+
+        dsl = parsed["dsl"]
+        formatting = render_task(parsed["formatting"], user_msg)
+        reasoning = parsed["reasoning"]
+        if not dsl:
+            return with_timings(refusal_result(reasoning), timings, started, attempts)
+
+        # 2. Static Analysis + Verification (with optional speculative execution)
+        try:
+            with timed(timings, "analyze"):
+                analysis = analyze_dsl(dsl, values)
+        except ResourceLimitError as e:
+            settle_generated(parsed, False)
+            limited = {**resource_limit_result(e, timings), "dsl": expand_symbols(dsl, symbols)}
+            return with_timings(limited, timings, started, attempts)
+        execution_result = None
+        speculative_execution = None
+        verdict = None
+        stage = "verify"
+        try:
+            if not analysis["is_valid"]:
+                verification = None
+            elif analysis["trivial"]:
+                verification = {"is_valid": True, "explanation": "Bare matrix literal, no operations to verify."}
+            else:
+                if speculative:
+                    verdict = asyncio.get_running_loop().create_future()
+                    speculative_execution = asyncio.create_task(execute_pipeline_async(
+                        client, dsl, formatting, values, render_timeout=timeouts["render"], verdict=verdict
+                    ))
+                with timed(timings, "verify"):
+                    verification = await asyncio.wait_for(
+                        verify_async(client, "gpt-4o", model_msg, dsl, intent_only=True), timeouts["verify"]
+                    )
+                if verdict is not None:
+                    verdict.set_result(verification["is_valid"])
+
+            if verification is None:
+                last_error_explanation = f"Static Analysis Error: {format_diagnostics(analysis)}"
+            elif verification["is_valid"]:
+                # 3. Execute (or collect the speculative result)
+                stage = "render"
+                with timed(timings, "execute"):
+                    if speculative_execution is not None:
+                        execution_result = await speculative_execution
+                    else:
+                        execution_result = await execute_pipeline_async(
+                            client, dsl, formatting, values, render_timeout=timeouts["render"]
+                        )
+                merge_timings(timings, execution_result)
+                if "limit" in execution_result:
+                    settle_generated(parsed, False)
+                    execution_result["dsl"] = expand_symbols(dsl, symbols)
+                    return with_timings(execution_result, timings, started, attempts)
+                if execution_result["status"] != "SUCCESS":
+                    last_error_explanation = f"Execution Error: {execution_result['error']}"
+            else:
+                last_error_explanation = verification["explanation"]
+        except asyncio.TimeoutError:
+            error = {"status": "ERROR", "error": f"Stage '{stage}' timed out after {timeouts[stage]}s"}
+            return with_timings(error, timings, started, attempts)
+        except Exception as e:
+            return with_timings({"status": "ERROR", "error": f"Verification failed: {str(e)}"}, timings, started, attempts)
+        finally:
+            if speculative_execution is not None and not speculative_execution.done():
+                speculative_execution.cancel()
+
+        succeeded = execution_result is not None and execution_result["status"] == "SUCCESS"
+        settle_generated(parsed, succeeded)
+        if succeeded:
+            execution_result["reasoning"] = reasoning
+            execution_result["dsl"] = expand_symbols(dsl, symbols)
+            return with_timings(execution_result, timings, started, attempts)
+
+    failure = failure_result(reasoning, expand_symbols(dsl, symbols), last_error_explanation, formatting)
+    return with_timings(failure, timings, started, attempts)
+
+# === Generation (shared by the sync and async pipelines) ===
+
+def generator_arguments(user_msg: str, attempt: int, previous: dict | None, dsl: str, error_explanation: str,
+                        symbols: tuple = ()):
+    """
+    (prompt, keyword arguments) for the generator call of an attempt.
+    Retries continue the previous response and only send the feedback when they can.
+    """
+    if attempt == 0:
+        return user_msg, {"effort": GENERATOR_EFFORT, "symbols": symbols}
+    if STATEFUL_RETRIES and previous is not None and previous.get("response_id"):
+        return feedback_delta(error_explanation), {"effort": RETRY_EFFORT, "symbols": symbols, "previous": previous}
+    return feedback_prompt(user_msg, dsl, error_explanation), {"effort": RETRY_EFFORT, "symbols": symbols}
+
+def generation_stream(client, user_msg, attempt, previous, dsl, error_explanation, *, symbols=()) -> Iterator[dict]:
+    """generate_dsl_and_format_stream for an attempt; falls back to a full prompt if continuing fails."""
+    prompt, kwargs = generator_arguments(user_msg, attempt, previous, dsl, error_explanation, symbols)
+    mode = "continued" if "previous" in kwargs else ("initial" if attempt == 0 else "resent")
+    events = generate_dsl_and_format_stream(client, prompt, **kwargs)
+    if mode == "continued":
+        try:
+            # the request is sent when the first event is pulled
+            first = next(events)
+        except Exception as e:
+            # e.g. the stored response expired or storage is disabled for the key
+            print(f"[Generator] Could not continue the previous response ({e}); resending the full prompt.")
+            mode = "resent"
+            events = generate_dsl_and_format_stream(client, feedback_prompt(user_msg, dsl, error_explanation),
+                                                    effort=RETRY_EFFORT, symbols=symbols)
+        else:
+            events = _chain(first, events)
+    for event in events:
+        if event["type"] == "generated":
+            event["result"].update(mode=mode, effort=kwargs["effort"])
+        yield event
+
+async def generation_async(client, user_msg, attempt, previous, dsl, error_explanation, *, symbols=()) -> dict:
+    """Async counterpart of generation_stream (returns the generator result)."""
+    prompt, kwargs = generator_arguments(user_msg, attempt, previous, dsl, error_explanation, symbols)
+    mode = "continued" if "previous" in kwargs else ("initial" if attempt == 0 else "resent")
+    try:
+        result = await generate_dsl_and_format_async(client, prompt, **kwargs)
+    except Exception:
+        if mode != "continued":
+            raise
+        mode = "resent"
+        result = await generate_dsl_and_format_async(
+            client, feedback_prompt(user_msg, dsl, error_explanation), effort=RETRY_EFFORT, symbols=symbols
+        )
+    result.update(mode=mode, effort=kwargs["effort"])
+    return result
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+def attempt_record(attempt: int, parsed: dict, attempt_started: float) -> dict:
+    """Per-attempt generator cost: where the DSL came from, tokens and latency."""
+    usage = parsed.get("usage") or {}
+    cached = parsed.get("cached", False)
+    return {
+        "attempt": attempt + 1,
+        "source": parsed.get("mode", "fastpath"),
+        "effort": parsed.get("effort"),
+        "cached": cached,
+        # a cache hit cost no tokens
+        **{name: (0 if cached else usage.get(name, 0))
+           for name in ("input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens")},
+        "generate_seconds": round(parsed.get("generate_seconds", 0.0), 6),
+        "_started": attempt_started,
+    }
+
+# === Result Helpers (shared by the sync and async pipelines) ===
+
+def fast_path_parse(user_msg: str, symbols: dict | None = None) -> dict | None:
+    """
+    Generator-shaped result from the rule-based parser, or None when it is not confident.
+    Literals that have a name in `symbols` are written by name, like generator output.
+    A bug in the rule-based parser declines too, so the generator still gets the request.
+    """
+    try:
+        fast = parse_fast_path(user_msg)
+    except Exception as e:
+        print(f"[Generator] Fast path failed ({type(e).__name__}: {e}); using the generator.")
+        return None
+    if fast["dsl"] is None or fast["confidence"] < FASTPATH_MIN_CONFIDENCE:
+        return None
+    return {
+        "reasoning": f"Parsed locally by the rule-based fast path ({fast['reason']}); "
+                     f"formatting: {fast['formatting']}.",
+        "formatting": fast["formatting"],
+        "dsl": symbolize(fast["dsl"], symbols or {}),
+    }
+
+def render_task(formatting: str, user_msg: str) -> str:
+    """The format the generator named, with the caption / column spec the user asked for (renderers/templates.py)."""
+    options = formatting_options(user_msg)
+    return f"{formatting} {options}" if options and options not in formatting else formatting
+
+def feedback_delta(error_explanation: str) -> str:
+    """Feedback for a retry that continues the previous response (the DSL is already in context)."""
+    return (
+        f"[System Feedback]: The DSL you generated was INCORRECT.\n"
+        f"Error Detail: {error_explanation}\n"
+        f"Please fix this error and call the dsl_grammar tool again."
+    )
+
+def feedback_prompt(user_msg: str, dsl: str, error_explanation: str) -> str:
+    return (
+        f"{user_msg}\n\n"
+        f"[System Feedback]: Your previous DSL '{dsl}' was INCORRECT.\n"
+        f"Error Detail: {error_explanation}\n"
+        f"Please fix this error in your next attempt."
+    )
+
+def refusal_result(reasoning: str) -> dict:
+    return {
+        "status": "NEEDS_REPHRASING",
+        "reasoning": reasoning,
+        "failed_dsl": "N/A (Model refused to generate)",
+        "error_reason": "The model could not parse a valid matrix from your input. See the thought process."
+    }
+
+def merge_timings(timings: dict, execution_result: dict):
+    """Fold the compute/render timings of an execution into the pipeline timings."""
+    for stage, seconds in execution_result.get("timings", {}).items():
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def with_timings(result: dict, timings: dict, started: float, attempts: list | None = None) -> dict:
+    """Attach rounded stage timings (and per-attempt records, when given) to a result."""
+    now = time.perf_counter()
+    timings["total"] = now - started
+    result["timings"] = {stage: round(seconds, 6) for stage, seconds in timings.items()}
+    if attempts is not None:
+        # an attempt lasts until the next one starts (or until the result)
+        ends = [record["_started"] for record in attempts[1:]] + [now]
+        result["attempts"] = [
+            {**{k: v for k, v in record.items() if k != "_started"}, "seconds": round(end - record["_started"], 6)}
+            for record, end in zip(attempts, ends)
+        ]
+        for record, end in zip(attempts, ends):
+            add_span("attempt" if record["attempt"] == 1 else "retry", record["_started"], end,
+                     attempt=record["attempt"], source=record["source"])
+    record_outcome(result)
+    return result
+
+def resource_limit_result(error: ResourceLimitError | WorkerTimeout, timings: dict) -> dict:
+    # Rejected by the pre-flight estimate (dsl/limits.py) before any allocation, or stopped
+    # by the worker timeout (utils/workers.py); the pipelines do not retry these
+    if isinstance(error, WorkerTimeout):
+        return {"status": "ERROR", "error": str(error), "limit": "timeout", "timings": timings}
+    return {
+        "status": "ERROR",
+        "error": str(error),
+        "limit": error.limit,
+        "resources": error.usage,
+        "timings": timings
+    }
+
+def failure_result(reasoning: str, dsl: str, error_explanation: str, formatting: str) -> dict:
     # Return context so UI can explain WHY it failed and ask user to rephrase
     return {
         "status": "NEEDS_REPHRASING", 
         "reasoning": reasoning,
         "failed_dsl": dsl,
-        "error_reason": last_error_explanation,
+        "error_reason": error_explanation,
         "formatting": formatting
     }
 
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        # python main.py batch prompts.jsonl -o results.jsonl [--concurrency N] [--rate R]
+        from utils.batch import main as batch_main
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+
     # Test case: complex nesting to trigger potential retry
     user_msg = """give me a latex table of the inverse of the transpose of the multiplication of matrix ([
     1,-2] ,[3,4]) and matrix ([4,5] ,[6,7]"")"""
@@ -158,6 +691,14 @@ if __name__ == "__main__":
 
     out = run_demo(user_msg)
     
+    print(f"\n[Cache] {get_cache().stats()}")
+    print(f"[HTTP] {get_connection_stats()}")
+    if WORKERS:
+        print(f"[Workers] {pool_info()}")
+    print(f"[Memo] {memo_info()}")
+    for record in out.get("attempts", []):
+        print(f"[Attempt {record['attempt']}] {record}")
+
     if out.get("status") == "SUCCESS":
         print("\n=== FINAL OUTPUT ===")
         print(out["final_latex"])
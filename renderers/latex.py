@@ -1,23 +1,81 @@
 # renderers/latex.py
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from config.prompts import LATEX_RENDER_SYSTEM_PROMPT, LATEX_RENDER_USER_PROMPT_TEMPLATE
+from utils.cache import get_cache, make_key
+from utils.telemetry import record_llm_call, usage_of
+from .templates import render_locally
+
+RENDER_MODEL = "gpt-4o-mini"
 
 def render_matrix_to_latex(client: OpenAI, render_task: str, matrix_core):
+    # Fast path: common formats are rendered from local templates.
+    # The LLM is only used for formatting requests the templates don't recognize.
+    local_latex = render_locally(render_task, matrix_core)
+    if local_latex is not None:
+        return local_latex
+
+    return render_matrix_with_llm(client, render_task, matrix_core)
+
+async def render_matrix_to_latex_async(client: AsyncOpenAI, render_task: str, matrix_core):
+    """Async version of render_matrix_to_latex."""
+    local_latex = render_locally(render_task, matrix_core)
+    if local_latex is not None:
+        return local_latex
+
+    return await render_matrix_with_llm_async(client, render_task, matrix_core)
+
+def render_matrix_with_llm(client: OpenAI, render_task: str, matrix_core):
+    request = build_render_request(render_task, matrix_core)
+
+    cache = get_cache()
+    cache_key = make_key(RENDER_MODEL, LATEX_RENDER_SYSTEM_PROMPT, request["input"][1]["content"])
+    cached = cache.get("renderer", cache_key)
+    if cached is not None:
+        record_llm_call("render", RENDER_MODEL, cached=True)
+        return cached
+
+    resp = client.responses.create(**request)
+    record_llm_call("render", RENDER_MODEL, usage_of(resp))
+
+    output_text = postprocess_render_output(resp.output[0].content[0].text)
+    cache.set("renderer", cache_key, output_text)
+    return output_text
+
+async def render_matrix_with_llm_async(client: AsyncOpenAI, render_task: str, matrix_core):
+    request = build_render_request(render_task, matrix_core)
+
+    cache = get_cache()
+    cache_key = make_key(RENDER_MODEL, LATEX_RENDER_SYSTEM_PROMPT, request["input"][1]["content"])
+    cached = cache.get("renderer", cache_key)
+    if cached is not None:
+        record_llm_call("render", RENDER_MODEL, cached=True)
+        return cached
+
+    resp = await client.responses.create(**request)
+    record_llm_call("render", RENDER_MODEL, usage_of(resp))
+
+    output_text = postprocess_render_output(resp.output[0].content[0].text)
+    cache.set("renderer", cache_key, output_text)
+    return output_text
+
+def build_render_request(render_task: str, matrix_core) -> dict:
+    """Keyword arguments for client.responses.create."""
     user_prompt = LATEX_RENDER_USER_PROMPT_TEMPLATE.format(
         render_task=render_task,
         matrix_latex_core=matrix_core
     )
-    
-    resp = client.responses.create(
-        model="gpt-4o-mini",
+
+    return dict(
+        model=RENDER_MODEL,
         input=[
             {"role": "system", "content": LATEX_RENDER_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ],
     )
 
+def postprocess_render_output(raw_text: str) -> str:
     # llm raw output
-    output_text = resp.output[0].content[0].text.strip()
+    output_text = raw_text.strip()
 
     # check matrix keyword, used in math env
     matrix_keywords = ["bmatrix", "pmatrix", "vmatrix", "matrix", "smallmatrix"]
@@ -26,13 +84,13 @@ def render_matrix_to_latex(client: OpenAI, render_task: str, matrix_core):
 
     # check wrapper
     is_wrapped = (
-        output_text.strip().startswith("\\[") or 
-        output_text.strip().startswith("$") or 
+        output_text.strip().startswith("\\[") or
+        output_text.strip().startswith("$") or
         "\\begin{equation}" in output_text or
-        "\\begin{table}" in output_text or  
+        "\\begin{table}" in output_text or
         "\\begin{figure}" in output_text
     )
-    # add math wrapper if raw matrix 
+    # add math wrapper if raw matrix
     if has_matrix and not is_wrapped:
         output_text = f"\\[\n{output_text}\n\\]"
 
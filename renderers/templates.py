@@ -0,0 +1,209 @@
+# renderers/templates.py
+"""
+Deterministic LaTeX templates for the output formats we see most often.
+
+The numbers inside the matrix core are already exact (see
+constraints/generate_constraint.py), so wrapping them in a matrix or table
+environment does not need an LLM. `render_locally` returns None whenever the
+formatting request contains something it does not understand, which lets the
+caller fall back to the LLM renderer.
+"""
+import re
+
+MATRIX_ENVIRONMENTS = ["bmatrix", "pmatrix", "vmatrix", "Bmatrix", "Vmatrix", "smallmatrix", "matrix"]
+
+# Words that carry no formatting information of their own
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "as", "to", "for", "with", "and", "it", "its", "me", "my",
+    "please", "give", "generate", "make", "output", "return", "show", "write", "render",
+    "latex", "tex", "code", "format", "formatted", "formatting", "style", "version",
+    "representation", "overleaf", "simple", "standard", "default", "result", "results",
+    "environment", "env", "using", "use", "that", "is", "be", "should", "math", "mode",
+}
+
+# Words understood by the templates below
+KNOWN_WORDS = {
+    "matrix", "matrices", "table", "tabular", "caption", "captioned", "titled", "title",
+    "centering", "centered", "center", "centre", "not", "no", "without", "uncentered",
+    "column", "columns", "spec", "specification", "align", "aligned", "alignment",
+    "left", "right", "lines", "borders", "border", "hline", "hlines", "booktabs",
+    "inline", "display", "displayed", "equation", "raw", "bare", "wrapper", "unwrapped",
+    "bracket", "brackets", "square", "round", "parentheses", "parenthesis", "paren",
+    "determinant", "bars", "vertical", "curly", "braces", "double", "small",
+} | set(env.lower() for env in MATRIX_ENVIRONMENTS)
+
+ENVIRONMENT_ALIASES = [
+    (("smallmatrix", "small"), "smallmatrix"),
+    (("vmatrix", "determinant", "bars", "vertical"), "vmatrix"),
+    (("pmatrix", "parentheses", "parenthesis", "paren", "round"), "pmatrix"),
+    (("braces", "curly"), "Bmatrix"),
+]
+
+CAPTION_PATTERN = re.compile(
+    r"(?:caption(?:ed)?|titled|title)\s*(?:is|=|:)?\s*(?:\{([^}]*)\}|\"([^\"]*)\"|'([^']*)')",
+    re.IGNORECASE,
+)
+COLUMN_SPEC_PATTERN = re.compile(
+    r"(?:column\s*spec(?:ification)?|columns?)\s*(?:is|=|:)?\s*\{?([|lcr ]+)\}?",
+    re.IGNORECASE,
+)
+DEFAULT_CAPTION = "Resulting Matrix"
+# A column spec inside a whole request ("a table with column spec |c|c|"): unlike
+# COLUMN_SPEC_PATTERN, it must contain an alignment letter and end at a word boundary
+REQUESTED_SPEC_PATTERN = re.compile(
+    r"(?:column\s*spec(?:ification)?|columns?)\s*(?:is|=|:)?\s*(?:\{[|lcr ]*[lcr][|lcr ]*\}|[|lcr]*[lcr][|lcr]*)(?![A-Za-z])",
+    re.IGNORECASE,
+)
+
+
+def parse_matrix_core(matrix_core: str) -> list[list[str]]:
+    """
+    Split a LaTeX matrix core (as produced by generate_constraint) into rows of cell strings.
+    """
+    body = re.sub(r"\\(?:begin|end)\{[A-Za-z]+\}", "", matrix_core)
+    rows = []
+    for raw_row in re.split(r"\\\\|\\(?!frac)", body):  # \frac{p}{q} entries are exact results
+        raw_row = raw_row.strip()
+        if not raw_row:
+            continue
+        rows.append([cell.strip() for cell in raw_row.split("&")])
+    return rows
+
+
+def formatting_options(user_msg: str) -> str:
+    """
+    The caption, column spec and booktabs phrases of a whole user request, as render_locally
+    reads them. The generator and the fast path only name the format ("latex table"), so
+    these are appended to it before rendering.
+    """
+    options = []
+    for pattern in (CAPTION_PATTERN, REQUESTED_SPEC_PATTERN):
+        match = pattern.search(user_msg)
+        if match:
+            options.append(match.group(0).strip())
+    if re.search(r"\bbooktabs\b", user_msg, re.IGNORECASE):
+        options.append("booktabs")
+    return " ".join(options)
+
+
+def render_locally(render_task: str, matrix_core: str) -> str | None:
+    """
+    Wrap the matrix core in the requested format without calling a model.
+
+    Returns:
+        str: the final LaTeX, or None if the formatting request is not recognized.
+    """
+    rows = parse_matrix_core(matrix_core)
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        return None
+
+    task = render_task or "latex matrix"
+    caption_match = CAPTION_PATTERN.search(task)
+    spec_match = COLUMN_SPEC_PATTERN.search(task)
+
+    # Strip quoted/explicit arguments before checking the remaining words
+    remainder = task
+    for match in (caption_match, spec_match):
+        if match:
+            remainder = remainder.replace(match.group(0), " ")
+    words = re.findall(r"[a-z]+", remainder.lower())
+    if any(w not in FILLER_WORDS and w not in KNOWN_WORDS for w in words):
+        return None
+
+    if "table" in words or "tabular" in words:
+        caption = None
+        if caption_match:
+            caption = next(g for g in caption_match.groups() if g is not None)
+        column_spec = spec_match.group(1).replace(" ", "") if spec_match else None
+        return render_table(rows, words, caption=caption, column_spec=column_spec)
+
+    if spec_match:
+        # Column specs only make sense for tables
+        return None
+    return render_matrix(rows, task, words)
+
+
+def render_matrix(rows: list[list[str]], task: str, words: list[str]) -> str:
+    environment = _pick_environment(task, words)
+
+    body = " \\\\\n".join(" & ".join(row) for row in rows)
+    matrix_latex = f"\\begin{{{environment}}}\n{body}\n\\end{{{environment}}}"
+
+    if "inline" in words:
+        return f"${matrix_latex}$"
+    if "equation" in words:
+        return f"\\begin{{equation}}\n{matrix_latex}\n\\end{{equation}}"
+    if "raw" in words or "bare" in words or "unwrapped" in words:
+        return matrix_latex
+    return f"\\[\n{matrix_latex}\n\\]"
+
+
+def render_table(rows: list[list[str]], words: list[str], *, caption: str | None = None,
+                 column_spec: str | None = None) -> str | None:
+    num_cols = len(rows[0])
+    negated = {"no", "not", "without"}
+    booktabs = "booktabs" in words
+    no_lines = _negates(words, negated, {"lines", "borders", "border", "hline", "hlines"})
+
+    if column_spec is None:
+        align = "c"
+        if "left" in words:
+            align = "l"
+        elif "right" in words:
+            align = "r"
+        if booktabs or no_lines:
+            column_spec = align * num_cols
+        else:
+            column_spec = "|" + "|".join(align * num_cols) + "|"
+    elif len(re.findall(r"[lcr]", column_spec)) != num_cols:
+        # Let the LLM sort out specs that do not fit the matrix
+        return None
+
+    centering = not (_negates(words, negated, {"centering", "centered", "center", "centre"})
+                     or "uncentered" in words)
+    if caption is None and not _negates(words, negated, {"caption", "captioned"}):
+        caption = DEFAULT_CAPTION
+
+    lines = ["\\begin{table}[h]"]
+    if centering:
+        lines.append("    \\centering")
+    if caption:
+        lines.append(f"    \\caption{{{caption}}}")
+    lines.append(f"    \\begin{{tabular}}{{{column_spec}}}")
+
+    # tabular cells are text mode: exact fractions need math mode
+    body = [" & ".join(f"${cell}$" if "\\frac" in cell else cell for cell in row) + " \\\\" for row in rows]
+    if booktabs:
+        lines.append("        \\toprule")
+        lines.extend(f"        {line}" for line in body)
+        lines.append("        \\bottomrule")
+    elif no_lines:
+        lines.extend(f"        {line}" for line in body)
+    else:
+        lines.append("        \\hline")
+        for line in body:
+            lines.append(f"        {line}")
+            lines.append("        \\hline")
+
+    lines.append("    \\end{tabular}")
+    lines.append("\\end{table}")
+    return "\n".join(lines)
+
+
+def _pick_environment(task: str, words: list[str]) -> str:
+    # Explicit environment names win; Bmatrix/Vmatrix are case sensitive
+    for env in MATRIX_ENVIRONMENTS:
+        if env != "matrix" and re.search(rf"\b{env}\b", task):
+            return env
+    for aliases, env in ENVIRONMENT_ALIASES:
+        if any(alias in words for alias in aliases):
+            return env
+    return "bmatrix"
+
+
+def _negates(words: list[str], negations: set[str], targets: set[str]) -> bool:
+    """True if one of `targets` appears directly after a negation word."""
+    for i, word in enumerate(words[:-1]):
+        if word in negations and words[i + 1] in targets:
+            return True
+    return False
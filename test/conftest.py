@@ -0,0 +1,14 @@
+# test/conftest.py
+"""
+Shared setup of the offline unit tests (python -m pytest -q test).
+
+The repository root goes on sys.path like in benchmarks/, and the response cache starts
+disabled so no test reads or writes .cache/ (tests that need a cache install their own).
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TEXLM_CACHE", "0")
+os.environ.setdefault("OPENAI_API_KEY", "offline-tests")
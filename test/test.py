@@ -25,17 +25,25 @@ def get_matrix(latex_matrix : str) -> np.ndarray:
     latex_matrix = re.sub(r"\\begin\{[A-Za-z]+\}", "", latex_matrix)
     latex_matrix = re.sub(r"\\end\{[A-Za-z]+\}", "", latex_matrix)
 
-    matrix_rows = latex_matrix.split("\\")
+    # rows are separated by a backslash; entries may be \frac{p}{q} (exact results)
+    matrix_rows = re.split(r"\\(?!frac)", latex_matrix)
 
     matrix = []
     for row in matrix_rows:
         numbers_as_strings = row.split("&")
-        numbers = np.array([np.float64(n) for n in numbers_as_strings])
+        numbers = np.array([get_number(n) for n in numbers_as_strings])
         matrix.append(numbers)
     
     matrix = np.array(matrix)
     return matrix
 
+def get_number(entry : str) -> np.float64:
+    fraction = re.fullmatch(r"(-?)\\frac\{(\d+)\}\{(\d+)\}", entry.strip())
+    if fraction:
+        sign, numerator, denominator = fraction.groups()
+        return np.float64(int(sign + numerator) / int(denominator))
+    return np.float64(entry)
+
 def validate(returned_matrix : np.ndarray, expected_matrix : np.ndarray, output_latex_file):
     pass
 
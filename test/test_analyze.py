@@ -0,0 +1,64 @@
+# test/test_analyze.py
+"""Static analysis of DSL programs (dsl/analyze.py)."""
+import pytest
+
+from dsl.analyze import analyze_dsl
+
+
+@pytest.mark.parametrize("dsl, code", [
+    ("add([[1, 2]], [[1], [2]])", "DIMENSION_MISMATCH"),
+    ("multiply([[1, 2]], [[1, 2]])", "DIMENSION_MISMATCH"),
+    ("inverse([[1, 2]])", "NOT_SQUARE"),
+    ("inverse([[1, 2], [2, 4]])", "SINGULAR"),
+    ("add([[1, 2], [3]], [[1]])", "RAGGED_MATRIX"),
+    ("transpose([[1,2]])", "SYNTAX_ERROR"),
+    ("inverse(M1)", "UNKNOWN_SYMBOL"),
+])
+def test_errors(dsl, code):
+    analysis = analyze_dsl(dsl)
+    assert not analysis["is_valid"]
+    assert [d["code"] for d in analysis["diagnostics"]] == [code]
+
+
+def test_first_error_from_the_left_is_reported():
+    analysis = analyze_dsl("add(inverse([[1, 2], [2, 4]]), multiply([[1]], [[1, 2], [3, 4]]))")
+    assert [d["code"] for d in analysis["diagnostics"]] == ["SINGULAR"]
+    assert analysis["diagnostics"][0]["expression"] == "inverse([[1, 2], [2, 4]])"
+
+
+def test_shapes_and_warnings():
+    analysis = analyze_dsl("multiply(transpose([[1, 2]]), inverse([[1]]))")
+    assert analysis["is_valid"] and analysis["shape"] == (2, 1)
+    ill = analyze_dsl("inverse([[1, 1], [1, 1.000000001]])")
+    assert ill["is_valid"] and [d["code"] for d in ill["diagnostics"]] == ["ILL_CONDITIONED"]
+
+
+def test_deep_nesting():
+    depth = 5000
+    analysis = analyze_dsl("transpose(" * depth + "multiply([[1, 2, 3]], [[1], [2], [3]])" + ")" * depth)
+    assert analysis["is_valid"] and analysis["shape"] == (1, 1)
+
+    analysis = analyze_dsl("transpose(" * depth + "inverse([[1, 2], [2, 4]])" + ")" * depth)
+    assert [d["code"] for d in analysis["diagnostics"]] == ["SINGULAR"]
+
+
+@pytest.mark.parametrize("dsl", [
+    "inverse([[100000000, 100000001], [99999999, 100000000]])",  # determinant 1, float rank 1
+    "inverse([[100000000000000000000, 1], [1, 1]])",  # beyond int64
+])
+def test_singular_only_when_proven(dsl):
+    analysis = analyze_dsl(dsl)
+    assert analysis["is_valid"]
+    assert "SINGULAR" not in [d["code"] for d in analysis["diagnostics"]]
+
+
+def test_rounded_entries_are_only_warned_about():
+    analysis = analyze_dsl("inverse([[0.1234567, 0.2469134], [1, 2]])")  # more decimals than exact mode keeps
+    assert analysis["is_valid"]
+    assert [(d["code"], d["severity"]) for d in analysis["diagnostics"]] == [("NEARLY_SINGULAR", "warning")]
+    assert [d["code"] for d in analyze_dsl("inverse([[0.5, 1], [1, 2]])")["diagnostics"]] == ["SINGULAR"]
+
+
+def test_computed_operands_are_left_to_evaluation():
+    analysis = analyze_dsl("inverse(multiply([[1], [2]], [[1, 2]]))")  # rank 1, but not a literal
+    assert analysis["is_valid"] and analysis["diagnostics"] == [] and analysis["shape"] == (2, 2)
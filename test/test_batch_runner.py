@@ -0,0 +1,72 @@
+# test/test_batch_runner.py
+"""Batch runner input, checkpoint and resume (utils/batch.py), with run_demo_async faked."""
+import asyncio
+import json
+
+import pytest
+
+import main
+from utils.batch import iter_prompts, load_checkpoint, run_batch
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    lines = [{"id": f"p{i}", "prompt": f"transpose [[{i}]]"} for i in range(5)]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return path
+
+
+@pytest.fixture
+def served(monkeypatch):
+    """Prompts seen by the fake run_demo_async, in order."""
+    seen = []
+
+    async def run_demo_async(prompt, **kwargs):
+        seen.append(prompt)
+        if "[[3]]" in prompt:
+            raise RuntimeError("boom")
+        return {"status": "SUCCESS", "dsl": "transpose([[1]])", "latex_core": "1"}
+
+    monkeypatch.setattr(main, "run_demo_async", run_demo_async)
+    return seen
+
+
+def _ids(path):
+    return [json.loads(line)["id"] for line in path.read_text().splitlines()]
+
+
+def test_iter_prompts_accepts_strings_and_fallback_ids(tmp_path):
+    path = tmp_path / "in.jsonl"
+    path.write_text('"plain prompt"\n\n{"request_id": 7, "body": "b"}\n{"other": 1}\n')
+    assert list(iter_prompts(path)) == [("in.jsonl:1", "plain prompt"), ("7", "b")]
+
+
+def test_load_checkpoint_truncates_a_partial_last_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"id": "a"}\n{"id": "b"}\n{"id": "c", "sta')
+    assert load_checkpoint(path) == {"a", "b"}
+    assert path.read_text() == '{"id": "a"}\n{"id": "b"}\n'
+    assert load_checkpoint(tmp_path / "missing.jsonl") == set()
+
+
+def test_run_batch_writes_every_result(prompts, tmp_path, served):
+    output = tmp_path / "out.jsonl"
+    summary = asyncio.run(run_batch(prompts, output, concurrency=2))
+    assert sorted(_ids(output)) == [f"p{i}" for i in range(5)]
+    assert summary["SUCCESS"] == 4 and summary["ERROR"] == 1 and summary["skipped"] == 0
+    failed = [json.loads(line) for line in output.read_text().splitlines() if '"p3"' in line]
+    assert failed[0]["error"] == "boom"
+
+
+def test_run_batch_resumes_from_the_checkpoint(prompts, tmp_path, served):
+    output = tmp_path / "out.jsonl"
+    asyncio.run(run_batch(prompts, output, concurrency=1, limit=2))
+    assert _ids(output) == ["p0", "p1"]
+    with open(output, "a") as f:
+        f.write('{"id": "p2", "pro')  # crashed mid-write
+
+    summary = asyncio.run(run_batch(prompts, output, concurrency=1))
+    assert summary["skipped"] == 2
+    assert _ids(output) == ["p0", "p1", "p2", "p3", "p4"]
+    assert served == [f"transpose [[{i}]]" for i in (0, 1, 2, 3, 4)]
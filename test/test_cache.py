@@ -0,0 +1,168 @@
+# test/test_cache.py
+"""Response cache backends, tiers and TTL (utils/cache.py), and what the LLM stages store in it."""
+from types import SimpleNamespace
+
+import pytest
+
+import utils.cache
+from utils.cache import MemoryBackend, ResponseCache, SQLiteBackend, make_key
+from dsl import generator, verify
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache([("memory", MemoryBackend())])
+    monkeypatch.setattr(utils.cache, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(utils.cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_key_depends_on_every_part():
+    key = make_key("gpt-4o", "system", {"a": 1}, ["tool"])
+    assert key == make_key("gpt-4o", "system", {"a": 1}, ["tool"])
+    assert len({key, make_key("gpt-4o-mini", "system", {"a": 1}, ["tool"]),
+                make_key("gpt-4o", "other", {"a": 1}, ["tool"]),
+                make_key("gpt-4o", "system", {"a": 2}, ["tool"]),
+                make_key("gpt-4o", "system", {"a": 1}, None)}) == 5
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    assert backend.get("a") == "1"  # "b" is now the oldest
+    backend.set("c", "3")
+    assert backend.get("b") is None
+    assert backend.get("a") == "1" and backend.get("c") == "3"
+
+
+def test_memory_backend_ttl(clock):
+    backend = MemoryBackend(ttl=10)
+    backend.set("a", "1")
+    clock[0] += 9
+    assert backend.get("a") == "1"
+    clock[0] += 2
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_ttl_and_persistence(tmp_path, clock):
+    path = tmp_path / "responses.sqlite3"
+    SQLiteBackend(path, ttl=10).set("a", "1")
+    reopened = SQLiteBackend(path, ttl=10)
+    assert reopened.get("a") == "1"
+    clock[0] += 11
+    assert reopened.get("a") is None
+
+
+def test_sqlite_backend_evicts_by_size(tmp_path, clock):
+    backend = SQLiteBackend(tmp_path / "responses.sqlite3", max_bytes=250)
+    for name in "abc":
+        backend.set(name, name * 100)
+        clock[0] += 1
+    assert backend.get("a") is None  # least recently used, dropped to get under 250 bytes
+    assert backend.get("b") == "b" * 100 and backend.get("c") == "c" * 100
+
+
+def test_delete_removes_every_tier(tmp_path):
+    disk = SQLiteBackend(tmp_path / "responses.sqlite3")
+    cache = ResponseCache([("memory", MemoryBackend()), ("disk", disk)])
+    cache.set("generator", "k", {"dsl": "x"})
+    cache.delete("generator", "k")
+    assert cache.get("generator", "k") is None
+    assert disk.get("k") is None
+    assert cache.stats()["generator"] == {"hits": 0, "misses": 1, "stores": 1, "deletes": 1}
+
+
+def test_lower_tier_hit_is_promoted(tmp_path):
+    memory, disk = MemoryBackend(), SQLiteBackend(tmp_path / "responses.sqlite3")
+    cache = ResponseCache([("memory", memory), ("disk", disk)])
+    disk.set("k", '{"v": 1}')
+    assert cache.get("renderer", "k") == {"v": 1}
+    assert memory.get("k") == '{"v": 1}'
+    assert cache.stats()["renderer"]["hits_disk"] == 1
+
+
+def test_broken_tier_is_skipped():
+    class Broken:
+        def get(self, key):
+            raise ConnectionError("unreachable")
+
+        def set(self, key, value):
+            raise ConnectionError("unreachable")
+
+    cache = ResponseCache([("shared", Broken()), ("memory", MemoryBackend())])
+    cache.set("verifier", "k", {"ok": True})
+    assert cache.get("verifier", "k") == {"ok": True}
+
+
+# === What the stages cache ===
+
+def _chat_client(content: str):
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), calls
+
+
+def test_verifier_caches_only_passing_verdicts(cache):
+    client, calls = _chat_client("EXPLANATION: wrong operation.\nMATCH: FALSE")
+    for _ in range(2):
+        assert not verify.verify(client, "gpt-4o", "transpose it", "inverse([[1, 2], [3, 4]])")["is_valid"]
+    assert len(calls) == 2
+
+    client, calls = _chat_client("EXPLANATION: ok.\nMATCH: TRUE")
+    for _ in range(2):
+        assert verify.verify(client, "gpt-4o", "invert it", "inverse([[1, 2], [3, 4]])")["is_valid"]
+    assert len(calls) == 1
+
+
+def _responses_client(dsl: str):
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        output = [SimpleNamespace(content=[SimpleNamespace(text="Formatting: matrix.")]),
+                  SimpleNamespace(content=None, input=dsl, call_id="call_1")]
+        return SimpleNamespace(id="resp_1", output=output, usage=None)
+
+    return SimpleNamespace(responses=SimpleNamespace(create=create)), calls
+
+
+def test_generator_result_is_cached_once_it_succeeded(cache):
+    client, calls = _responses_client("transpose([[1, 2], [3, 4]])")
+    first = generator.generate_dsl_and_format(client, "transpose [[1,2],[3,4]]")
+    assert not first["cached"]
+    assert cache.get("generator", first["cache_key"]) is None  # nothing stored before the verdict
+
+    generator.settle_generated(first, succeeded=True)
+    second = generator.generate_dsl_and_format(client, "transpose [[1,2],[3,4]]")
+    assert second["cached"] and second["dsl"] == first["dsl"] and len(calls) == 1
+
+
+def test_failed_generator_result_is_not_replayed(cache):
+    client, calls = _responses_client("inverse([[1, 2], [2, 4]])")
+    first = generator.generate_dsl_and_format(client, "invert [[1,2],[2,4]]")
+    generator.settle_generated(first, succeeded=False)
+    assert not generator.generate_dsl_and_format(client, "invert [[1,2],[2,4]]")["cached"]
+
+    # a cached answer that fails later is dropped
+    generator.settle_generated(first, succeeded=True)
+    cached = generator.generate_dsl_and_format(client, "invert [[1,2],[2,4]]")
+    assert cached["cached"]
+    generator.settle_generated(cached, succeeded=False)
+    assert not generator.generate_dsl_and_format(client, "invert [[1,2],[2,4]]")["cached"]
+    assert len(calls) == 3
+
+
+def test_fast_path_results_are_ignored(cache):
+    generator.settle_generated({"dsl": "transpose([[1]])", "reasoning": "", "formatting": "latex matrix"}, True)
+    assert cache.stats() == {}
@@ -0,0 +1,79 @@
+# test/test_chain.py
+"""Multiply chain ordering (dsl/chain.py) and the multiply work reported by evaluate()."""
+import itertools
+
+import numpy as np
+import pytest
+
+import dsl.memo
+import main
+from dsl.chain import chain_order, order_flops
+from dsl.evaluate import evaluate
+from dsl.memo import ResultMemo
+from dsl.parser import parse_dsl
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    memo = ResultMemo(max_bytes=64 * 1024 * 1024)
+    monkeypatch.setattr(dsl.memo, "_memo", memo)
+    return memo
+
+
+def _orders(i, j):
+    """Every parenthesization of operands i..j."""
+    if i == j:
+        yield i
+        return
+    for split in range(i, j):
+        for left, right in itertools.product(_orders(i, split), _orders(split + 1, j)):
+            yield left, right
+
+
+@pytest.mark.parametrize("dims", [[10, 1000, 10, 1000], [3, 7, 2, 9, 4], [5, 5, 5, 5, 5], [30, 1, 40, 2, 50, 3]])
+def test_chain_order_is_the_cheapest(dims):
+    shapes = list(zip(dims, dims[1:]))
+    best = min(order_flops(order, shapes) for order in _orders(0, len(shapes) - 1))
+    flops, order = chain_order(dims)
+    assert flops == best == order_flops(order, shapes)
+
+
+def _literal(rows: int, cols: int, value: int = 1) -> str:
+    return "[" + ", ".join(["[" + ", ".join([str(value)] * cols) + "]"] * rows) + "]"
+
+
+def test_reordered_chain_reports_written_estimated_and_executed(memo):
+    a, b, c = _literal(10, 100), _literal(100, 10, 2), _literal(10, 100, 3)
+    flops = {}
+    result = evaluate(parse_dsl(f"multiply({a}, multiply({b}, {c}))"), flops=flops)
+    assert result.shape == (10, 100) and result[0, 0] == 100 * 2 * 10 * 3
+    assert flops == {"written": 2 * 100 * 10 * 100 + 2 * 10 * 100 * 100,
+                     "estimated": 2 * 10 * 100 * 10 + 2 * 10 * 10 * 100,
+                     "executed": 2 * 10 * 100 * 10 + 2 * 10 * 10 * 100}
+
+
+def test_executed_counts_the_structured_kernel(memo):
+    n = 32
+    diagonal = "[" + ", ".join("[" + ", ".join(str(i + 1 if i == j else 0) for j in range(n)) + "]"
+                               for i in range(n)) + "]"
+    flops = {}
+    evaluate(parse_dsl(f"multiply({diagonal}, {_literal(n, n, 2)})"), flops=flops)
+    assert flops["written"] == flops["estimated"] == 2 * n ** 3
+    assert flops["executed"] == n * n  # rows scaled, not a dense product
+
+
+def test_recalled_products_execute_nothing(memo):
+    program = parse_dsl(f"multiply({_literal(20, 20)}, {_literal(20, 20, 2)})")
+    first, second = {}, {}
+    evaluate(program, flops=first)
+    evaluate(program, flops=second)
+    assert first["executed"] == 2 * 20 ** 3
+    assert second.get("executed", 0) == 0 and memo.info()["hits"] >= 1
+
+
+def test_pipeline_result_carries_the_work(monkeypatch, memo):
+    monkeypatch.setattr(main, "get_client", lambda: None)
+    out = main.execute_pipeline(None, "multiply([[1, 2], [3, 4]], [[1], [1]])")
+    assert out["status"] == "SUCCESS"
+    assert out["multiply_flops"] == {"written": 8, "estimated": 8, "executed": 8}
+    assert main.execute_pipeline(None, "transpose([[1, 2]])")["multiply_flops"] == {}
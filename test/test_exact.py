@@ -0,0 +1,125 @@
+# test/test_exact.py
+"""Exact rational evaluation (dsl/exact.py) against fractions.Fraction."""
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from constraints.generate_constraint import generate_constraint
+from dsl import exact
+from dsl.evaluate import evaluate_exact
+from dsl.exact import ExactMatrix, decimal_fraction
+from dsl.parser import parse_dsl
+
+
+def _fractions(value: ExactMatrix) -> list:
+    return [[Fraction(int(p), value.denominator) for p in row] for row in value.numerators.tolist()]
+
+
+def _reference_inverse(rows: list) -> list:
+    """Gauss-Jordan elimination over Fractions."""
+    n = len(rows)
+    m = [[Fraction(v) for v in row] + [Fraction(int(i == j)) for j in range(n)] for i, row in enumerate(rows)]
+    for k in range(n):
+        pivot = next(i for i in range(k, n) if m[i][k] != 0)
+        m[k], m[pivot] = m[pivot], m[k]
+        m[k] = [v / m[k][k] for v in m[k]]
+        for i in range(n):
+            if i != k:
+                m[i] = [a - m[i][k] * b for a, b in zip(m[i], m[k])]
+    return [row[n:] for row in m]
+
+
+def _reference_product(a: list, b: list) -> list:
+    return [[sum(Fraction(x) * Fraction(y) for x, y in zip(row, column)) for column in zip(*b)] for row in a]
+
+
+def _literal(rows) -> str:
+    return "[" + ", ".join("[" + ", ".join(str(v) for v in row) + "]" for row in rows) + "]"
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 8])
+def test_inverse_and_solve_match_fractions(n):
+    rng = np.random.default_rng(n)
+    while True:
+        a = rng.integers(-9, 10, size=(n, n))
+        if round(abs(np.linalg.det(a))) > 0:
+            break
+    b = rng.integers(-9, 10, size=(n, 2))
+    inverse = exact.inverse(ExactMatrix.from_integers(a))
+    assert _fractions(inverse) == _reference_inverse(a.tolist())
+    solution = exact.solve(ExactMatrix.from_integers(a), ExactMatrix.from_integers(b))
+    assert _fractions(solution) == _reference_product(_reference_inverse(a.tolist()), b.tolist())
+
+
+def test_bareiss_switches_to_python_integers_without_losing_digits():
+    a = np.array([[10 ** 9 + 7, 3, 1], [2, 10 ** 9 + 9, 5], [1, 4, 10 ** 9 + 21]], dtype=np.int64)
+    inverse = exact.inverse(ExactMatrix.from_integers(a))
+    assert _fractions(inverse) == _reference_inverse(a.tolist())
+
+
+def test_singular_and_non_square_raise_like_numpy():
+    with pytest.raises(np.linalg.LinAlgError, match="Singular matrix"):
+        exact.inverse(ExactMatrix.from_integers(np.array([[1, 2], [2, 4]])))
+    with pytest.raises(np.linalg.LinAlgError):
+        exact.inverse(ExactMatrix.from_integers(np.array([[1, 2]])))
+
+
+def test_results_are_in_lowest_terms():
+    value = exact.add(ExactMatrix(np.array([[1, 3]]), 4), ExactMatrix(np.array([[1, 1]]), 4))
+    assert value.numerators.tolist() == [[1, 2]] and value.denominator == 2
+
+
+@pytest.mark.parametrize("values, expected", [
+    (np.array([[1, -2]]), ([[1, -2]], 1)),
+    (np.array([[0.5, 0.25]]), ([[50, 25]], 100)),
+    (np.array([[0.3, 2.0]]), ([[3, 20]], 10)),
+    (np.array([[0.123456]]), ([[123456]], 10 ** 6)),
+    (np.array([[0.1234567]]), None),              # more decimals than MAX_FRACTION_DIGITS
+    (np.array([[0.30000000000000004]]), None),    # not a short decimal
+    (np.array([[1e300]]), None),
+])
+def test_decimal_fraction(values, expected):
+    result = decimal_fraction(values)
+    if expected is None:
+        assert result is None
+    else:
+        assert (result[0].tolist(), result[1]) == expected
+
+
+def test_short_decimal_programs_are_exact():
+    result = evaluate_exact(parse_dsl("add([[0.1, 0.2]], [[0.2, 0.1]])"))
+    assert _fractions(result) == [[Fraction(3, 10), Fraction(3, 10)]]
+    assert generate_constraint(result) == "\\begin{bmatrix}\n0.3 & 0.3\\end{bmatrix}"
+
+    result = evaluate_exact(parse_dsl("inverse([[0.5, 0], [0, 3]])"))
+    assert generate_constraint(result) == "\\begin{bmatrix}\n2 & 0\\ \n0 & \\frac{1}{3}\\end{bmatrix}"
+    assert evaluate_exact(parse_dsl("transpose([[0.1234567]])")) is None
+
+
+def test_large_inverses_print_long_fractions():
+    rng = np.random.default_rng(0)
+    large = rng.integers(-9, 10, size=(12, 12))
+    result = evaluate_exact(parse_dsl("inverse(" + _literal(large) + ")"))
+    assert _fractions(result) == _reference_inverse(large.tolist())
+    entries = result.latex_entries()
+    assert all(isinstance(e, str) and e.lstrip("-").startswith("\\frac{") for e in entries.flat)
+    assert max(len(str(Fraction(int(p), result.denominator).denominator)) for p in result.numerators.flat) > 6
+    # a sum of an inverse and a large integer product keeps its long numerators
+    result = evaluate_exact(parse_dsl("add(inverse([[7, 3, 1], [2, 9, 5], [1, 4, 8]]), multiply([[900, 800, 700], "
+                                      "[1, 2, 3], [4, 5, 6]], [[900, 1, 2], [3, 800, 4], [5, 6, 700]]))"))
+    assert "\\frac{" in generate_constraint(result)
+
+
+def test_decimal_results_print_fractions_when_they_do_not_terminate():
+    assert generate_constraint(evaluate_exact(parse_dsl("inverse([[0.3]])"))) == \
+        "\\begin{bmatrix}\n\\frac{10}{3} \\end{bmatrix}"
+    assert generate_constraint(evaluate_exact(parse_dsl("inverse([[0.000016]])"))) == \
+        "\\begin{bmatrix}\n62500 \\end{bmatrix}"
+    assert generate_constraint(evaluate_exact(parse_dsl("inverse([[0.64]])"))) == \
+        "\\begin{bmatrix}\n1.5625 \\end{bmatrix}"
+
+
+def test_singular_inverse_is_left_to_the_exact_path():
+    with pytest.raises(np.linalg.LinAlgError):
+        evaluate_exact(parse_dsl("inverse([[1, 2], [2, 4]])"))
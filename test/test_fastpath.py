@@ -0,0 +1,47 @@
+# test/test_fastpath.py
+"""Rule-based fast path and its confidence score (dsl/fastpath.py, main.fast_path_parse)."""
+import pytest
+
+import main
+from dsl.fastpath import FASTPATH_MIN_CONFIDENCE, extract_matrices, parse_fast_path
+
+
+@pytest.mark.parametrize("prompt, dsl", [
+    ("give me a latex table of the inverse of the transpose of the multiplication of "
+     "matrix ([1, -2], [3, 4]) and matrix ([4, 5], [6, 7])",
+     "inverse(transpose(multiply([[1, -2], [3, 4]], [[4, 5], [6, 7]])))"),
+    ("the sum of the product of [[1]] and [[2]] and [[3]]", "add(multiply([[1]], [[2]]), [[3]])"),
+    ("the inverse of [[1, 2], [3, 4]] and then take the transpose", "transpose(inverse([[1, 2], [3, 4]]))"),
+    ("matrix ([100]) multiplied by itself", "multiply([[100]], [[100]])"),
+])
+def test_unambiguous_requests_have_full_confidence(prompt, dsl):
+    fast = parse_fast_path(prompt)
+    assert fast["dsl"] == dsl
+    assert fast["confidence"] == 1.0 and fast["reason"] == "unambiguous"
+
+
+@pytest.mark.parametrize("prompt, reason", [
+    ("transpose it", "no matrix literal found"),
+    ("compute the determinant of [[1, 2], [3, 4]]", "unrecognized words: determinant"),
+    ("the inverse of a 3 by 3 matrix [[1]]", "stray numbers outside matrix literals"),
+    ("the inverse of [[1, 2], [3]]", "malformed matrix literal"),
+    ("the inverse of [[1]] and [[2]]", "could not parse the operation phrases"),
+])
+def test_declines_what_it_does_not_understand(prompt, reason):
+    fast = parse_fast_path(prompt)
+    assert fast["dsl"] is None and fast["confidence"] == 0.0
+    assert fast["reason"] == reason
+
+
+def test_ambiguous_request_is_left_to_the_generator():
+    prompt = "the product of the sum of [[1]] and [[2]] and [[3]] and [[4]]"
+    fast = parse_fast_path(prompt)
+    assert fast["reason"] == "2 possible readings"
+    assert fast["confidence"] == 0.5 < FASTPATH_MIN_CONFIDENCE
+    assert main.fast_path_parse(prompt) is None
+    assert main.fast_path_parse("the transpose of [[1, 2]]")["dsl"] == "transpose([[1, 2]])"
+
+
+def test_extract_matrices_normalizes_spacing_and_signs():
+    found = extract_matrices("A = ( [ 1,+2 ],[3 , -4.5] ) and [[.5]]")
+    assert [m["dsl"] for m in found] == ["[[1, 2], [3, -4.5]]", "[[.5]]"]
@@ -0,0 +1,86 @@
+# test/test_limits.py
+"""Resource estimates and limits (dsl/limits.py), checked before analysis and evaluation."""
+import pickle
+
+import numpy as np
+import pytest
+
+import dsl.analyze
+import dsl.limits
+from dsl.analyze import analyze_dsl
+from dsl.evaluate import evaluate, flatten_program, get_plan, preflight
+from dsl.limits import LIMITS, ResourceLimitError, estimate, program_size
+from dsl.parser import parse_dsl
+
+
+def _nested(depth: int, inner: str = "[[1, 2], [3, 4]]") -> str:
+    return "transpose(" * depth + inner + ")" * depth
+
+
+def _usage(dsl: str) -> dict:
+    structure, literals = flatten_program(parse_dsl(dsl))
+    return {**program_size(structure), **estimate(get_plan(structure)[0], literals)}
+
+
+def test_estimate_from_shapes():
+    usage = _usage("inverse(multiply([[1, 2], [3, 4]], [[1.5, 0, 1], [0, 1, 1]]))")
+    assert usage["depth"] == 3 and usage["literals"] == 2
+    assert usage["shape"] is None  # a 2x3 product is not square
+    usage = _usage("inverse(multiply([[1, 2], [3, 4]], [[1.5, 0], [0, 1]]))")
+    assert usage["shape"] == (2, 2) and usage["dtype"] == np.float64
+    assert usage["flops"] == 2 * 2 * 2 * 2 + 2 * 2 ** 3
+    assert usage["peak_bytes"] >= 4 * 8 + 4 * 8  # literals and the product
+
+
+def test_deep_literal_count_and_depth():
+    assert _usage(_nested(40))["depth"] == 41
+    assert _usage("add(add([[1]], [[1]]), [[1]])")["literals"] == 3  # as written, not deduplicated
+
+
+def test_default_depth_limit_is_reachable():
+    depth = LIMITS["depth"][0]
+    with pytest.raises(ResourceLimitError) as raised:
+        analyze_dsl(_nested(depth))
+    assert raised.value.limit == "depth" and "TEXLM_MAX_DEPTH" in str(raised.value)
+    assert analyze_dsl(_nested(depth - 1))["is_valid"]
+
+
+def test_limits_are_checked_before_numeric_analysis(monkeypatch):
+    monkeypatch.setitem(LIMITS, "flops", (1000, "TEXLM_MAX_FLOPS"))
+    monkeypatch.setattr(dsl.analyze, "_check_inverse", lambda *args: pytest.fail("analyzed an oversized program"))
+    dsl_text = "inverse(" + str(np.eye(8, dtype=int).tolist()) + ")"
+    with pytest.raises(ResourceLimitError) as raised:
+        analyze_dsl(dsl_text)
+    assert raised.value.limit == "flops" and raised.value.usage["flops"] == 2 * 8 ** 3
+    with pytest.raises(ResourceLimitError):
+        evaluate(parse_dsl(dsl_text))
+
+
+def test_peak_bytes_limit(monkeypatch):
+    monkeypatch.setitem(LIMITS, "peak_bytes", (1024, "TEXLM_MAX_BYTES"))
+    column = str([[1]] * 20)
+    with pytest.raises(ResourceLimitError) as raised:
+        preflight(parse_dsl(f"multiply({column}, transpose({column}))"))
+    assert raised.value.limit == "peak_bytes" and raised.value.usage["shape"] == (20, 20)
+    assert preflight(parse_dsl(f"multiply(transpose({column}), {column})"))["shape"] == (1, 1)
+
+
+def test_disabled_limits(monkeypatch):
+    monkeypatch.setattr(dsl.limits, "LIMITS_ENABLED", False)
+    monkeypatch.setitem(LIMITS, "depth", (1, "TEXLM_MAX_DEPTH"))
+    assert preflight(parse_dsl(_nested(3)))["depth"] == 4
+
+
+def test_shape_only_analysis_above_the_numeric_budget(monkeypatch):
+    singular = "inverse([[1, 2], [2, 4]])"
+    assert [d["code"] for d in analyze_dsl(singular)["diagnostics"]] == ["SINGULAR"]
+    monkeypatch.setattr(dsl.analyze, "MAX_NUMERIC_FLOPS", 1)
+    analysis = analyze_dsl(singular)
+    assert analysis["is_valid"] and analysis["shape"] == (2, 2)
+    assert [d["code"] for d in analyze_dsl("inverse([[1, 2]])")["diagnostics"]] == ["NOT_SQUARE"]
+
+
+def test_error_survives_pickling():
+    error = ResourceLimitError("depth", {"depth": 20000, "literals": 1, "dtype": np.dtype(np.int64)})
+    copy = pickle.loads(pickle.dumps(error))
+    assert str(copy) == str(error) and copy.limit == "depth" and copy.usage["dtype"] == "int64"
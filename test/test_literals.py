@@ -0,0 +1,67 @@
+# test/test_literals.py
+"""Bulk literal loading (dsl/literals.py) and its agreement with the grammar parser."""
+import numpy as np
+import pytest
+
+from dsl.literals import find_literals, load_matrix
+from dsl.parser import DSLSyntaxError, _parser, parse_dsl
+
+
+def test_integer_and_float_literals():
+    ints = load_matrix("[[1, -2], [+3, 4]]")
+    assert ints.dtype == np.int64 and ints.tolist() == [[1, -2], [3, 4]]
+    floats = load_matrix("[[1.5, 2], [-0.25, .5]]")
+    assert floats.dtype == np.float64 and floats.tolist() == [[1.5, 2.0], [-0.25, 0.5]]
+    assert load_matrix("[[123456789012345678]]").tolist() == [[123456789012345678]]
+
+
+@pytest.mark.parametrize("literal", [
+    "[[1,2]]",                     # spacing the grammar rejects
+    "[[1, 2],[3, 4]]",
+    "[[1,  2]]",
+    "[[1, 2], [3]]",               # ragged
+    "[[]]",
+    "[[1, , 2]]",
+    "[[1, 2, ]]",
+    "[[1.]]",
+    "[[1.2.3]]",
+    "[[1-2]]",
+    "[[--1]]",
+    "[[1e5]]",
+    "[[1, 2]",
+    "[[1234567890123456789]]",     # 19 digits may overflow int64
+    "[[9223372036854775808]]",
+    "[[-99999999999999999999]]",
+])
+def test_rejects_what_it_cannot_load_exactly(literal):
+    assert load_matrix(literal) is None
+
+
+def test_find_literals_spans():
+    text = "add([[1, 2]], multiply([[3], [4]], [[5, 6]]))"
+    assert [text[start:end] for start, end in find_literals(text)] == ["[[1, 2]]", "[[3], [4]]", "[[5, 6]]"]
+
+
+@pytest.mark.parametrize("dsl", ["[[1, 2], [3, 4]]", "[[0.5, -1], [2, 3.25]]", "multiply([[1, 2]], [[3], [4]])"])
+def test_bulk_loading_matches_the_grammar(dsl):
+    fast = parse_dsl(dsl).body[0].value
+    slow = _parser.parse(dsl)  # cell by cell through the grammar
+    if hasattr(slow, "args"):
+        fast, slow = fast.args, slow.args
+    else:
+        fast, slow = [fast], [slow]
+    for a, b in zip(fast, slow):
+        assert a.value.dtype == b.value.dtype
+        np.testing.assert_array_equal(a.value, b.value)
+
+
+def test_overflowing_integers_stay_exact_through_the_grammar():
+    value = parse_dsl("add([[99999999999999999999]], [[1]])").body[0].value.args[0].value
+    assert value.tolist() == [[99999999999999999999]]
+
+
+@pytest.mark.parametrize("dsl, column", [("add([[1,2]], [[3, 4]])", 9), ("transpose([[1, 2], [3, 4]]]))", 27)])
+def test_malformed_literals_are_reported_by_the_grammar(dsl, column):
+    with pytest.raises(DSLSyntaxError) as caught:
+        parse_dsl(dsl)
+    assert caught.value.column == column
@@ -0,0 +1,99 @@
+# test/test_memo.py
+"""Result memo (dsl/memo.py): keys, byte accounting, LRU eviction and reuse across programs."""
+import numpy as np
+import pytest
+
+import dsl.memo
+from dsl.evaluate import evaluate, evaluate_exact
+from dsl.exact import ExactMatrix
+from dsl.memo import ResultMemo, _nbytes, instruction_key, literal_key
+from dsl.parser import parse_dsl
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    memo = ResultMemo(max_bytes=64 * 1024 * 1024)
+    monkeypatch.setattr(dsl.memo, "_memo", memo)
+    return memo
+
+
+def test_literal_keys_depend_on_dtype_shape_and_values():
+    a = np.arange(6).reshape(2, 3)
+    assert literal_key(a) == literal_key(a.copy())
+    assert literal_key(a) != literal_key(a.reshape(3, 2))
+    assert literal_key(a) != literal_key(a.astype(np.float64))
+    assert literal_key(a) != literal_key(a + 1)
+    assert literal_key(np.array([[10 ** 30]], dtype=object)) != literal_key(np.array([[10 ** 30 + 1]], dtype=object))
+
+
+def test_instruction_keys_depend_on_namespace_operation_and_arguments():
+    a, b = literal_key(np.eye(2)), literal_key(np.ones((2, 2)))
+    key = instruction_key("float", "multiply", [a, b])
+    assert key == instruction_key("float", "multiply", iter([a, b]))
+    assert len({key, instruction_key("exact", "multiply", [a, b]), instruction_key("float", "add", [a, b]),
+                instruction_key("float", "multiply", [b, a])}) == 4
+
+
+def test_byte_accounting():
+    array = np.zeros((10, 10))
+    assert _nbytes(array) == 800
+    assert _nbytes(array[:5]) == 800  # a view keeps its whole base alive
+    exact = ExactMatrix(np.array([[10 ** 30, 1]], dtype=object), 3)
+    assert _nbytes(exact) > exact.numerators.nbytes
+
+
+def test_lru_eviction_by_bytes():
+    memo = ResultMemo(max_bytes=4 * 800)
+    for name in "abcd":
+        assert memo.put(name.encode(), np.zeros((10, 10)))
+    memo.get(b"a")  # "b" is now the least recently used
+    memo.put(b"e", np.zeros((10, 10)))
+    assert memo.get(b"b") is None
+    assert all(memo.get(name) is not None for name in (b"a", b"c", b"d", b"e"))
+    info = memo.info()
+    assert info["bytes"] == 4 * 800 and info["entries"] == 4 and info["evictions"] == 1
+
+
+def test_replacing_a_key_does_not_double_count():
+    memo = ResultMemo(max_bytes=10_000)
+    memo.put(b"k", np.zeros(100))
+    memo.put(b"k", np.zeros(200))
+    assert memo.info()["bytes"] == 1600 and memo.info()["entries"] == 1
+
+
+def test_oversized_values_are_not_stored():
+    memo = ResultMemo(max_bytes=4000)
+    assert not memo.put(b"big", np.zeros(126))  # 1008 bytes > a quarter of the budget
+    assert memo.get(b"big") is None and memo.info()["bytes"] == 0
+
+
+def test_stored_values_are_read_only():
+    memo = ResultMemo()
+    value = np.ones((2, 2))
+    memo.put(b"k", value)
+    with pytest.raises(ValueError):
+        memo.get(b"k")[0, 0] = 5
+
+
+def test_follow_up_request_reuses_the_product(memo):
+    a, b = "[[1, 2], [3, 4]]", "[[5, 6], [7, 8]]"
+    product = evaluate(parse_dsl(f"multiply({a}, {b})"))
+    assert memo.info()["entries"] == 1
+    inverse = evaluate(parse_dsl(f"inverse(multiply({a}, {b}))"))
+    assert memo.info()["hits"] == 1
+    np.testing.assert_allclose(inverse, np.linalg.inv(product))
+    # named matrices and other programs share the same subexpression keys
+    evaluate(parse_dsl("transpose(multiply(M1, M2))", {"M1": np.array([[1, 2], [3, 4]]), "M2": np.array([[5, 6], [7, 8]])}))
+    assert memo.info()["hits"] == 2
+
+
+def test_evaluate_returns_writable_copies_of_memoized_results(memo):
+    program = "multiply([[1, 2], [3, 4]], [[5, 6], [7, 8]])"
+    first, second = evaluate(parse_dsl(program)), evaluate(parse_dsl(program))
+    assert memo.info()["hits"] == 1 and first is not second
+    first[0, 0] = 0
+    np.testing.assert_array_equal(second, [[19, 22], [43, 50]])
+    np.testing.assert_array_equal(evaluate(parse_dsl(f"transpose({program})")), [[19, 43], [22, 50]])
+    exact = evaluate_exact(parse_dsl("inverse([[1, 2], [3, 4]])"))
+    exact.numerators[0, 0] = 0
+    assert evaluate_exact(parse_dsl("inverse([[1, 2], [3, 4]])")).numerators[0, 0] != 0
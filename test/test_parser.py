@@ -0,0 +1,69 @@
+# test/test_parser.py
+"""Local DSL parser (dsl/parser.py): accepted programs, error positions and named matrices."""
+import ast
+
+import numpy as np
+import pytest
+
+from dsl.parser import DSLSyntaxError, UnknownSymbolError, parse_dsl, to_dsl
+
+
+def _expression(dsl: str, symbols=None):
+    module = parse_dsl(dsl, symbols)
+    assert isinstance(module, ast.Module) and len(module.body) == 1
+    return module.body[0].value
+
+
+def test_program_becomes_calls_over_array_constants():
+    node = _expression("  multiply(transpose([[1, 2], [3, 4]]), [[0.5], [-1]])\n")
+    assert isinstance(node, ast.Call) and node.func.id == "multiply"
+    inner, literal = node.args
+    assert inner.func.id == "transpose"
+    np.testing.assert_array_equal(inner.args[0].value, [[1, 2], [3, 4]])
+    assert literal.value.dtype == np.float64 and literal.value.tolist() == [[0.5], [-1.0]]
+
+
+def test_to_dsl_round_trips():
+    dsl = "add(inverse([[1, 2], [3, 4]]), transpose([[5, 6], [7, 8]]))"
+    assert to_dsl(_expression(dsl)) == dsl
+
+
+@pytest.mark.parametrize("dsl, line, column, expected", [
+    ("transpose([[1, 2], [3, 4]]", 1, 26, ["RPAR"]),
+    ("transpose([[1,2]])", 1, 15, ["SP"]),
+    ("determinant([[1]])", 1, 1, []),
+    ("add([[1]],\n [[2]])", 1, 11, []),
+])
+def test_syntax_errors_carry_their_position(dsl, line, column, expected):
+    with pytest.raises(DSLSyntaxError) as caught:
+        parse_dsl(dsl)
+    error = caught.value
+    assert (error.line, error.column) == (line, column)
+    assert error.expected[:len(expected)] == expected
+    assert f"line {line}, column {column}" in str(error)
+
+
+def test_placeholders_written_by_the_caller_are_rejected():
+    with pytest.raises(DSLSyntaxError):
+        parse_dsl("transpose($0$)")
+
+
+def test_ragged_literal_stays_a_list_for_the_analyzer():
+    node = _expression("add([[1, 2], [3]], [[1]])")
+    ragged, rectangular = node.args
+    assert isinstance(ragged, ast.List) and [len(row.elts) for row in ragged.elts] == [2, 1]
+    assert isinstance(rectangular, ast.Constant)
+
+
+def test_named_matrices_are_bound():
+    m1 = np.eye(2)
+    node = _expression("multiply(M1, [[1], [2]])", {"M1": m1})
+    assert node.args[0].value is m1
+    with pytest.raises(UnknownSymbolError, match=r"Unknown matrix name M2 \(available: M1\)"):
+        parse_dsl("inverse(M2)", {"M1": m1})
+
+
+def test_deep_nesting_round_trips():
+    dsl = "inverse(" * 5000 + "add([[1, 2], [3, 4]], M1)" + ")" * 5000
+    node = _expression(dsl, {"M1": np.eye(2, dtype=int)})
+    assert to_dsl(node) == dsl.replace("M1", "[[1, 0], [0, 1]]")
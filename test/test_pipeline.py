@@ -0,0 +1,124 @@
+# test/test_pipeline.py
+"""run_demo end to end with the model calls replaced by local fakes (main.py)."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+from dsl.limits import LIMITS
+
+LLM_FORMAT = "latex tikz picture"  # not covered by renderers/templates.py
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Fake generator / verifier / LLM renderer; returns the calls made to the renderer."""
+    state = {"dsl": "transpose([[1, 2], [3, 4]])", "formatting": "latex matrix", "verdict": True,
+             "verify_seconds": 0.0, "renders": []}
+
+    def generation_stream(*args, **kwargs):
+        yield {"type": "generated",
+               "result": {"dsl": state["dsl"], "formatting": state["formatting"], "reasoning": "fake"}}
+
+    def verify(*args, **kwargs):
+        time.sleep(state["verify_seconds"])
+        return {"is_valid": state["verdict"], "explanation": "fake verdict"}
+
+    def render_matrix_with_llm(client, formatting, latex_core):
+        state["renders"].append(threading.current_thread().name)
+        return f"\\[{latex_core}\\]"
+
+    monkeypatch.setattr(main, "FAST_PATH", False)
+    monkeypatch.setattr(main, "get_client", lambda: None)
+    monkeypatch.setattr(main, "generation_stream", generation_stream)
+    monkeypatch.setattr(main, "verify", verify)
+    monkeypatch.setattr(main, "render_matrix_with_llm", render_matrix_with_llm)
+    return state
+
+
+def test_success(pipeline):
+    out = main.run_demo("transpose [[1,2],[3,4]]")
+    assert out["status"] == "SUCCESS"
+    assert out["latex_core"] == "\\begin{bmatrix}\n1 & 3\\ \n2 & 4\\end{bmatrix}"
+    assert pipeline["renders"] == []  # rendered by the local templates
+
+
+@pytest.mark.parametrize("speculative", [True, False])
+def test_failed_verdict_never_calls_the_llm_renderer(pipeline, speculative):
+    pipeline.update(formatting=LLM_FORMAT, verdict=False, verify_seconds=0.2)
+    out = main.run_demo("transpose [[1,2],[3,4]] as a tikz picture", speculative=speculative)
+    assert out["status"] == "NEEDS_REPHRASING"
+    assert pipeline["renders"] == []
+
+
+def test_speculative_llm_render_waits_for_a_pass(pipeline):
+    pipeline.update(formatting=LLM_FORMAT, verify_seconds=0.2)
+    out = main.run_demo("transpose [[1,2],[3,4]] as a tikz picture", speculative=True)
+    assert out["status"] == "SUCCESS"
+    assert out["final_latex"].startswith("\\[\\begin{bmatrix}")
+    assert len(pipeline["renders"]) == 1
+    assert out["timings"]["verify"] >= 0.2
+
+
+def test_deeply_nested_program(pipeline):
+    depth = 3000
+    pipeline["dsl"] = "transpose(" * depth + "add([[1, 2], [3, 4]], [[1, 1], [1, 1]])" + ")" * depth
+    out = main.run_demo("transpose it a few thousand times")
+    assert out["status"] == "SUCCESS", out.get("error") or out.get("error_reason")
+    assert out["latex_core"] == "\\begin{bmatrix}\n2 & 3\\ \n4 & 5\\end{bmatrix}"
+
+
+def test_program_over_a_limit_stops_before_the_verifier(pipeline, monkeypatch):
+    monkeypatch.setattr(main, "verify", lambda *args, **kwargs: pytest.fail("verified an oversized program"))
+    depth = LIMITS["depth"][0]
+    pipeline["dsl"] = "transpose(" * depth + "[[1, 2], [3, 4]]" + ")" * depth
+    out = main.run_demo("transpose it ten thousand times")
+    assert out["status"] == "ERROR" and out["limit"] == "depth"
+    assert "analyze" in out["timings"] and "execute" not in out["timings"]
+    assert len(out["attempts"]) == 1
+
+
+def test_requested_caption_and_column_spec_reach_the_local_renderer(pipeline):
+    pipeline["formatting"] = "latex table"  # all the generator's formatting names
+    out = main.run_demo("transpose [[1,2],[3,4]] as a table captioned 'Results' with column spec |c|c|")
+    assert out["status"] == "SUCCESS"
+    assert "\\caption{Results}" in out["final_latex"]
+    assert "\\begin{tabular}{|c|c|}" in out["final_latex"]
+    assert pipeline["renders"] == []
+
+
+def test_requested_formatting_in_the_async_pipeline(pipeline, monkeypatch):
+    async def generation_async(*args, **kwargs):
+        return {"dsl": pipeline["dsl"], "formatting": "latex table", "reasoning": "fake"}
+
+    async def verify_async(*args, **kwargs):
+        return {"is_valid": True, "explanation": "fake verdict"}
+
+    monkeypatch.setattr(main, "get_async_client", lambda: None)
+    monkeypatch.setattr(main, "generation_async", generation_async)
+    monkeypatch.setattr(main, "verify_async", verify_async)
+    out = asyncio.run(main.run_demo_async("transpose [[1,2],[3,4]] in a booktabs table titled {Transposed}"))
+    assert out["status"] == "SUCCESS"
+    assert "\\caption{Transposed}" in out["final_latex"] and "\\toprule" in out["final_latex"]
+
+
+def test_fast_path_bug_falls_back_to_the_generator(pipeline, monkeypatch):
+    def parse_fast_path(user_msg):
+        raise IndexError("fast path bug")
+
+    async def generation_async(*args, **kwargs):
+        return {"dsl": pipeline["dsl"], "formatting": "latex matrix", "reasoning": "fake", "mode": "generator"}
+
+    async def verify_async(*args, **kwargs):
+        return {"is_valid": True, "explanation": "fake verdict"}
+
+    monkeypatch.setattr(main, "FAST_PATH", True)
+    monkeypatch.setattr(main, "parse_fast_path", parse_fast_path)
+    monkeypatch.setattr(main, "get_async_client", lambda: None)
+    monkeypatch.setattr(main, "generation_async", generation_async)
+    monkeypatch.setattr(main, "verify_async", verify_async)
+    assert main.run_demo("the transpose of [[1, 2], [3, 4]]")["status"] == "SUCCESS"
+    out = asyncio.run(main.run_demo_async("the transpose of [[1, 2], [3, 4]]"))
+    assert out["status"] == "SUCCESS" and out["attempts"][0]["source"] == "generator"
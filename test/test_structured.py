@@ -0,0 +1,95 @@
+# test/test_structured.py
+"""Structured kernels (dsl/structured.py) against the dense NumPy results."""
+import numpy as np
+import pytest
+
+from dsl.structured import (DIAGONAL, LOWER, PERMUTATION, SPARSE, STRUCTURED_KERNELS, UPPER, StructuredMatrix,
+                            detect_structure, multiply_work)
+
+N = 64  # large enough for every structure, including sparse
+
+
+def _matrices() -> dict:
+    rng = np.random.default_rng(0)
+    dense = rng.integers(-5, 6, size=(N, N)).astype(np.float64) + N * np.eye(N)  # well conditioned
+    sparse = np.zeros((N, N))
+    sparse[rng.integers(0, N, 6), rng.integers(0, N, 6)] = rng.integers(1, 9, 6)
+    return {
+        DIAGONAL: np.diag(rng.integers(1, 9, N).astype(np.float64)),
+        PERMUTATION: np.eye(N)[rng.permutation(N)],
+        LOWER: np.tril(dense),
+        UPPER: np.triu(dense),
+        SPARSE: sparse,
+        None: dense,
+    }
+
+
+MATRICES = _matrices()
+
+
+def _dense(value):
+    return value.dense() if isinstance(value, StructuredMatrix) else np.asarray(value)
+
+
+def _loaded(kind):
+    value = detect_structure(MATRICES[kind])
+    assert getattr(value, "kind", None) == kind
+    return value
+
+
+@pytest.mark.parametrize("kind", list(MATRICES))
+def test_unary_kernels(kind):
+    value = _loaded(kind)
+    np.testing.assert_array_equal(_dense(STRUCTURED_KERNELS["transpose"](value)), MATRICES[kind].T)
+    if kind != SPARSE:  # singular
+        np.testing.assert_allclose(_dense(STRUCTURED_KERNELS["inverse"](value)), np.linalg.inv(MATRICES[kind]),
+                                   rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("a", list(MATRICES))
+@pytest.mark.parametrize("b", list(MATRICES))
+def test_binary_kernels(a, b):
+    x, y = _loaded(a), _loaded(b)
+    np.testing.assert_allclose(_dense(STRUCTURED_KERNELS["add"](x, y)), MATRICES[a] + MATRICES[b])
+    np.testing.assert_allclose(_dense(STRUCTURED_KERNELS["multiply"](x, y)), MATRICES[a] @ MATRICES[b])
+    if a != SPARSE:
+        np.testing.assert_allclose(_dense(STRUCTURED_KERNELS["solve"](x, y)), np.linalg.solve(MATRICES[a], MATRICES[b]),
+                                   rtol=1e-9, atol=1e-12)
+
+
+def test_singular_structures_raise_like_numpy():
+    singular = np.diag(np.r_[np.ones(N - 1), 0.0])
+    for operation in ("inverse", "solve"):
+        with pytest.raises(np.linalg.LinAlgError):
+            STRUCTURED_KERNELS[operation](*[detect_structure(singular)] * (1 if operation == "inverse" else 2))
+
+
+def test_mismatched_shapes_raise_like_numpy():
+    with pytest.raises(ValueError):
+        STRUCTURED_KERNELS["multiply"](_loaded(DIAGONAL), np.ones((N + 1, 2)))
+
+
+def test_small_or_unstructured_values_stay_dense():
+    assert isinstance(detect_structure(np.eye(4)), np.ndarray)
+    assert isinstance(detect_structure(MATRICES[None]), np.ndarray)
+
+
+@pytest.mark.parametrize("a, b, work", [
+    (None, None, 2 * N ** 3),
+    (DIAGONAL, DIAGONAL, N),
+    (PERMUTATION, PERMUTATION, 0),
+    (DIAGONAL, LOWER, N * N),
+    (UPPER, DIAGONAL, N * N),
+    (LOWER, LOWER, 2 * N ** 3),
+    (DIAGONAL, None, N * N),
+    (None, PERMUTATION, 0),
+])
+def test_multiply_work_follows_the_dispatch(a, b, work):
+    assert multiply_work(_loaded(a), _loaded(b)) == work
+
+
+def test_multiply_work_of_a_sparse_product_scales_with_the_nonzeros():
+    nonzeros = np.count_nonzero(MATRICES[SPARSE])
+    assert multiply_work(_loaded(SPARSE), _loaded(None)) == 2 * nonzeros * N
+    assert multiply_work(_loaded(None), _loaded(SPARSE)) == 2 * nonzeros * N
+    assert multiply_work(_loaded(DIAGONAL), np.ones((N + 1, 2))) == 0
@@ -0,0 +1,95 @@
+# test/test_workers.py
+"""Worker processes for evaluation (utils/workers.py) and how the pipeline reports their failures."""
+import asyncio
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import dsl.memo
+import main
+import utils.workers
+from dsl.memo import RemoteMemo, ResultMemo
+from dsl.parser import parse_dsl
+from utils.workers import WorkerPool, WorkerTimeout, get_pool
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(size=1)
+    yield pool
+    pool.close()
+
+
+def test_timeout_kills_and_replaces_the_worker(pool):
+    with pytest.raises(WorkerTimeout):
+        pool.run(parse_dsl("inverse([[2, 1], [1, 1]])"), timeout=0.001)  # still warming up
+    result = pool.run(parse_dsl("inverse([[2, 1], [1, 1]])"))
+    assert result.latex_core == main.latex_core_task(parse_dsl("inverse([[2, 1], [1, 1]])"))[1]
+    assert pool.info()["timeouts"] == 1 and pool.info()["workers"] == 1
+
+
+def test_errors_come_back_as_raised(pool):
+    with pytest.raises(np.linalg.LinAlgError):
+        pool.run(parse_dsl("inverse([[1.5, 3], [1, 2]])"))
+    with pytest.raises(ValueError, match="mismatch"):
+        pool.run(parse_dsl("multiply([[1, 2]], [[1, 2]])"))
+    assert pool.info()["tasks"] == 2  # the worker survives
+
+
+def test_memo_lives_in_the_parent_across_recycled_workers(monkeypatch):
+    memo = ResultMemo(max_bytes=64 * 1024 * 1024)
+    monkeypatch.setattr(dsl.memo, "_memo", memo)
+    pool = WorkerPool(size=1, max_tasks=1)  # a new worker for every task
+    try:
+        product = "multiply([[1.5, 2], [3, 5]], [[0.5, 1], [1, 0.25]])"
+        first = pool.run(parse_dsl(f"inverse({product})"))
+        assert memo.info()["entries"] == 2 and memo.info()["hits"] == 0
+        program = parse_dsl(f"transpose(inverse({product}))")
+        second = pool.run(program)
+        assert memo.info()["hits"] == 1 and second.pid != first.pid
+        assert second.latex_core == main.latex_core_task(program)[1]  # inline, from the same memo
+        assert pool.info()["recycled"] == 2
+    finally:
+        pool.close()
+
+
+def test_large_results_are_not_put_over_the_pipe():
+    parent, child = multiprocessing.Pipe()
+    try:
+        remote = RemoteMemo(child, max_put_bytes=1024)
+        assert remote.put(b"small", np.ones((4, 4)))
+        assert not remote.put(b"large", np.ones((64, 64)))  # 32 KiB
+        assert parent.recv()[1] == b"small" and not parent.poll(0.1)
+    finally:
+        parent.close()
+        child.close()
+
+
+def test_worker_timeout_is_a_limit_result_not_a_stage_timeout(monkeypatch):
+    def compute_latex_core(*args):
+        raise WorkerTimeout("Evaluation did not finish within 30s and was stopped.")
+
+    monkeypatch.setattr(main, "compute_latex_core", compute_latex_core)
+    assert not isinstance(WorkerTimeout(), TimeoutError)
+    out = asyncio.run(main.execute_pipeline_async(None, "inverse([[1]])"))
+    assert out["status"] == "ERROR" and out["limit"] == "timeout"
+    assert main.execute_pipeline(None, "inverse([[1]])")["limit"] == "timeout"
+
+
+def test_pool_is_opt_in_and_refused_inside_a_worker(monkeypatch):
+    assert utils.workers.WORKERS == 0 or "TEXLM_WORKERS" in os.environ
+    monkeypatch.setattr(utils.workers, "_pool", None)
+    monkeypatch.setattr(multiprocessing, "parent_process", lambda: object())
+    with pytest.raises(RuntimeError, match="__main__"):
+        get_pool()
+    assert utils.workers._pool is None
+
+
+def test_default_rss_threshold_shares_the_container_limit(monkeypatch):
+    monkeypatch.setattr(utils.workers, "container_memory_limit", lambda: 512 * 1024 * 1024)
+    monkeypatch.setattr(utils.workers, "WORKERS", 2)
+    assert utils.workers._default_max_rss() == 512 * 1024 * 1024 // 3
+    monkeypatch.setattr(utils.workers, "container_memory_limit", lambda: None)
+    assert utils.workers._default_max_rss() == 1024 * 1024 * 1024
@@ -0,0 +1,236 @@
+# utils/batch.py
+"""
+High-throughput batch runner: `python main.py batch prompts.jsonl -o results.jsonl`
+
+- Prompts are read lazily from JSONL (one {"id", "prompt"} object per line) or from the
+  YAML suites in test/ (a top-level `tests:` list with `prompt` entries).
+- Requests run on run_demo_async with bounded concurrency and a token-bucket rate limit.
+- Results are appended to the output JSONL as soon as each request finishes. The output
+  file doubles as the checkpoint: re-running the same command skips every id that already
+  has a result, so a crashed job resumes where it stopped.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+# JSONL fields that may hold the prompt / the id, in order of preference
+PROMPT_FIELDS = ("prompt", "body", "text", "message")
+ID_FIELDS = ("id", "request_id")
+
+
+# ============================================================================
+# Input
+# ============================================================================
+
+def iter_prompts(path) -> Iterator[tuple[str, str]]:
+    """Yield (id, prompt) pairs from a JSONL or YAML prompt file."""
+    path = Path(path)
+    if path.suffix in (".yaml", ".yml"):
+        yield from _iter_yaml(path)
+    else:
+        yield from _iter_jsonl(path)
+
+
+def _iter_jsonl(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            prompt = next((record[k] for k in PROMPT_FIELDS if record.get(k)), None)
+            if prompt is None:
+                print(f"[Batch] Skipping {path.name}:{line_no}: no prompt field", file=sys.stderr)
+                continue
+            record_id = next((str(record[k]) for k in ID_FIELDS if record.get(k) is not None), None)
+            yield record_id or f"{path.name}:{line_no}", prompt
+
+
+def _iter_yaml(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        for document in yaml.safe_load_all(f):
+            tests = document.get("tests", []) if isinstance(document, dict) else (document or [])
+            for index, test in enumerate(tests):
+                if isinstance(test, str):
+                    test = {"prompt": test}
+                yield str(test.get("id", f"{path.name}:{index}")), test["prompt"]
+
+
+# ============================================================================
+# Checkpoint / Output
+# ============================================================================
+
+def load_checkpoint(output_path: Path) -> set[str]:
+    """
+    Ids that already have a result in `output_path`.
+    A partially written last line (crash mid-write) is truncated away.
+    """
+    done = set()
+    if not output_path.exists():
+        return done
+
+    good_bytes = 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                break
+            if not raw.endswith(b"\n"):
+                break
+            done.add(record["id"])
+            good_bytes += len(raw)
+
+    if good_bytes != output_path.stat().st_size:
+        with open(output_path, "r+b") as f:
+            f.truncate(good_bytes)
+    return done
+
+
+def to_record(record_id: str, prompt: str, out: dict) -> dict:
+    status = out.get("status")
+    return {
+        "id": record_id,
+        "prompt": prompt,
+        "status": status,
+        "dsl": out.get("dsl") if status == "SUCCESS" else out.get("failed_dsl"),
+        "latex_core": out.get("latex_core"),
+        "final_latex": out.get("final_latex"),
+        "error": out.get("error") or out.get("error_reason"),
+        "timings": out.get("timings", {}),
+        "attempts": out.get("attempts", []),
+        "trace": out.get("trace"),
+    }
+
+
+# ============================================================================
+# Rate Limiting
+# ============================================================================
+
+class RateLimiter:
+    """Token bucket: at most `rate` request starts per second, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+async def run_batch(input_path, output_path, *, concurrency: int = 8, rate: float = 0.0,
+                    burst: int = 1, limit: int | None = None, fsync_every: int = 20) -> dict:
+    """
+    Run every prompt in `input_path` through run_demo_async and append results to `output_path`.
+
+    Args:
+        concurrency: maximum number of requests in flight.
+        rate: maximum request starts per second (0 = unlimited).
+        limit: stop after this many new prompts (useful for smoke runs).
+
+    Returns:
+        dict: summary counts per status.
+    """
+    # Imported here so that `utils.batch` does not pull in the whole pipeline on import
+    from main import run_demo_async
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    done = load_checkpoint(output_path)
+    if done:
+        print(f"[Batch] Resuming: {len(done)} results already in {output_path}", file=sys.stderr)
+
+    limiter = RateLimiter(rate, burst)
+    # Bounded queue: the input is read only as fast as the workers consume it
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    summary = {"SUCCESS": 0, "NEEDS_REPHRASING": 0, "ERROR": 0, "skipped": len(done)}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out_file:
+        written = 0
+
+        def write(record: dict):
+            nonlocal written
+            out_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out_file.flush()
+            written += 1
+            if written % fsync_every == 0:
+                os.fsync(out_file.fileno())
+
+        async def produce():
+            queued = 0
+            for record_id, prompt in iter_prompts(input_path):
+                if record_id in done:
+                    continue
+                if limit is not None and queued >= limit:
+                    break
+                done.add(record_id)  # guards against duplicate ids in the input
+                await queue.put((record_id, prompt))
+                queued += 1
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def work():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                record_id, prompt = item
+                await limiter.acquire()
+                try:
+                    out = await run_demo_async(prompt)
+                except Exception as e:
+                    out = {"status": "ERROR", "error": str(e)}
+                record = to_record(record_id, prompt, out)
+                write(record)
+                summary[record["status"] if record["status"] in summary else "ERROR"] += 1
+
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+        os.fsync(out_file.fileno())
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Run a prompt file through the TexLM pipeline.")
+    parser.add_argument("input", help="JSONL or YAML prompt file")
+    parser.add_argument("-o", "--output", required=True, help="results JSONL (also used as the resume checkpoint)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="requests in flight (default: 8)")
+    parser.add_argument("-r", "--rate", type=float, default=0.0, help="max request starts per second (default: unlimited)")
+    parser.add_argument("--burst", type=int, default=1, help="rate limiter burst size (default: 1)")
+    parser.add_argument("--limit", type=int, default=None, help="only process this many new prompts")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run_batch(
+        args.input, args.output,
+        concurrency=args.concurrency, rate=args.rate, burst=args.burst, limit=args.limit,
+    ))
+    print(json.dumps(summary), file=sys.stderr)
@@ -0,0 +1,322 @@
+# utils/cache.py
+"""
+Content-addressed response cache for the LLM stages (generator, verifier, renderer).
+
+Entries are keyed on (model, system prompt hash, user payload, tool/grammar hash) and
+looked up tier by tier:
+
+1. in-process LRU (per replica, no I/O)
+2. SQLite on local disk (survives restarts, TTL + size-based eviction)
+3. optional shared Redis backend (lets several k8s replicas share hits)
+
+A hit in a lower tier is promoted into the tiers above it.
+Values must be JSON-serializable.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import redis  # optional: only needed for the shared tier
+except ImportError:
+    redis = None
+
+project_root = Path(__file__).parent.parent
+
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_DISK_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(model: str, system_prompt: str, payload, tools=None) -> str:
+    """
+    Build the cache key for one LLM call.
+    `payload` and `tools` may be any JSON-serializable object (strings, dicts, lists).
+    """
+    parts = {
+        "model": model,
+        "system": _sha256(system_prompt),
+        "payload": payload,
+        "tools": _sha256(json.dumps(tools, sort_keys=True)) if tools is not None else None,
+    }
+    return _sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False))
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class MemoryBackend:
+    """Bounded in-process LRU."""
+
+    def __init__(self, max_entries: int = DEFAULT_MEMORY_ENTRIES, ttl: float | None = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """Disk tier with TTL and least-recently-used eviction once `max_bytes` is exceeded."""
+
+    def __init__(self, path, ttl: float | None = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop least recently used entries until we are back under budget
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+class RedisBackend:
+    """Shared tier; entries expire server-side after `ttl` seconds."""
+
+    def __init__(self, url: str, ttl: float | None = DEFAULT_TTL_SECONDS, prefix: str = "texlm:cache:"):
+        if redis is None:
+            raise ImportError("The shared cache tier requires the `redis` package (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str):
+        value = self._client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str):
+        ex = int(self.ttl) if self.ttl is not None else None
+        self._client.set(self.prefix + key, value, ex=ex)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+# ============================================================================
+# Tiered Cache
+# ============================================================================
+
+class ResponseCache:
+    def __init__(self, tiers: list):
+        """
+        Args:
+            tiers: list of (name, backend) pairs, fastest first.
+        """
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, stage: str, key: str):
+        for i, (name, backend) in enumerate(self.tiers):
+            try:
+                raw = backend.get(key)
+            except Exception:
+                # a broken tier (e.g. redis unreachable) must never fail the pipeline
+                continue
+            if raw is None:
+                continue
+            self._count(stage, f"hits_{name}")
+            self._count(stage, "hits")
+            for _, upper in self.tiers[:i]:
+                self._safe_set(upper, key, raw)
+            return json.loads(raw)
+        self._count(stage, "misses")
+        return None
+
+    def set(self, stage: str, key: str, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        for _, backend in self.tiers:
+            self._safe_set(backend, key, raw)
+        self._count(stage, "stores")
+
+    def delete(self, stage: str, key: str):
+        """Drop an entry from every tier (e.g. a cached answer that turned out to be wrong)."""
+        for _, backend in self.tiers:
+            try:
+                backend.delete(key)
+            except Exception:
+                pass
+        self._count(stage, "deletes")
+
+    def clear(self):
+        for _, backend in self.tiers:
+            backend.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters per stage, e.g. {"generator": {"hits": 3, "hits_memory": 2, ...}}."""
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self._stats.items()}
+
+    def _count(self, stage: str, counter: str):
+        with self._lock:
+            counters = self._stats.setdefault(stage, {"hits": 0, "misses": 0, "stores": 0})
+            counters[counter] = counters.get(counter, 0) + 1
+
+    @staticmethod
+    def _safe_set(backend, key: str, raw: str):
+        try:
+            backend.set(key, raw)
+        except Exception:
+            pass
+
+
+class NullCache:
+    """Drop-in replacement used when caching is disabled."""
+
+    def get(self, stage: str, key: str):
+        return None
+
+    def set(self, stage: str, key: str, value):
+        pass
+
+    def delete(self, stage: str, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+# ============================================================================
+# Process-wide Instance
+# ============================================================================
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def build_cache_from_env():
+    """
+    Environment variables:
+        TEXLM_CACHE=0                 disable caching entirely
+        TEXLM_CACHE_MEMORY_ENTRIES    size of the in-process LRU (default 512)
+        TEXLM_CACHE_DIR               directory of the SQLite tier (default <repo>/.cache, "" disables it)
+        TEXLM_CACHE_TTL               entry lifetime in seconds (default 7 days)
+        TEXLM_CACHE_DISK_MAX_BYTES    size budget of the SQLite tier (default 64 MiB)
+        TEXLM_CACHE_REDIS_URL         enable the shared tier, e.g. redis://texlm-redis:6379/0
+    """
+    if os.getenv("TEXLM_CACHE", "1") == "0":
+        return NullCache()
+
+    ttl = float(os.getenv("TEXLM_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    tiers = [("memory", MemoryBackend(int(os.getenv("TEXLM_CACHE_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES)), ttl))]
+
+    cache_dir = os.getenv("TEXLM_CACHE_DIR", str(project_root / ".cache"))
+    if cache_dir:
+        max_bytes = int(os.getenv("TEXLM_CACHE_DISK_MAX_BYTES", DEFAULT_DISK_MAX_BYTES))
+        try:
+            tiers.append(("disk", SQLiteBackend(Path(cache_dir) / "responses.sqlite3", ttl, max_bytes)))
+        except (OSError, sqlite3.Error) as e:
+            print(f"[Cache] Disk tier disabled: {e}")
+
+    redis_url = os.getenv("TEXLM_CACHE_REDIS_URL")
+    if redis_url:
+        try:
+            tiers.append(("shared", RedisBackend(redis_url, ttl)))
+        except ImportError as e:
+            print(f"[Cache] Shared tier disabled: {e}")
+
+    return ResponseCache(tiers)
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache_from_env()
+    return _cache
@@ -0,0 +1,410 @@
+# utils/standin.py
+"""
+Record/replay stand-in for the OpenAI API, for offline benchmarks and load tests.
+
+Implements the endpoints the pipeline uses:
+    POST /v1/responses         (dsl/generator.py, renderers/latex.py; streaming and not)
+    POST /v1/chat/completions  (dsl/verify.py)
+
+Modes:
+    record   proxy every request to the real API and append it to a cassette (JSONL)
+    replay   answer from the cassette; requests not in it get an error or, with
+             --on-miss synthesize, a plausible synthetic answer (fast-path DSL, MATCH: TRUE, ...)
+
+Point the pipeline at it with OPENAI_BASE_URL:
+
+    python -m utils.standin record --cassette cassettes/run.jsonl --port 8787
+    python -m utils.standin replay --cassette cassettes/run.jsonl --latency recorded --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 python main.py batch test/well-formatted-prompts.yaml -o out.jsonl
+
+GET /_standin/stats returns hit/miss/error counters.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+DEFAULT_UPSTREAM = os.getenv("TEXLM_STANDIN_UPSTREAM", "https://api.openai.com/v1")
+ENDPOINTS = ("responses", "chat/completions")
+
+
+# ============================================================================
+# Cassette
+# ============================================================================
+
+def request_key(endpoint: str, body: dict) -> str:
+    """Requests match when endpoint and JSON body are equal (key order ignored)."""
+    canonical = json.dumps({"endpoint": endpoint, "body": body}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded interactions, keyed by request_key. Several recordings of a key are replayed in turn."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self):
+        return sum(len(v) for v in self.entries.values())
+
+    def lookup(self, key: str):
+        with self._lock:
+            recordings = self.entries.get(key)
+            if not recordings:
+                return None
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+            return recordings[turn % len(recordings)]
+
+    def append(self, entry: dict):
+        with self._lock:
+            self.entries.setdefault(entry["key"], []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+# ============================================================================
+# Synthetic Answers (replay --on-miss synthesize)
+# ============================================================================
+
+def synthesize(endpoint: str, body: dict) -> dict:
+    """A recorded-entry-shaped answer for a request that is not in the cassette."""
+    if endpoint == "chat/completions":
+        text = "EXPLANATION: Synthetic verdict from the stand-in server.\nMATCH: TRUE"
+        return {"status": 200, "response": _chat_completion(body, text), "events": None}
+
+    user_text = _last_user_text(body)
+    if "Matrix Core" in user_text:  # renderer
+        core = user_text.split("Matrix Core (Computed & Verified):", 1)[-1].strip()
+        latex = f"\\[\n\\begin{{bmatrix}}\n{core}\n\\end{{bmatrix}}\n\\]"
+        response = _response(body, [_message(latex)])
+    else:  # generator
+        request_text = user_text.split("User Request:", 1)[-1].strip()
+        formatting, dsl = _synthetic_program(request_text)
+        output = [_message(f"Synthetic plan. Formatting: {formatting}.")]
+        if dsl:
+            output.append({
+                "type": "custom_tool_call", "id": _id("ctc"), "call_id": _id("call"),
+                "name": "dsl_grammar", "input": dsl, "status": "completed",
+            })
+        response = _response(body, output)
+    events = _response_events(response) if body.get("stream") else None
+    return {"status": 200, "response": None if events else response, "events": events}
+
+
+def _synthetic_program(request_text: str) -> tuple[str, str | None]:
+    """
+    (formatting, DSL) for a generator request: the fast-path program when there is one,
+    otherwise the first matrix of the request as is. None (a refusal) when it has no matrix.
+    """
+    from dsl.fastpath import extract_matrices, parse_fast_path
+    from dsl.symbols import SYMBOL_PATTERN
+
+    fast = parse_fast_path(request_text)
+    if fast["dsl"]:
+        return fast["formatting"], fast["dsl"]
+    name = SYMBOL_PATTERN.search(request_text)
+    if name:
+        return fast["formatting"], name.group(0)
+    literal = next((m["dsl"] for m in extract_matrices(request_text) if m["dsl"]), None)
+    return fast["formatting"], literal
+
+
+def _last_user_text(body: dict) -> str:
+    for item in reversed(body.get("input") or []):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            return " ".join(part.get("text", "") for part in content or [] if isinstance(part, dict))
+        if isinstance(item, dict) and item.get("type") == "custom_tool_call_output":
+            return ""
+    return ""
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _message(text: str) -> dict:
+    return {
+        "type": "message", "id": _id("msg"), "status": "completed", "role": "assistant",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def _usage(body: dict, output_text: str) -> dict:
+    input_tokens = len(json.dumps(body.get("input") or body.get("messages") or "")) // 4
+    return {
+        "input_tokens": input_tokens, "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": len(output_text) // 4, "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": input_tokens + len(output_text) // 4,
+    }
+
+
+def _response(body: dict, output: list) -> dict:
+    text = json.dumps(output)
+    return {
+        "id": _id("resp"), "object": "response", "created_at": int(time.time()), "status": "completed",
+        "model": body.get("model", ""), "output": output, "parallel_tool_calls": False,
+        "tool_choice": "auto", "tools": body.get("tools", []), "usage": _usage(body, text),
+    }
+
+
+def _chat_completion(body: dict, text: str) -> dict:
+    usage = _usage(body, text)
+    return {
+        "id": _id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"],
+                  "total_tokens": usage["total_tokens"]},
+    }
+
+
+def _response_events(response: dict) -> list[dict]:
+    """Server-sent events of a streamed Responses API call that ends in `response`."""
+    events = [{"type": "response.created", "response": {**response, "status": "in_progress", "output": []}}]
+    for index, item in enumerate(response["output"]):
+        if item["type"] == "message":
+            text = item["content"][0]["text"]
+            for start in range(0, len(text), 16):
+                events.append({"type": "response.output_text.delta", "item_id": item["id"],
+                               "output_index": index, "content_index": 0, "delta": text[start:start + 16]})
+        elif item["type"] == "custom_tool_call":
+            events.append({"type": "response.custom_tool_call_input.done", "item_id": item["id"],
+                           "output_index": index, "input": item["input"]})
+    events.append({"type": "response.completed", "response": response})
+    for sequence_number, event in enumerate(events):
+        event["sequence_number"] = sequence_number
+    return events
+
+
+# ============================================================================
+# Server
+# ============================================================================
+
+class StandIn:
+    """Shared state of the stand-in server (mode, cassette, fault injection, counters)."""
+
+    def __init__(self, mode: str, cassette: Cassette, *, upstream: str = DEFAULT_UPSTREAM,
+                 latency="0", jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                 on_miss: str = "error", seed: int | None = None):
+        self.mode = mode
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.on_miss = on_miss
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "synthesized": 0, "recorded": 0, "injected_errors": 0}
+        self._lock = threading.Lock()
+        self._http = httpx.Client(timeout=httpx.Timeout(300.0, connect=10.0)) if mode == "record" else None
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def delay(self, recorded: float | None) -> float:
+        base = (recorded or 0.0) if self.latency == "recorded" else float(self.latency)
+        with self._lock:
+            spread = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(base + spread, 0.0)
+
+    def inject_error(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid the delayed-ACK stall
+    standin: StandIn = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/_standin/stats":
+            return self._send_json(200, {**self.standin.stats, "cassette_entries": len(self.standin.cassette)})
+        self._send_json(404, _error("Not found", "invalid_request_error"))
+
+    def do_POST(self):
+        standin = self.standin
+        endpoint = self.path.split("?")[0].strip("/").removeprefix("v1/")
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if endpoint not in ENDPOINTS:
+            return self._send_json(404, _error(f"Unsupported endpoint /{endpoint}", "invalid_request_error"))
+        standin.count("requests")
+        key = request_key(endpoint, body)
+
+        if standin.mode == "record":
+            return self._record(endpoint, body, key)
+
+        if standin.inject_error():
+            standin.count("injected_errors")
+            time.sleep(standin.delay(None))
+            return self._send_json(standin.error_status, _error("Injected failure", "server_error"),
+                                   headers={"Retry-After": "0"} if standin.error_status == 429 else None)
+
+        entry = standin.cassette.lookup(key)
+        if entry is not None:
+            standin.count("hits")
+        elif standin.on_miss == "synthesize":
+            standin.count("synthesized")
+            entry = synthesize(endpoint, body)
+        else:
+            standin.count("misses")
+            return self._send_json(404, _error("Request not found in cassette", "invalid_request_error"))
+        self._replay(entry, standin.delay(entry.get("latency")))
+
+    # --- replay ---
+
+    def _replay(self, entry: dict, delay: float):
+        if entry.get("events") is None:
+            time.sleep(delay)
+            return self._send_json(entry["status"], entry["response"])
+        # streamed: the delay is spread over the events, half of it before the first one
+        events = entry["events"]
+        self._start_stream()
+        time.sleep(delay / 2)
+        gap = delay / 2 / max(len(events), 1)
+        for event in events:
+            self._send_event(event)
+            time.sleep(gap)
+        self._end_stream()
+
+    # --- record ---
+
+    def _record(self, endpoint: str, body: dict, key: str):
+        standin = self.standin
+        headers = {"Content-Type": "application/json"}
+        if self.headers.get("Authorization"):
+            headers["Authorization"] = self.headers["Authorization"]
+        url = f"{standin.upstream}/{endpoint}"
+        started = time.perf_counter()
+        entry = {"key": key, "endpoint": endpoint, "request": body, "recorded_at": time.time()}
+
+        if not body.get("stream"):
+            upstream = standin._http.post(url, json=body, headers=headers)
+            entry.update(status=upstream.status_code, response=upstream.json(), events=None,
+                         latency=round(time.perf_counter() - started, 6))
+            if upstream.status_code < 400:
+                standin.cassette.append(entry)
+                standin.count("recorded")
+            return self._send_json(upstream.status_code, entry["response"])
+
+        events = []
+        with standin._http.stream("POST", url, json=body, headers=headers) as upstream:
+            if upstream.status_code >= 400:
+                return self._send_json(upstream.status_code, json.loads(upstream.read() or b"{}"))
+            self._start_stream()
+            for line in upstream.iter_lines():
+                if line.startswith("data:"):
+                    data = line[5:].strip()
+                    if data and data != "[DONE]":
+                        event = json.loads(data)
+                        events.append(event)
+                        self._send_event(event)
+            self._end_stream()
+        entry.update(status=200, response=None, events=events, latency=round(time.perf_counter() - started, 6))
+        standin.cassette.append(entry)
+        standin.count("recorded")
+
+    # --- wire helpers ---
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, event: dict):
+        self.wfile.write(f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.flush()
+
+
+def _error(message: str, error_type: str) -> dict:
+    return {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+
+
+def serve(standin: StandIn, host: str = "127.0.0.1", port: int = 8787) -> ThreadingHTTPServer:
+    """Start the stand-in on a daemon thread and return the server (port 0 picks a free port)."""
+    handler = type("StandInHandler", (_Handler,), {"standin": standin})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="texlm-standin", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.standin", description="Record/replay OpenAI stand-in server.")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--cassette", required=True, help="JSONL file of recorded interactions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM, help="real API base URL (record mode)")
+    parser.add_argument("--latency", default="0", help='seconds per call, or "recorded" (replay mode)')
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an error")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected errors (e.g. 429)")
+    parser.add_argument("--on-miss", choices=("error", "synthesize"), default="error")
+    parser.add_argument("--seed", type=int, default=None, help="seed for jitter and error injection")
+    args = parser.parse_args(argv)
+
+    if args.latency != "recorded":
+        float(args.latency)  # fail early on a typo
+    standin = StandIn(
+        args.mode, Cassette(args.cassette), upstream=args.upstream, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, on_miss=args.on_miss, seed=args.seed,
+    )
+    server = serve(standin, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"[StandIn] {args.mode} on http://{host}:{port}/v1 ({len(standin.cassette)} recorded entries)", file=sys.stderr)
+    print(f"[StandIn] export OPENAI_BASE_URL=http://{host}:{port}/v1", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"[StandIn] {json.dumps(standin.stats)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# utils/telemetry.py
+"""
+Tracing and Prometheus-style metrics for the pipeline (no extra dependencies).
+
+- span("generate", model="gpt-5"): times a stage, nests under the current span and feeds
+  the texlm_stage_duration_seconds histogram. Spans of one request are collected in a Trace
+  that the pipeline attaches to its result.
+- record_llm_call(stage, model, usage): token usage per stage/model (texlm_llm_tokens_total).
+- record_outcome(result): SUCCESS / NEEDS_REPHRASING / ERROR counters and attempts per request.
+- start_metrics_server(): serves GET /metrics in the text exposition format on
+  TEXLM_METRICS_PORT (default 9100, 0 disables), next to the Streamlit server.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("TEXLM_METRICS_PORT", "9100"))
+# Append every finished trace as one JSON line to this file ("" disables)
+TRACE_LOG = os.getenv("TEXLM_TRACE_LOG", "")
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5)
+
+
+# ============================================================================
+# Metrics
+# ============================================================================
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (_number(bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+STAGE_SECONDS = Histogram(
+    "texlm_stage_duration_seconds", "Wall-clock time per pipeline stage.", ["stage"])
+LLM_REQUESTS = Counter(
+    "texlm_llm_requests_total", "Model calls per stage and model (cache hits excluded).", ["stage", "model"])
+LLM_CACHE_HITS = Counter(
+    "texlm_llm_cache_hits_total", "Model calls answered from the response cache.", ["stage", "model"])
+LLM_TOKENS = Counter(
+    "texlm_llm_tokens_total", "Tokens reported by the OpenAI API.", ["stage", "model", "kind"])
+REQUESTS = Counter(
+    "texlm_requests_total", "Finished pipeline requests by outcome.", ["status"])
+REQUEST_SECONDS = Histogram(
+    "texlm_request_duration_seconds", "End-to-end pipeline latency.", ["status"])
+ATTEMPTS = Histogram(
+    "texlm_request_attempts", "Attempts (1 + retries) per request.", [], buckets=ATTEMPT_BUCKETS)
+RETRIES = Counter(
+    "texlm_retries_total", "Retries by the source of the retried DSL.", ["source"])
+
+REGISTRY = [STAGE_SECONDS, LLM_REQUESTS, LLM_CACHE_HITS, LLM_TOKENS, REQUESTS, REQUEST_SECONDS, ATTEMPTS, RETRIES]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.collect()) + "\n"
+
+
+# ============================================================================
+# Tracing
+# ============================================================================
+
+class Trace:
+    """Spans of one pipeline request. Spans may finish on worker threads."""
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        return {"trace_id": self.trace_id, "name": self.name, "started_at": self.wall_started, "spans": spans}
+
+
+_current_trace = contextvars.ContextVar("texlm_trace", default=None)
+_current_span = contextvars.ContextVar("texlm_span", default=None)
+
+
+@contextmanager
+def start_trace(name: str):
+    """Collect the spans of one request. Yields the Trace."""
+    trace = Trace(name)
+    # set() instead of reset(token): the pipeline generators may be closed from another context
+    previous_trace, previous_span = _current_trace.get(), _current_span.get()
+    _current_trace.set(trace)
+    _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_trace.set(previous_trace)
+        _current_span.set(previous_span)
+        if TRACE_LOG:
+            _write_trace(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a stage. Yields the span's attribute dict, which annotate() also writes to."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    record = {
+        "span_id": uuid.uuid4().hex[:8],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "attributes": dict(attributes),
+    }
+    _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except BaseException as e:
+        record["attributes"]["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.set(parent)
+        STAGE_SECONDS.observe(duration, stage=name)
+        if trace is not None:
+            record["start"] = round(start - trace.started, 6)
+            record["duration"] = round(duration, 6)
+            trace.add(record)
+
+
+def add_span(name: str, start: float, end: float, **attributes):
+    """Record a span measured elsewhere (perf_counter start/end), e.g. a whole retry attempt."""
+    STAGE_SECONDS.observe(end - start, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add({
+            "span_id": uuid.uuid4().hex[:8],
+            "parent_id": None,
+            "name": name,
+            "attributes": attributes,
+            "start": round(start - trace.started, 6),
+            "duration": round(end - start, 6),
+        })
+
+
+def merge_spans(spans: list, started: float):
+    """
+    Add spans finished in another process (Trace.to_dict()["spans"] of a trace whose
+    perf_counter start was `started`) under the current span. perf_counter is system-wide.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    for record in spans:
+        STAGE_SECONDS.observe(record["duration"], stage=record["name"])
+        if trace is not None:
+            trace.add({**record, "parent_id": record["parent_id"] or (parent["span_id"] if parent else None),
+                       "start": round(started + record["start"] - trace.started, 6)})
+
+
+def annotate(**attributes):
+    """Add attributes to the current span (no-op outside a span)."""
+    record = _current_span.get()
+    if record is not None:
+        record["attributes"].update(attributes)
+
+
+def record_llm_call(stage: str, model: str, usage: dict | None = None, *, cached: bool = False):
+    """Count a model call and its token usage, and tag the current span with them."""
+    if cached:
+        LLM_CACHE_HITS.inc(stage=stage, model=model)
+        annotate(model=model, cached=True)
+        return
+    LLM_REQUESTS.inc(stage=stage, model=model)
+    usage = usage or {}
+    for kind, tokens in usage.items():
+        if tokens:
+            LLM_TOKENS.inc(tokens, stage=stage, model=model, kind=kind.removesuffix("_tokens"))
+    annotate(model=model, cached=False, **usage)
+
+
+def record_outcome(result: dict):
+    """Outcome counters for a finished request (expects the result's timings/attempts)."""
+    status = result.get("status", "ERROR")
+    REQUESTS.inc(status=status)
+    total = result.get("timings", {}).get("total")
+    if total is not None:
+        REQUEST_SECONDS.observe(total, status=status)
+    attempts = result.get("attempts") or []
+    if attempts:
+        ATTEMPTS.observe(len(attempts))
+    for record in attempts[1:]:
+        RETRIES.inc(source=record.get("source", ""))
+
+
+def usage_of(resp) -> dict:
+    """Token counts of a Responses / Chat Completions response (zeros when not reported)."""
+    usage = getattr(resp, "usage", None)
+    input_details = getattr(usage, "input_tokens_details", None) or getattr(usage, "prompt_tokens_details", None)
+    output_details = getattr(usage, "output_tokens_details", None) or getattr(usage, "completion_tokens_details", None)
+    return {
+        "input_tokens": _count(usage, "input_tokens", "prompt_tokens"),
+        "cached_tokens": _count(input_details, "cached_tokens"),
+        "output_tokens": _count(usage, "output_tokens", "completion_tokens"),
+        "reasoning_tokens": _count(output_details, "reasoning_tokens"),
+    }
+
+
+def _count(obj, *names) -> int:
+    for name in names:
+        value = getattr(obj, name, None)
+        if isinstance(value, int):
+            return value
+    return 0
+
+
+def _write_trace(trace: Trace):
+    try:
+        with open(TRACE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+    except OSError:
+        pass
+
+
+# ============================================================================
+# Scrape Endpoint
+# ============================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the Streamlit log
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Serve /metrics from a daemon thread. Safe to call on every Streamlit rerun."""
+    global _server
+    if port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"[Metrics] Could not listen on port {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="texlm-metrics", daemon=True).start()
+    return _server
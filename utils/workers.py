@@ -0,0 +1,299 @@
+# utils/workers.py
+"""
+Warm worker processes for the numeric part of execution (evaluate + generate_constraint).
+
+A slow np.linalg.inv or a pathological formatting job used to run on the Streamlit script
+thread, and a crash in native code took the whole server down. With TEXLM_WORKERS=N
+(default 0: inline), compute_latex_core sends the parsed program to a pool of N processes:
+
+    result = get_pool().run(program_ast)        # blocks for at most TEXLM_WORKER_TIMEOUT (30 s)
+    result.latex_core, result.flops
+
+- Timeouts: a worker that misses the deadline is killed and replaced (WorkerTimeout).
+- Crashes: a worker that dies mid-task is replaced and the task fails (WorkerCrashed);
+  the parent and the other sessions are unaffected.
+- Recycling: a worker is replaced after TEXLM_WORKER_MAX_TASKS tasks (500) or when its
+  resident memory after a task passes TEXLM_WORKER_MAX_RSS (an even share of the container
+  memory limit between the parent and the workers: 170 MiB for 2 workers under 512Mi),
+  which also returns what its plan cache held.
+- Memo: the result memo (dsl/memo.py) stays in the parent. A worker asks for memoized
+  results over its pipe while it runs a task and sends back the ones it computes of at
+  most TEXLM_WORKER_MEMO_PUT_MAX_BYTES (1 MiB), so they are shared between workers and
+  survive recycling; larger ones are not worth pickling through the pipe mid-task.
+- Only the LaTeX core (and the multiply work) comes back: the result matrix stays in the
+  worker.
+
+Workers are forked from a forkserver that has already imported NumPy and the evaluator,
+and each runs a small warm-up program before its first task. Spans recorded in a worker
+(evaluate, constraint) are merged into the parent's trace.
+
+Like any multiprocessing start method but fork, the forkserver re-imports the parent's
+__main__ module in each worker, so a script that runs the pipeline at import time must
+keep that under `if __name__ == "__main__":`. get_pool() raises a RuntimeError saying so
+instead of letting the workers start pools of their own.
+"""
+import atexit
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+
+from constraints.generate_constraint import generate_constraint
+from dsl.evaluate import evaluate, evaluate_exact, flatten_program
+from dsl.exact import EXACT_ARITHMETIC
+from dsl.memo import RemoteMemo, answer_memo_request, container_memory_limit, get_memo, set_memo
+from dsl.parser import parse_dsl
+from utils.telemetry import merge_spans, span, start_trace
+
+_DEFAULT_MAX_RSS = 1024 * 1024 * 1024
+
+
+def _default_max_rss() -> int:
+    # the parent and every worker must fit in the container together
+    limit = container_memory_limit()
+    return min(limit // (WORKERS + 1), _DEFAULT_MAX_RSS) if limit else _DEFAULT_MAX_RSS
+
+
+WORKERS = int(os.getenv("TEXLM_WORKERS", "0"))
+WORKER_TIMEOUT = float(os.getenv("TEXLM_WORKER_TIMEOUT", "30"))
+WORKER_MAX_TASKS = int(os.getenv("TEXLM_WORKER_MAX_TASKS", "500"))
+WORKER_MAX_RSS = int(os.getenv("TEXLM_WORKER_MAX_RSS", "0")) or _default_max_rss()
+MEMO_PUT_MAX_BYTES = int(os.getenv("TEXLM_WORKER_MEMO_PUT_MAX_BYTES", str(1024 * 1024)))
+
+WARM_UP_PROGRAMS = ("inverse(multiply([[2, 1], [1, 1]], [[1, 0], [3, 1]]))", "transpose(inverse([[2.5, 1.0], [1.0, 1.5]]))")
+
+
+class WorkerTimeout(RuntimeError):
+    """
+    A task did not finish within its timeout; its worker was killed. Not a TimeoutError:
+    callers that treat asyncio.TimeoutError as a stage timeout must not catch it as one.
+    """
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker running a task exited before replying."""
+
+
+# ============================================================================
+# Task (runs in the worker, or inline when the pool is disabled)
+# ============================================================================
+
+def latex_core_task(program, flops: dict | None = None) -> tuple:
+    """
+    (result matrix, LaTeX core) of a parsed program or its flatten_program() form: exact
+    for integer and short-decimal matrices, else NumPy. `flops` receives the multiply work.
+    """
+    program = flatten_program(program)
+    # This step might raise ValueError (dimension mismatch) or LinAlgError (singular matrix)
+    with span("evaluate") as attributes:
+        result_matrix = evaluate_exact(program, flops) if EXACT_ARITHMETIC else None
+        attributes["exact"] = result_matrix is not None
+        if result_matrix is None:
+            result_matrix = evaluate(program, dense=False, flops=flops)
+        attributes["shape"] = list(getattr(result_matrix, "shape", ()))
+
+    with span("constraint"):
+        return result_matrix, generate_constraint(result_matrix)
+
+
+def _serve(conn):
+    """Worker main loop: one task per message until None or the pipe closes."""
+    for program in WARM_UP_PROGRAMS:
+        latex_core_task(parse_dsl(program))
+    set_memo(RemoteMemo(conn, max_put_bytes=MEMO_PUT_MAX_BYTES))  # after the warm-up: the parent only answers during a task
+    tasks = 0
+    while True:
+        try:
+            program = conn.recv()
+        except EOFError:
+            return
+        if program is None:
+            return
+        tasks += 1
+        conn.send(_run(program, tasks))
+
+
+def _run(program, tasks: int) -> dict:
+    with start_trace("worker") as trace:
+        try:
+            flops = {}
+            reply = {"latex_core": latex_core_task(program, flops)[1], "flops": flops}
+        except Exception as e:
+            reply = {"error": e if _picklable(e) else RuntimeError(f"{type(e).__name__}: {e}")}
+    reply.update(started=trace.started, spans=trace.to_dict()["spans"], rss=_resident_bytes(), tasks=tasks)
+    return reply
+
+
+def _picklable(error: Exception) -> bool:
+    try:
+        pickle.loads(pickle.dumps(error))  # custom __init__ signatures fail on the way back
+        return True
+    except Exception:
+        return False
+
+
+def _resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0  # not Linux: no memory-based recycling
+
+
+# ============================================================================
+# Pool (parent side)
+# ============================================================================
+
+class WorkerResult:
+    """A finished task: its LaTeX core and multiply work, and the worker that ran it."""
+
+    def __init__(self, latex_core: str, pid: int, rss: int, flops: dict | None = None):
+        self.latex_core = latex_core
+        self.flops = flops or {}
+        self.pid = pid
+        self.rss = rss
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), name="texlm-worker", daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self, graceful: bool = True):
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(1.0)
+            except OSError:
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _context():
+    # forkserver: workers (and replacements) fork from a process that already imported the evaluator
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["utils.workers"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class WorkerPool:
+    def __init__(self, size: int = WORKERS, timeout: float = WORKER_TIMEOUT,
+                 max_tasks: int = WORKER_MAX_TASKS, max_rss: int = WORKER_MAX_RSS):
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self._context = _context()
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._stats = {"tasks": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._start())
+
+    def _start(self) -> _Worker:
+        worker = _Worker(self._context)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker: _Worker, graceful: bool) -> _Worker:
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop(graceful)
+        return self._start()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def run(self, program_ast, timeout: float | None = None) -> WorkerResult:
+        """Evaluate and format a parsed program on an idle worker (waits for one if all are busy)."""
+        timeout = self.timeout if timeout is None else timeout
+        # sent flattened: pickling the tree recurses once per nesting level
+        program = flatten_program(program_ast)
+        worker = self._idle.get()
+        if not worker.process.is_alive():  # died while idle
+            self._count("crashes")
+            worker = self._replace(worker, graceful=False)
+        outcome = "failed"  # killed and replaced unless the task completes
+        try:
+            worker.conn.send(program)
+            reply = self._wait(worker, time.monotonic() + timeout)
+            if reply is None:
+                self._count("timeouts")
+                raise WorkerTimeout(f"Evaluation did not finish within {timeout:g}s and was stopped.")
+        except (EOFError, OSError):
+            self._count("crashes")
+            worker.process.join(1.0)
+            raise WorkerCrashed(
+                f"The evaluation worker exited unexpectedly (exit code {worker.process.exitcode}).") from None
+        else:
+            self._count("tasks")
+            outcome = "healthy"
+            if reply["tasks"] >= self.max_tasks or (self.max_rss and reply["rss"] > self.max_rss):
+                self._count("recycled")
+                outcome = "recycled"
+        finally:
+            if outcome != "healthy":
+                worker = self._replace(worker, graceful=outcome == "recycled")
+            self._idle.put(worker)
+
+        merge_spans(reply["spans"], reply["started"])
+        if "error" in reply:
+            raise reply["error"]
+        return WorkerResult(reply["latex_core"], worker.process.pid, reply["rss"], reply["flops"])
+
+    def _wait(self, worker: _Worker, deadline: float) -> dict | None:
+        """The task's reply, answering the worker's memo requests meanwhile; None at the deadline."""
+        memo = get_memo()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not worker.conn.poll(remaining):
+                return None
+            message = worker.conn.recv()
+            if isinstance(message, dict):
+                return message
+            answer_memo_request(memo, message, worker.conn)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"workers": len(self._workers), "idle": self._idle.qsize(), **self._stats}
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool:
+    """The process-wide pool, started on first use."""
+    global _pool
+    # a worker re-importing the parent's __main__ is still bootstrapping (no parent_process yet)
+    if multiprocessing.parent_process() is not None or getattr(multiprocessing.current_process(), "_inheriting", False):
+        raise RuntimeError(
+            "The evaluation worker pool was requested from inside a worker process. With "
+            "TEXLM_WORKERS set, the script calling the pipeline re-runs in every worker; move "
+            "that call under `if __name__ == \"__main__\":` or set TEXLM_WORKERS=0.")
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def pool_info() -> dict:
+    return _pool.info() if _pool is not None else {"workers": 0}